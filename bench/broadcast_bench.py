@@ -0,0 +1,83 @@
+"""Бенчмарк рассылки в комнате: отдельные фреймы против склейки (`src/broadcast.py`).
+
+Фейковые соединения считают фреймы и байты; сжатие permessage-deflate
+оценивается zlib-потоком на соединение (raw deflate с сохранением контекста,
+как при client/server context takeover). Реальный Mongo и сеть не нужны.
+
+    python -m bench.broadcast_bench --recipients 50 --messages 2000 --coalesce-ms 5
+"""
+
+import time
+import json
+import zlib
+import asyncio
+import argparse
+
+import src.concts as c
+import src.broadcast as broadcast
+
+
+class FakeSocket:
+    def __init__(self):
+        self.frames = 0
+        self.raw_bytes = 0
+        self.deflated_bytes = 0
+        self._deflate = zlib.compressobj(6, zlib.DEFLATED, -15)
+
+    async def send_text(self, frame: str) -> None:
+        data = frame.encode()
+        self.frames += 1
+        self.raw_bytes += len(data)
+        self.deflated_bytes += len(self._deflate.compress(data) + self._deflate.flush(zlib.Z_SYNC_FLUSH))
+
+
+async def run_mode(args, coalesce_ms: float) -> dict:
+    c.WS_COALESCE_MS = coalesce_ms
+    sockets = [FakeSocket() for _ in range(args.recipients)]
+    for ws in sockets:
+        broadcast.register(ws, coalesce=coalesce_ms > 0)
+
+    started = time.perf_counter()
+    for i in range(args.messages):
+        payload = json.dumps({"chat_id": "bench", "sender_id": i % 7, "content": f"сообщение номер {i}"})
+        await broadcast.broadcast(sockets, payload)
+        if args.burst and i % args.burst == args.burst - 1:
+            await asyncio.sleep(args.pause_ms / 1000)
+    await asyncio.sleep(coalesce_ms / 1000 * 2)
+    elapsed = time.perf_counter() - started
+
+    for ws in sockets:
+        broadcast.unregister(ws)
+    ws = sockets[0]
+    return {
+        "frames": ws.frames,
+        "msg_s": args.messages / elapsed,
+        "raw_kb_s": ws.raw_bytes / elapsed / 1024,
+        "deflate_kb_s": ws.deflated_bytes / elapsed / 1024,
+        "raw_kb": ws.raw_bytes / 1024,
+        "deflate_kb": ws.deflated_bytes / 1024,
+    }
+
+
+async def run(args) -> None:
+    print(f"recipients={args.recipients} messages={args.messages} burst={args.burst}\n")
+    print(f"{'mode':14} {'frames':>8} {'msg/s':>10} {'KiB/s raw':>11} {'KiB/s defl':>11} {'KiB raw':>9} {'KiB defl':>9}")
+    for label, ms in (("direct", 0), (f"coalesce {args.coalesce_ms:g}ms", args.coalesce_ms)):
+        r = await run_mode(args, ms)
+        print(f"{label:14} {r['frames']:>8} {r['msg_s']:>10.0f} {r['raw_kb_s']:>11.1f} "
+              f"{r['deflate_kb_s']:>11.1f} {r['raw_kb']:>9.1f} {r['deflate_kb']:>9.1f}")
+    print("\n(на одного получателя)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--coalesce-ms", type=float, default=5)
+    parser.add_argument("--burst", type=int, default=20, help="сообщений во всплеске (0 — без пауз)")
+    parser.add_argument("--pause-ms", type=float, default=10, help="пауза между всплесками")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Бенчмарк схем хранения сообщений: flat (`chats_msgs`) против bucket.
+
+Заполняет отдельную базу `MONGO_URL`/<db> одним чатом из N сообщений в обеих
+схемах и печатает размер индексов и задержку чтения страницы на разных
+смещениях. Нужен запущенный MongoDB.
+
+    python -m bench.bucket_layout_bench --messages 200000 --limit 50
+"""
+
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import src.concts as c
+from db import mongo as MongoDB
+from db import mongo_buckets
+
+
+async def seed(db, chat_id: str, n: int) -> None:
+    start = datetime.now(timezone.utc) - timedelta(seconds=n)
+    batch = []
+    for i in range(n):
+        batch.append({
+            "msg_id": str(uuid4()),
+            "chat_id": chat_id,
+            "content": f"message {i}",
+            "sender_id": i % 2 + 1,
+            "timestamp": start + timedelta(seconds=i),
+            "readers": [],
+        })
+        if len(batch) == 10000:
+            await db.chats_msgs.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.chats_msgs.insert_many(batch, ordered=False)
+    await mongo_buckets.migrate_chat(db, chat_id)
+
+
+async def page_latency(db, chat_id: str, layout: str, offset: int, limit: int, runs: int) -> list:
+    c.MSG_STORAGE_LAYOUT = layout
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await MongoDB.get_messages(db, chat_id, limit, offset)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def run(args) -> None:
+    client = AsyncIOMotorClient(c.MONGO_URL)
+    db = client[args.db]
+    chat_id = str(uuid4())
+    try:
+        await client.drop_database(args.db)
+        await MongoDB.ensure_indexes(db)
+        await seed(db, chat_id, args.messages)
+
+        for name in ("chats_msgs", "chats_msgs_buckets"):
+            stats = await db.command("collStats", name)
+            print(f"{name:20} docs={stats['count']:>9} data={stats['size'] / 2**20:8.1f} MiB "
+                  f"indexes={stats['totalIndexSize'] / 2**20:8.2f} MiB")
+
+        print(f"\npage latency, limit={args.limit}, runs={args.runs} (ms, p50 / p95)")
+        for offset in (0, args.messages // 2, max(args.messages - args.limit, 0)):
+            row = [f"offset={offset:>9}"]
+            for layout in ("flat", "bucket"):
+                samples = sorted(await page_latency(db, chat_id, layout, offset, args.limit, args.runs))
+                p95 = samples[int(len(samples) * 0.95) - 1]
+                row.append(f"{layout}: {statistics.median(samples):7.2f} / {p95:7.2f}")
+            print("  ".join(row))
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db)
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--db", default="chat_bench")
+    parser.add_argument("--keep", action="store_true", help="не удалять базу после прогона")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""JSON против MessagePack на websocket-фреймах (`src/codec.py`).
+
+Меряет разбор входящего фрейма сообщения (декодирование + `parse_frame`),
+кодирование исходящего сообщения и sync-фрейма из N сообщений, а также
+размер фреймов. Сеть и Mongo не нужны.
+
+    python -m bench.codec_bench --iterations 50000 --sync-messages 100
+"""
+
+import time
+import argparse
+
+from schemas.frames import parse_frame
+from src.codec import JSON, MSGPACK
+
+
+def _message(i: int) -> dict:
+    return {
+        "chat_id": "5f0c9a3e-2b7d-4c41-9e0a-7b1f2c3d4e5f",
+        "sender_id": 1000 + i,
+        "content": "Привет! Как дела? " * 3,
+        "msg_id": f"msg-{i:08d}",
+        "seq": i,
+        "client_msg_id": f"cli-{i:08d}",
+        "attachments": [],
+    }
+
+
+def _per_op(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def run(iterations: int, sync_messages: int) -> None:
+    incoming = {"type": "message", "chat_id": "c1", "sender_id": 42, "content": "Привет! " * 8, "client_msg_id": "k1"}
+    outgoing = _message(1)
+    sync = {"type": "sync", "messages": [_message(i) for i in range(sync_messages)], "last_seq": sync_messages}
+
+    print(f"iterations={iterations} sync_messages={sync_messages}\n")
+    print(f"{'codec':8} {'parse µs':>9} {'encode µs':>10} {'sync µs':>9} {'msg B':>7} {'sync B':>8}")
+    for codec in (JSON, MSGPACK):
+        raw_in = codec.encode(incoming)
+        parse = _per_op(lambda: parse_frame(codec.decode(raw_in), strict=codec.strict), iterations)
+        encode = _per_op(lambda: codec.encode(outgoing), iterations)
+        encode_sync = _per_op(lambda: codec.encode(sync), max(iterations // sync_messages, 1))
+        size = len(codec.encode(outgoing).encode() if codec is JSON else codec.encode(outgoing))
+        sync_size = len(codec.encode(sync).encode() if codec is JSON else codec.encode(sync))
+        print(f"{codec.name:8} {parse:>9.2f} {encode:>10.2f} {encode_sync:>9.1f} {size:>7} {sync_size:>8}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50000)
+    parser.add_argument("--sync-messages", type=int, default=100)
+    args = parser.parse_args()
+    run(args.iterations, args.sync_messages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Стоимость логирования на горячем пути в вызывающем потоке.
+
+Сравнивает синхронный `StreamHandler` (запись в файл на каждый вызов), очередь
+с фоновым писателем (`src/log_config.py`) и очередь с выборкой 0.1. Меряется
+время `logger.info(...)` в потоке обработчика; запись идёт в os.devnull.
+
+    python -m bench.logging_bench --calls 200000
+"""
+
+import os
+import time
+import logging
+import argparse
+
+from src import log_config
+
+logger = logging.getLogger("db.mongo")
+
+
+def _measure(calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        logger.info("Сообщение добавлено: %s", i)
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def run(calls: int) -> None:
+    devnull = open(os.devnull, "w")
+    #Те же флаги сбора атрибутов записи, что выставляет setup_logging, — для честного сравнения
+    logging.logMultiprocessing = logging.logProcesses = False
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    results = {}
+
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(log_config.build_formatter("text"))
+    root.addHandler(handler)
+    results["sync StreamHandler"] = _measure(calls)
+    root.removeHandler(handler)
+
+    for label, sampling in (("queue", ""), ("queue + sampling 0.1", "db.mongo=0.1")):
+        log_config.setup_logging(level="INFO", fmt="text", sampling=sampling,
+                                 target=logging.StreamHandler(devnull))
+        results[label] = _measure(calls)
+        log_config.shutdown_logging()
+
+    root.setLevel(logging.WARNING)
+    results["disabled (WARNING)"] = _measure(calls)
+
+    print(f"calls={calls}")
+    for label, ns in results.items():
+        print(f"{label:<24} {ns:8.0f} ns/call")
+    devnull.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200_000)
+    run(parser.parse_args().calls)
+
+
+if __name__ == "__main__":
+    main()
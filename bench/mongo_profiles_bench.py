@@ -0,0 +1,111 @@
+"""Бенчмарк профилей операций MongoDB (`db/mongo_config.py`).
+
+Каждый профиль прогоняется отдельно на своей операции:
+
+* history_read  — `get_messages` (страница истории);
+* chat_list     — выборка чатов пользователя из `chats_info`;
+* message_write — `add_message_mongo`.
+
+Параметры профиля задаются флагами, настройки клиента — переменными
+окружения `MONGO_*` (см. `MongoClientSettings`). Нужен запущенный MongoDB,
+для secondary-чтений — реплика-сет.
+
+    python -m bench.mongo_profiles_bench --profile message_write --w majority --j true
+    python -m bench.mongo_profiles_bench --profile history_read --read-preference secondaryPreferred
+"""
+
+import time
+import asyncio
+import argparse
+import statistics
+from uuid import uuid4
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from db import mongo as MongoDB
+from db import mongo_config
+from db.mongo_config import MongoClientSettings, OperationProfile, profiled
+
+
+async def _op_history_read(db, chat_id, user_id):
+    await MongoDB.get_messages(db, chat_id, 50, 0)
+
+
+async def _op_chat_list(db, chat_id, user_id):
+    await profiled(db, "chats_info", "chat_list").find({"members.user_id": user_id}).to_list(length=None)
+
+
+async def _op_message_write(db, chat_id, user_id):
+    await MongoDB.add_message_mongo(db, chat_id=chat_id, sender_id=user_id, content="bench")
+
+
+OPERATIONS = {
+    "history_read": _op_history_read,
+    "chat_list": _op_chat_list,
+    "message_write": _op_message_write,
+}
+
+
+async def run(args) -> None:
+    w = args.w
+    profile = OperationProfile(
+        read_preference=args.read_preference,
+        max_staleness_seconds=args.max_staleness,
+        read_concern=args.read_concern,
+        w=int(w) if w and w.isdigit() else w,
+        j=None if args.j is None else args.j == "true",
+        wtimeout_ms=args.wtimeout_ms,
+    )
+    mongo_config.configure_profile(args.profile, profile)
+
+    settings = MongoClientSettings.from_env()
+    client = AsyncIOMotorClient(settings.url, **settings.client_kwargs())
+    db = client[args.db]
+    chat_id, user_id = str(uuid4()), 1
+    try:
+        await MongoDB.ensure_indexes(db)
+        await MongoDB.add_members_to_chat(db, chat_id=chat_id, user_id=user_id, user_name="bench", avatar="")
+        for _ in range(200):
+            await MongoDB.add_message_mongo(db, chat_id=chat_id, sender_id=user_id, content="seed")
+
+        op = OPERATIONS[args.profile]
+        samples = []
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                await op(db, chat_id, user_id)
+                samples.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.ops)))
+        elapsed = time.perf_counter() - started
+
+        samples.sort()
+        pct = lambda q: samples[min(int(len(samples) * q), len(samples) - 1)]
+        print(f"profile={args.profile} {profile}")
+        print(f"ops={args.ops} concurrency={args.concurrency} throughput={args.ops / elapsed:.0f} ops/s")
+        print(f"latency ms: p50={statistics.median(samples):.2f} p95={pct(0.95):.2f} p99={pct(0.99):.2f}")
+    finally:
+        await client.drop_database(args.db)
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(OPERATIONS), required=True)
+    parser.add_argument("--read-preference", default="primary")
+    parser.add_argument("--max-staleness", type=int, default=-1)
+    parser.add_argument("--read-concern", default=None)
+    parser.add_argument("--w", default=None)
+    parser.add_argument("--j", choices=["true", "false"], default=None)
+    parser.add_argument("--wtimeout-ms", type=int, default=None)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--db", default="chat_bench_profiles")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
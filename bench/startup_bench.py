@@ -0,0 +1,82 @@
+"""Бенчмарк старта сервиса: время импорта и время до первого запроса.
+
+    python -m bench.startup_bench --runs 5
+
+* import — `python -c "import main"` в отдельном процессе (холодный интерпретатор);
+* first request — от запуска uvicorn до первого ответа `/health`;
+* ready — от запуска uvicorn до 200 на `/ready` (пулы MongoDB/HTTP прогреты).
+  Без доступного MongoDB `/ready` не станет зелёным — колонка будет `-`.
+"""
+
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], check=True)
+    return time.perf_counter() - started
+
+
+def _wait_for(url: str, started: float, deadline: float):
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=0.5) as resp:
+                if resp.status == 200:
+                    return time.perf_counter() - started
+        except Exception:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def measure_server(timeout: float):
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+    )
+    try:
+        deadline = started + timeout
+        first = _wait_for(f"http://127.0.0.1:{port}/health", started, deadline)
+        ready = _wait_for(f"http://127.0.0.1:{port}/ready", started, deadline)
+        return first, ready
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _fmt(samples) -> str:
+    values = [s for s in samples if s is not None]
+    if not values:
+        return "-"
+    return f"{statistics.median(values) * 1000:8.1f} ms (min {min(values) * 1000:.1f})"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=15, help="ожидание /ready на один запуск, сек")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    servers = [measure_server(args.timeout) for _ in range(args.runs)]
+
+    print(f"import main      {_fmt(imports)}")
+    print(f"first request    {_fmt([s[0] for s in servers])}")
+    print(f"ready            {_fmt([s[1] for s in servers])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Операции горячего пути на хранилище в памяти (`db/memory_storage.py`).
+
+Меряет запись сообщения, проверку членства, страницу истории и
+дельта-синхронизацию на `MemoryStorage` — нижнюю границу стоимости логики
+хранилища без сети и MongoDB. Mongo-реализацию сравнивают на стенде через
+`bench/mongo_profiles_bench.py`.
+
+    python -m bench.storage_bench --chats 1000 --messages 200 --iterations 20000
+"""
+
+import time
+import asyncio
+import argparse
+
+from db.memory_storage import MemoryStorage
+
+
+async def _per_op(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        await fn(i)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def run(chats: int, messages: int, iterations: int) -> None:
+    storage = MemoryStorage(max_messages=0)
+    owner = {"user_id": 1, "user_name": "owner", "avatar": ""}
+    chat_ids = []
+    for i in range(chats):
+        chat_ids.append(await storage.create_group_chat(f"chat-{i}", owner, [
+            {"user_id": 100 + j, "user_name": f"user-{j}", "avatar": ""} for j in range(20)
+        ]))
+        for j in range(messages):
+            await storage.add_message(chat_ids[-1], 100 + j % 20, "Привет! " * 4, client_msg_id=f"k{j}")
+
+    def chat(i: int) -> str:
+        return chat_ids[i % chats]
+
+    results = {
+        "add_message": await _per_op(
+            lambda i: storage.add_message(chat(i), 101, "Привет! " * 4, client_msg_id=f"b{i}"), iterations
+        ),
+        "is_member": await _per_op(lambda i: storage.is_member(chat(i), 110), iterations),
+        "get_messages(50)": await _per_op(lambda i: storage.get_messages(chat(i), 50, 0), iterations),
+        "get_messages_after(100)": await _per_op(
+            lambda i: storage.get_messages_after(chat(i), messages // 2, 100), iterations
+        ),
+    }
+
+    print(f"chats={chats} messages={messages} iterations={iterations}\n")
+    print(f"{'операция':26} {'µs/op':>8}")
+    for name, us in results.items():
+        print(f"{name:26} {us:>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.chats, args.messages, args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Холодный архив истории сообщений.
+
+Фоновая задача `archival_loop` переносит сообщения старше `ARCHIVE_AFTER_DAYS`
+(и/или сверх `ARCHIVE_HOT_LIMIT` самых новых в чате) из горячего хранилища
+(`chats_msgs` или корзин `chats_msgs_buckets`) в сжатые блоки архива.
+
+Блок — до `ARCHIVE_BLOCK_SIZE` сообщений одного чата, сериализованных в BSON
+и сжатых zlib. Номера блоков растут вместе со временем: блок N+1 всегда новее
+блока N. Хранилище блоков — коллекция `chats_archive` или локальные файлы
+(`ARCHIVE_BACKEND`). Распакованные блоки кэшируются в памяти (LRU).
+
+`get_messages` дочитывает страницу из архива, когда она выходит за пределы
+горячих данных.
+"""
+
+import os
+import re
+import zlib
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+from bson.binary import Binary
+from motor.motor_asyncio import AsyncIOMotorClient
+import src.concts as c
+from db import mongo_buckets
+
+logger = logging.getLogger(__name__)
+
+
+#region block storage
+def _encode(messages: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(bson.encode({"messages": messages}), 6)
+
+
+def _decode(data: bytes) -> List[Dict[str, Any]]:
+    return bson.decode(zlib.decompress(data))["messages"]
+
+
+class MongoArchiveStore:
+    """Блоки архива в коллекции `chats_archive`."""
+
+    async def list_blocks(self, client: AsyncIOMotorClient, chat_id: str) -> List[Dict[str, Any]]:
+        return await client.chats_archive.find(
+            {"chat_id": chat_id}, {"_id": 0, "block": 1, "count": 1, "last_ts": 1}
+        ).sort("block", 1).to_list(length=None)
+
+    async def write_block(self, client: AsyncIOMotorClient, chat_id: str, block: int,
+                          messages: List[Dict[str, Any]]) -> None:
+        await client.chats_archive.insert_one(
+            {
+                "chat_id": chat_id,
+                "block": block,
+                "count": len(messages),
+                "first_ts": messages[0]["timestamp"],
+                "last_ts": messages[-1]["timestamp"],
+                "data": Binary(_encode(messages)),
+            }
+        )
+
+    async def read_block(self, client: AsyncIOMotorClient, chat_id: str, block: int) -> List[Dict[str, Any]]:
+        doc = await client.chats_archive.find_one({"chat_id": chat_id, "block": block}, {"data": 1})
+        return _decode(doc["data"]) if doc else []
+
+
+_SAFE_CHAT_ID = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+class FileArchiveStore:
+    """Блоки архива в файлах `ARCHIVE_DIR/<chat_id>/<block>-<count>-<last_ts>.zbson`.
+
+    `chat_id` становится именем каталога, поэтому допускаются только буквы,
+    цифры, `_` и `-` (UUID чатов) — иначе `ValueError`.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, chat_id: str) -> str:
+        if not _SAFE_CHAT_ID.fullmatch(chat_id):
+            raise ValueError(f"Недопустимый chat_id для файлового архива: {chat_id!r}")
+        return os.path.join(self.root, chat_id)
+
+    def _list(self, chat_id: str) -> List[Dict[str, Any]]:
+        try:
+            names = os.listdir(self._dir(chat_id))
+        except FileNotFoundError:
+            return []
+        blocks = []
+        for name in names:
+            if not name.endswith(".zbson"):
+                continue
+            block, count, last_ts = name[:-len(".zbson")].split("-")
+            blocks.append({
+                "block": int(block),
+                "count": int(count),
+                "last_ts": datetime.fromtimestamp(int(last_ts) / 1000, timezone.utc).replace(tzinfo=None),
+                "file": name,
+            })
+        return sorted(blocks, key=lambda b: b["block"])
+
+    def _write(self, chat_id: str, block: int, messages: List[Dict[str, Any]]) -> None:
+        os.makedirs(self._dir(chat_id), exist_ok=True)
+        last_ts = messages[-1]["timestamp"].replace(tzinfo=timezone.utc)
+        name = f"{block:08d}-{len(messages)}-{int(last_ts.timestamp() * 1000)}.zbson"
+        tmp = os.path.join(self._dir(chat_id), name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(_encode(messages))
+        os.replace(tmp, os.path.join(self._dir(chat_id), name))
+
+    def _read(self, chat_id: str, block: int) -> List[Dict[str, Any]]:
+        for meta in self._list(chat_id):
+            if meta["block"] == block:
+                with open(os.path.join(self._dir(chat_id), meta["file"]), "rb") as f:
+                    return _decode(f.read())
+        return []
+
+    async def list_blocks(self, client, chat_id: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._list, chat_id)
+
+    async def write_block(self, client, chat_id: str, block: int, messages: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self._write, chat_id, block, messages)
+
+    async def read_block(self, client, chat_id: str, block: int) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read, chat_id, block)
+
+
+store = FileArchiveStore(c.ARCHIVE_DIR) if c.ARCHIVE_BACKEND == "file" else MongoArchiveStore()
+
+
+class _BlockCache:
+    """LRU-кэш распакованных блоков. Блоки неизменяемы, инвалидация не нужна."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, int], List[Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, int]) -> Optional[List[Dict[str, Any]]]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[str, int], value: List[Dict[str, Any]]) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+block_cache = _BlockCache(c.ARCHIVE_CACHE_BLOCKS)
+#endregion
+
+
+#region read path
+async def _read_block_cached(client: AsyncIOMotorClient, chat_id: str, block: int) -> List[Dict[str, Any]]:
+    key = (chat_id, block)
+    messages = block_cache.get(key)
+    if messages is None:
+        messages = await store.read_block(client, chat_id, block)
+        block_cache.put(key, messages)
+    return messages
+
+
+async def hot_count(client: AsyncIOMotorClient, chat_id: str) -> int:
+    """Количество сообщений чата в горячем хранилище."""
+    if c.MSG_STORAGE_LAYOUT == "bucket":
+        return await mongo_buckets.count_messages(client, chat_id)
+    return await client.chats_msgs.count_documents({"chat_id": chat_id})
+
+
+async def get_archived_page(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    limit: int,
+    offset: int
+) -> List[Dict[str, Any]]:
+    """Возвращает страницу архивных сообщений (от новых к старым).
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chat_id (str): Идентификатор чата.
+        limit (int): Максимальное количество сообщений.
+        offset (int): Сколько самых новых архивных сообщений пропустить.
+
+    Returns:
+        list[dict]: Сырые документы сообщений с `chat_id`.
+    """
+    blocks = await store.list_blocks(client, chat_id)
+    page: List[Dict[str, Any]] = []
+    skip = offset
+    for meta in reversed(blocks):
+        if len(page) >= limit:
+            break
+        if skip >= meta["count"]:
+            skip -= meta["count"]
+            continue
+        messages = await _read_block_cached(client, chat_id, meta["block"])
+        newest_first = messages[::-1][skip:]
+        skip = 0
+        page.extend(newest_first[:limit - len(page)])
+    return [dict(m, chat_id=chat_id) for m in page]
+
+
+async def archived_seq(client: AsyncIOMotorClient, chat_id: str) -> int:
+    """Наибольший `seq` среди архивных сообщений чата (0 — архива нет).
+
+    Блоки пишутся по возрастанию времени, поэтому достаточно последнего.
+    """
+    if not c.ARCHIVE_ENABLED:
+        return 0
+    blocks = await store.list_blocks(client, chat_id)
+    if not blocks:
+        return 0
+    messages = await _read_block_cached(client, chat_id, blocks[-1]["block"])
+    return max((m.get("seq") or 0 for m in messages), default=0)
+
+
+async def complete_page(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    hot_page: List[Dict[str, Any]],
+    limit: int,
+    offset: int
+) -> List[Dict[str, Any]]:
+    """Дополняет неполную горячую страницу сообщениями из архива.
+
+    При выключенной архивации (`ARCHIVE_ENABLED`) архив не читается.
+    """
+    if len(hot_page) >= limit or not c.ARCHIVE_ENABLED:
+        return hot_page
+    if not await store.list_blocks(client, chat_id):
+        return hot_page
+
+    #Горячие данные закончились: если страница пустая, узнаём сколько их было
+    hot_total = offset + len(hot_page) if hot_page else await hot_count(client, chat_id)
+    archived = await get_archived_page(client, chat_id, limit - len(hot_page), max(offset - hot_total, 0))
+    return hot_page + archived
+#endregion
+
+
+#region archival
+def _now() -> datetime:
+    #Тот же сдвиг, что и при записи сообщений в add_message_mongo
+    return (datetime.now(timezone.utc) + timedelta(hours=3)).replace(tzinfo=None)
+
+
+async def _chat_cutoff(client: AsyncIOMotorClient, chat_id: str, age_cutoff: datetime) -> datetime:
+    """Граница архивации чата: старше возраста или за пределами `ARCHIVE_HOT_LIMIT`."""
+    if c.ARCHIVE_HOT_LIMIT <= 0:
+        return age_cutoff
+    if c.MSG_STORAGE_LAYOUT == "bucket":
+        edge = await mongo_buckets.get_messages_page(client, chat_id, 1, c.ARCHIVE_HOT_LIMIT - 1)
+    else:
+        edge = await client.chats_msgs.find({"chat_id": chat_id}, {"timestamp": 1}) \
+            .sort("timestamp", -1).skip(c.ARCHIVE_HOT_LIMIT - 1).limit(1).to_list(length=1)
+    if not edge:
+        return age_cutoff
+    return max(age_cutoff, edge[0]["timestamp"])
+
+
+async def _write_blocks(client: AsyncIOMotorClient, chat_id: str, next_block: int,
+                        messages: List[Dict[str, Any]]) -> int:
+    size = c.ARCHIVE_BLOCK_SIZE
+    for i in range(0, len(messages), size):
+        await store.write_block(client, chat_id, next_block, messages[i:i + size])
+        next_block += 1
+    return next_block
+
+
+async def archive_chat(client: AsyncIOMotorClient, chat_id: str, cutoff: datetime) -> int:
+    """Переносит сообщения чата старше `cutoff` в архив.
+
+    Сначала пишется блок, затем удаляются горячие документы. Если процесс
+    упал между этими шагами, следующий запуск удалит из горячего хранилища
+    оставшиеся сообщения последнего архивного блока, и дублей не будет.
+    В плоской схеме они удаляются по `msg_id` из блока: по времени нельзя —
+    неархивированное сообщение может иметь ту же метку, что и последнее
+    архивное.
+
+    Returns:
+        int: Количество перенесённых сообщений.
+    """
+    blocks = await store.list_blocks(client, chat_id)
+    next_block = blocks[-1]["block"] + 1 if blocks else 0
+    archived_until = blocks[-1]["last_ts"] if blocks else None
+    cutoff = await _chat_cutoff(client, chat_id, cutoff)
+    moved = 0
+
+    if c.MSG_STORAGE_LAYOUT == "bucket":
+        head = await client.chats_msgs_buckets.find_one(
+            {"chat_id": chat_id}, {"bucket": 1}, sort=[("bucket", -1)]
+        )
+        if not head:
+            return 0
+        query = {
+            "chat_id": chat_id,
+            "bucket": {"$lt": head["bucket"]},
+            "last_ts": {"$lt": cutoff},
+        }
+        if archived_until is not None:
+            #Корзины, уже попавшие в архив до сбоя, только удаляем
+            await client.chats_msgs_buckets.delete_many(
+                {"chat_id": chat_id, "bucket": {"$lt": head["bucket"]}, "last_ts": {"$lte": archived_until}}
+            )
+        buckets = await client.chats_msgs_buckets.find(query).sort("bucket", 1).to_list(length=None)
+        messages = [m for b in buckets for m in b.get("messages", [])]
+        if messages:
+            await _write_blocks(client, chat_id, next_block, messages)
+            await client.chats_msgs_buckets.delete_many({"_id": {"$in": [b["_id"] for b in buckets]}})
+            moved = len(messages)
+    else:
+        #Блок пишется и удаляется по одному, поэтому после сбоя могли остаться только сообщения последнего блока
+        if archived_until is not None and await client.chats_msgs.find_one(
+            {"chat_id": chat_id, "timestamp": {"$lte": archived_until}}, {"_id": 1}
+        ):
+            archived = await _read_block_cached(client, chat_id, blocks[-1]["block"])
+            await client.chats_msgs.delete_many(
+                {"chat_id": chat_id, "msg_id": {"$in": [m["msg_id"] for m in archived]}}
+            )
+        cursor = client.chats_msgs.find(
+            {"chat_id": chat_id, "timestamp": {"$lt": cutoff}}, {"_id": 0, "chat_id": 0}
+        ).sort("timestamp", 1)
+        batch: List[Dict[str, Any]] = []
+        async for m in cursor:
+            batch.append(m)
+            if len(batch) == c.ARCHIVE_BLOCK_SIZE:
+                next_block = await _write_blocks(client, chat_id, next_block, batch)
+                await client.chats_msgs.delete_many({"msg_id": {"$in": [x["msg_id"] for x in batch]}})
+                moved += len(batch)
+                batch = []
+        if batch:
+            await _write_blocks(client, chat_id, next_block, batch)
+            await client.chats_msgs.delete_many({"msg_id": {"$in": [x["msg_id"] for x in batch]}})
+            moved += len(batch)
+
+    if moved:
+        logger.info("Чат %s: в архив перенесено %d сообщений", chat_id, moved)
+    return moved
+
+
+async def run_archival(client: AsyncIOMotorClient) -> int:
+    """Один проход архивации по всем чатам.
+
+    Returns:
+        int: Общее количество перенесённых сообщений.
+    """
+    age_cutoff = _now() - timedelta(days=c.ARCHIVE_AFTER_DAYS)
+    if c.ARCHIVE_HOT_LIMIT > 0:
+        chat_ids = await client.chats_info.distinct("chat_id")
+    elif c.MSG_STORAGE_LAYOUT == "bucket":
+        chat_ids = await client.chats_msgs_buckets.distinct("chat_id", {"last_ts": {"$lt": age_cutoff}})
+    else:
+        chat_ids = await client.chats_msgs.distinct("chat_id", {"timestamp": {"$lt": age_cutoff}})
+
+    total = 0
+    for chat_id in chat_ids:
+        try:
+            total += await archive_chat(client, chat_id, age_cutoff)
+        except Exception as e:
+            logger.error("Ошибка архивации чата %s: %s", chat_id, e, exc_info=True)
+    return total
+
+
+async def archival_loop(client: AsyncIOMotorClient) -> None:
+    """Фоновая архивация раз в `ARCHIVE_INTERVAL` секунд (запускается из lifespan)."""
+    while True:
+        try:
+            moved = await run_archival(client)
+            logger.info("Архивация завершена, перенесено сообщений: %d", moved)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка фоновой архивации: %s", e, exc_info=True)
+        await asyncio.sleep(c.ARCHIVE_INTERVAL)
+#endregion
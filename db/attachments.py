@@ -0,0 +1,254 @@
+"""Вложения сообщений: потоковая загрузка и выдача по диапазонам.
+
+Содержимое хранится в GridFS (бакет `attachments`) или в локальных файлах
+`ATTACHMENT_DIR/<attachment_id>` (`ATTACHMENT_BACKEND`), метаданные — в
+коллекции `attachments`:
+
+    {attachment_id, chat_id, uploader_id, filename, content_type, length,
+     sha256, backend, created_at}
+
+Загрузка и выдача идут кусками по `ATTACHMENT_CHUNK_SIZE`, поэтому память на
+один файл постоянна и не зависит от его размера. Сообщение ссылается на
+вложения списком `attachments` с их идентификаторами.
+
+Тип содержимого задаёт загрузивший, поэтому при выдаче ему не доверяют:
+встроенно (`inline`) показываются только типы из `INLINE_CONTENT_TYPES`,
+всё остальное отдаётся как `application/octet-stream` на скачивание
+(`served_type`). Иначе HTML или SVG исполнялся бы как скрипт на домене API.
+"""
+
+import os
+import hashlib
+import asyncio
+import logging
+from uuid import uuid4
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+import src.concts as c
+
+logger = logging.getLogger(__name__)
+
+
+class AttachmentTooLarge(Exception):
+    """Файл превышает `ATTACHMENT_MAX_BYTES`."""
+
+
+#region content storage
+class GridFSAttachmentStore:
+    """Содержимое вложений в GridFS (бакет `attachments`)."""
+
+    name = "gridfs"
+
+    def _bucket(self, client: AsyncIOMotorClient) -> AsyncIOMotorGridFSBucket:
+        return AsyncIOMotorGridFSBucket(client, bucket_name="attachments")
+
+    async def open_writer(self, client, attachment_id: str, filename: str):
+        return self._bucket(client).open_upload_stream_with_id(
+            attachment_id, filename, chunk_size_bytes=c.ATTACHMENT_CHUNK_SIZE
+        )
+
+    async def iter_range(self, client, attachment_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        grid_out = await self._bucket(client).open_download_stream(attachment_id)
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(c.ATTACHMENT_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class _FileWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp = path + ".part"
+        self._file = open(self._tmp, "wb")
+
+    async def write(self, chunk: bytes) -> None:
+        await asyncio.to_thread(self._file.write, chunk)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._file.close)
+        os.replace(self._tmp, self.path)
+
+    async def abort(self) -> None:
+        self._file.close()
+        os.remove(self._tmp)
+
+
+class FileAttachmentStore:
+    """Содержимое вложений в файлах `ATTACHMENT_DIR/<attachment_id>`."""
+
+    name = "file"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, attachment_id: str) -> str:
+        return os.path.join(self.root, attachment_id)
+
+    async def open_writer(self, client, attachment_id: str, filename: str) -> _FileWriter:
+        os.makedirs(self.root, exist_ok=True)
+        return _FileWriter(self._path(attachment_id))
+
+    async def iter_range(self, client, attachment_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self._path(attachment_id), "rb")
+        try:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(c.ATTACHMENT_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+
+STORES = {
+    "gridfs": GridFSAttachmentStore(),
+    "file": FileAttachmentStore(c.ATTACHMENT_DIR),
+}
+store = STORES.get(c.ATTACHMENT_BACKEND, STORES["gridfs"])
+#endregion
+
+
+#region public API
+#Картинки, звук и видео, которые браузер показывает сам и не исполняет как скрипт (SVG сюда не входит)
+INLINE_CONTENT_TYPES = frozenset({
+    "image/png", "image/jpeg", "image/gif", "image/webp",
+    "audio/mpeg", "audio/ogg", "audio/wav", "audio/webm", "audio/mp4",
+    "video/mp4", "video/webm", "video/ogg",
+})
+
+
+def served_type(content_type: Optional[str]) -> Tuple[str, str]:
+    """Тип выдачи и вид `Content-Disposition` для вложения.
+
+    Args:
+        content_type (str): MIME-тип, указанный при загрузке.
+
+    Returns:
+        tuple[str, str]: `(media_type, "inline")` для типов из
+        `INLINE_CONTENT_TYPES`, иначе `("application/octet-stream", "attachment")`.
+    """
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type in INLINE_CONTENT_TYPES:
+        return media_type, "inline"
+    return "application/octet-stream", "attachment"
+
+
+async def ensure_indexes(client: AsyncIOMotorClient) -> None:
+    await client.attachments.create_index("attachment_id", unique=True)
+    await client.attachments.create_index([("chat_id", 1), ("created_at", -1)])
+
+
+async def save_attachment(
+    client: AsyncIOMotorClient,
+    chunks: AsyncIterator[bytes],
+    chat_id: str,
+    uploader_id: int,
+    filename: str,
+    content_type: str,
+) -> Dict[str, Any]:
+    """Потоково сохраняет вложение и записывает его метаданные.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chunks (AsyncIterator[bytes]): Куски содержимого (например, `request.stream()`).
+        chat_id (str): Чат, в котором загружено вложение.
+        uploader_id (int): Кто загрузил.
+        filename (str): Имя файла.
+        content_type (str): MIME-тип.
+
+    Returns:
+        dict: Метаданные вложения.
+
+    Raises:
+        AttachmentTooLarge: Размер превысил `ATTACHMENT_MAX_BYTES` (частично
+            записанные данные удаляются).
+    """
+    attachment_id = str(uuid4())
+    writer = await store.open_writer(client, attachment_id, filename)
+    digest = hashlib.sha256()
+    length = 0
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            length += len(chunk)
+            if length > c.ATTACHMENT_MAX_BYTES:
+                raise AttachmentTooLarge(f"Файл больше {c.ATTACHMENT_MAX_BYTES} байт")
+            digest.update(chunk)
+            await writer.write(chunk)
+    except BaseException:
+        await writer.abort()
+        raise
+    await writer.close()
+
+    meta = {
+        "attachment_id": attachment_id,
+        "chat_id": chat_id,
+        "uploader_id": uploader_id,
+        "filename": filename,
+        "content_type": content_type,
+        "length": length,
+        "sha256": digest.hexdigest(),
+        "backend": store.name,
+        "created_at": datetime.now(timezone.utc),
+    }
+    await client.attachments.insert_one(dict(meta))
+    logger.info("Вложение %s сохранено (%d байт, %s)", attachment_id, length, store.name)
+    return meta
+
+
+async def get_attachment(client: AsyncIOMotorClient, attachment_id: str) -> Optional[Dict[str, Any]]:
+    return await client.attachments.find_one({"attachment_id": attachment_id}, {"_id": 0})
+
+
+async def count_chat_attachments(client: AsyncIOMotorClient, chat_id: str, attachment_ids: List[str]) -> int:
+    """Сколько из `attachment_ids` загружено в этот чат (проверка ссылок из сообщения)."""
+    return await client.attachments.count_documents(
+        {"attachment_id": {"$in": list(attachment_ids)}, "chat_id": chat_id}
+    )
+
+
+def iter_content(client: AsyncIOMotorClient, meta: Dict[str, Any], start: int, end: int) -> AsyncIterator[bytes]:
+    """Куски содержимого вложения в диапазоне байт `[start, end]` включительно."""
+    backend = STORES.get(meta.get("backend"), store)
+    return backend.iter_range(client, meta["attachment_id"], start, end)
+
+
+def parse_range(header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Разбирает заголовок `Range` (один диапазон байт).
+
+    Returns:
+        Optional[tuple[int, int]]: `(start, end)` включительно или None, если
+        заголовка нет (отдаётся весь файл).
+
+    Raises:
+        ValueError: Диапазон некорректен или не пересекается с файлом (416).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError("Поддерживается только один диапазон байт")
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) if last else length - 1
+    else:
+        suffix = int(last)
+        if suffix <= 0:
+            raise ValueError("Пустой диапазон")
+        start, end = max(length - suffix, 0), length - 1
+    end = min(end, length - 1)
+    if start > end or start >= length:
+        raise ValueError("Диапазон вне файла")
+    return start, end
+#endregion
@@ -0,0 +1,197 @@
+"""Хранилище участников групповых чатов.
+
+Участники групповых чатов (`chat_type="group"`) лежат отдельными
+документами коллекции `chat_members`:
+
+    {chat_id, user_id, user_name, avatar, role, joined_at}
+
+с уникальным индексом `(chat_id, user_id)` и индексом `(user_id, chat_id)`.
+Проверка членства — точечный запрос по индексу, добавление и удаление
+участника не переписывают документ чата, список участников листается по
+ключу `user_id`. В `chats_info` группового чата хранится только счётчик
+`member_count`.
+
+Личные чаты (`simple`) по-прежнему держат двух участников во встроенном
+массиве `members`.
+"""
+
+import logging
+from uuid import uuid4
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logger = logging.getLogger(__name__)
+
+ROLE_OWNER = "owner"
+ROLE_ADMIN = "admin"
+ROLE_MEMBER = "member"
+
+_MEMBER_PROJECTION = {"_id": 0, "user_id": 1, "user_name": 1, "avatar": 1, "role": 1}
+
+
+def _member_doc(chat_id: str, member: Dict[str, Any], role: str) -> Dict[str, Any]:
+    return {
+        "chat_id": chat_id,
+        "user_id": member["user_id"],
+        "user_name": member["user_name"],
+        "avatar": member.get("avatar", ""),
+        "role": role,
+        "joined_at": datetime.now(timezone.utc),
+    }
+
+
+async def ensure_indexes(client: AsyncIOMotorClient) -> None:
+    await client.chat_members.create_index([("chat_id", 1), ("user_id", 1)], unique=True)
+    await client.chat_members.create_index([("user_id", 1), ("chat_id", 1)])
+
+
+async def create_group_chat(
+    client: AsyncIOMotorClient,
+    chat_name: str,
+    owner: Dict[str, Any],
+    members: List[Dict[str, Any]],
+) -> str:
+    """Создаёт групповой чат с владельцем и начальными участниками.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chat_name (str): Название чата.
+        owner (dict): Создатель `{"user_id", "user_name", "avatar"}`.
+        members (List[dict]): Остальные участники в том же формате.
+
+    Returns:
+        str: Идентификатор созданного чата.
+
+    Raises:
+        Exception: При ошибке записи в базу данных.
+    """
+    chat_id = str(uuid4())
+    docs = [_member_doc(chat_id, owner, ROLE_OWNER)]
+    seen = {owner["user_id"]}
+    for m in members:
+        if m["user_id"] not in seen:
+            seen.add(m["user_id"])
+            docs.append(_member_doc(chat_id, m, ROLE_MEMBER))
+
+    try:
+        await client.chats_info.insert_one(
+            {
+                "chat_id": chat_id,
+                "chat_type": "group",
+                "chat_name": chat_name,
+                "owner_id": owner["user_id"],
+                "member_count": len(docs),
+                "members": [],
+                "messages": [],
+            }
+        )
+        await client.chat_members.insert_many(docs, ordered=False)
+        logger.info("Создан групповой чат %s, участников: %d", chat_id, len(docs))
+        return chat_id
+    except Exception as e:
+        logger.error("Ошибка при создании группового чата: %s", e, exc_info=True)
+        raise
+
+
+async def get_member(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    user_id: int
+) -> Optional[Dict[str, Any]]:
+    """Участник группового чата или None (точечный запрос по индексу)."""
+    return await client.chat_members.find_one(
+        {"chat_id": chat_id, "user_id": user_id}, _MEMBER_PROJECTION
+    )
+
+
+async def is_member(client: AsyncIOMotorClient, chat_id: str, user_id: int) -> bool:
+    """Проверяет, состоит ли пользователь в чате любого типа.
+
+    Из `chats_info` читается только тип чата и (для личных чатов) совпавший
+    элемент `members`, поэтому стоимость не зависит от размера чата.
+    """
+    chat = await client.chats_info.find_one(
+        {"chat_id": chat_id},
+        {"chat_type": 1, "members": {"$elemMatch": {"user_id": user_id}}},
+    )
+    if not chat:
+        return False
+    if chat.get("chat_type") == "group":
+        return await get_member(client, chat_id, user_id) is not None
+    return bool(chat.get("members"))
+
+
+async def add_member(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    member: Dict[str, Any],
+    role: str = ROLE_MEMBER
+) -> bool:
+    """Добавляет участника в групповой чат.
+
+    Returns:
+        bool: True — участник добавлен, False — уже состоял в чате.
+    """
+    doc = _member_doc(chat_id, member, role)
+    result = await client.chat_members.update_one(
+        {"chat_id": chat_id, "user_id": member["user_id"]},
+        {"$setOnInsert": doc},
+        upsert=True,
+    )
+    if result.upserted_id is None:
+        return False
+    await client.chats_info.update_one({"chat_id": chat_id}, {"$inc": {"member_count": 1}})
+    logger.info("Участник %s добавлен в групповой чат %s", member["user_id"], chat_id)
+    return True
+
+
+async def remove_member(client: AsyncIOMotorClient, chat_id: str, user_id: int) -> bool:
+    """Удаляет участника из группового чата.
+
+    Returns:
+        bool: True — участник удалён, False — не состоял в чате.
+    """
+    result = await client.chat_members.delete_one({"chat_id": chat_id, "user_id": user_id})
+    if not result.deleted_count:
+        return False
+    await client.chats_info.update_one({"chat_id": chat_id}, {"$inc": {"member_count": -1}})
+    logger.info("Участник %s удалён из группового чата %s", user_id, chat_id)
+    return True
+
+
+async def list_members(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    limit: int,
+    after_user_id: int = 0
+) -> Dict[str, Any]:
+    """Страница участников группового чата по возрастанию `user_id`.
+
+    Пагинация по ключу: следующая страница запрашивается с
+    `after_user_id=next_after`, поэтому глубокие страницы не дороже первой.
+
+    Returns:
+        dict: `members` — участники страницы; `next_after` — курсор следующей
+        страницы или None, если это последняя.
+    """
+    docs = await (
+        client.chat_members.find(
+            {"chat_id": chat_id, "user_id": {"$gt": after_user_id}}, _MEMBER_PROJECTION
+        )
+        .sort("user_id", 1)
+        .limit(limit + 1)
+        .to_list(length=None)
+    )
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    return {
+        "members": docs,
+        "next_after": docs[-1]["user_id"] if has_more else None,
+    }
+
+
+async def group_chat_ids(client: AsyncIOMotorClient, user_id: int) -> List[str]:
+    """Идентификаторы групповых чатов пользователя."""
+    return await client.chat_members.distinct("chat_id", {"user_id": user_id})
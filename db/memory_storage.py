@@ -0,0 +1,240 @@
+"""Хранилище в памяти процесса (`STORAGE_BACKEND=memory`).
+
+Повторяет поведение `MongoStorage` на словарях с индексами:
+
+- чаты по `chat_id`, личные чаты по паре участников, чаты пользователя по
+  `user_id` — поиск чата и проверка членства за O(1);
+- участники групповых чатов — словарь и отсортированный список `user_id`
+  (постраничный вывод по ключу через `bisect`);
+- сообщения чата — список по возрастанию `seq`: страница истории и
+  дельта-синхронизация — срезы по индексу, без сортировки; ключи
+  идемпотентности — словарь на чат.
+
+В чате хранится не больше `MEMORY_STORAGE_MAX_MESSAGES` последних
+сообщений (0 — без ограничения). Операции не уступают управление циклу
+событий посередине, поэтому атомарны без блокировок. Данные теряются при
+перезапуске; несколько процессов не видят данных друг друга.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from uuid import uuid4
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import src.concts as c
+from db import members as ChatMembers
+from db.mongo import _message_out
+from db.storage import Storage
+from schemas import message as MsgModel
+
+
+def _member(member: Dict[str, Any]) -> Dict[str, Any]:
+    return {"user_id": member["user_id"], "user_name": member["user_name"], "avatar": member.get("avatar", "")}
+
+
+class _ChatMessages:
+    """Сообщения одного чата по возрастанию `seq` и их ключи идемпотентности."""
+
+    def __init__(self):
+        self.items: List[Dict[str, Any]] = []
+        self.last_seq = 0
+        #Наибольший seq среди вытесненных сообщений
+        self.trimmed_seq = 0
+        self.keys: Dict[Tuple[int, str], Dict[str, Any]] = {}
+
+    def index_after(self, seq: int) -> int:
+        """Индекс первого сообщения с `seq` больше заданного."""
+        if not self.items:
+            return 0
+        return min(max(seq - self.items[0]["seq"] + 1, 0), len(self.items))
+
+    def trim(self, limit: int) -> None:
+        #Срезаем с запасом, чтобы не сдвигать список на каждое сообщение
+        if limit <= 0 or len(self.items) <= limit + limit // 4:
+            return
+        dropped, self.items = self.items[:-limit], self.items[-limit:]
+        self.trimmed_seq = dropped[-1]["seq"]
+        for m in dropped:
+            if m.get("client_msg_id"):
+                self.keys.pop((m["sender_id"], m["client_msg_id"]), None)
+
+
+class MemoryStorage(Storage):
+    """Чаты, участники и сообщения в словарях процесса."""
+
+    name = "memory"
+
+    def __init__(self, max_messages: Optional[int] = None):
+        self.max_messages = c.MEMORY_STORAGE_MAX_MESSAGES if max_messages is None else max_messages
+        self._chats: Dict[str, Dict[str, Any]] = {}
+        self._direct: Dict[frozenset, str] = {}
+        self._user_chats: Dict[int, Set[str]] = {}
+        self._group_members: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._group_member_ids: Dict[str, List[int]] = {}
+        self._user_groups: Dict[int, Set[str]] = {}
+        self._messages: Dict[str, _ChatMessages] = {}
+
+    #region chats
+    def _chat_model(self, chat: Dict[str, Any]) -> MsgModel.Chats:
+        return MsgModel.Chats(
+            chat_id=chat["chat_id"],
+            chat_type=chat["chat_type"],
+            chat_name=chat.get("chat_name"),
+            members=[MsgModel.Members(**m) for m in chat["members"]],
+            member_count=chat.get("member_count"),
+        )
+
+    def _add_simple_member(self, chat: Dict[str, Any], member: Dict[str, Any]) -> None:
+        if any(m["user_id"] == member["user_id"] for m in chat["members"]):
+            return
+        chat["members"].append(_member(member))
+        self._user_chats.setdefault(member["user_id"], set()).add(chat["chat_id"])
+        if len(chat["members"]) == 2:
+            self._direct.setdefault(frozenset(m["user_id"] for m in chat["members"]), chat["chat_id"])
+
+    def _new_chat(self, chat_id: str, chat_type: str, chat_name: Optional[str] = None) -> Dict[str, Any]:
+        chat = {"chat_id": chat_id, "chat_type": chat_type, "chat_name": chat_name, "members": []}
+        self._chats[chat_id] = chat
+        return chat
+
+    async def get_user_chats(self, user_id):
+        return [self._chat_model(self._chats[chat_id]) for chat_id in await self.user_chat_ids(user_id)]
+
+    async def user_chat_ids(self, user_id):
+        return list(self._user_chats.get(user_id, ())) + list(self._user_groups.get(user_id, ()))
+
+    async def get_chat_info(self, chat_id):
+        chat = self._chats.get(str(chat_id))
+        return self._chat_model(chat) if chat else None
+
+    async def get_chat_id(self, current_id, user_id):
+        return self._direct.get(frozenset((current_id, user_id)))
+
+    async def add_members_to_chat(self, chat_id, user_id, user_name, avatar):
+        chat = self._chats.get(chat_id) or self._new_chat(chat_id, "simple")
+        self._add_simple_member(chat, {"user_id": user_id, "user_name": user_name, "avatar": avatar})
+        return self._chat_model(chat)
+
+    async def get_chat_ids_bulk(self, current_id, user_ids):
+        found = {}
+        for user_id in user_ids:
+            chat_id = self._direct.get(frozenset((current_id, user_id)))
+            if chat_id:
+                found[user_id] = chat_id
+        return found
+
+    async def create_chats_bulk(self, owner, targets):
+        created = {}
+        for target in targets:
+            chat = self._new_chat(str(uuid4()), "simple")
+            self._add_simple_member(chat, owner)
+            self._add_simple_member(chat, target)
+            created[target["user_id"]] = chat["chat_id"]
+        return created
+
+    async def get_chats_info_bulk(self, chat_ids):
+        return {chat_id: self._chat_model(self._chats[chat_id]) for chat_id in chat_ids if chat_id in self._chats}
+    #endregion
+
+    #region members
+    async def create_group_chat(self, chat_name, owner, members):
+        chat = self._new_chat(str(uuid4()), "group", chat_name)
+        chat["member_count"] = 0
+        self._group_members[chat["chat_id"]] = {}
+        self._group_member_ids[chat["chat_id"]] = []
+        await self.add_member(chat["chat_id"], owner, ChatMembers.ROLE_OWNER)
+        for m in members:
+            await self.add_member(chat["chat_id"], m)
+        return chat["chat_id"]
+
+    async def get_member(self, chat_id, user_id):
+        member = self._group_members.get(chat_id, {}).get(user_id)
+        return dict(member) if member else None
+
+    async def is_member(self, chat_id, user_id):
+        chat = self._chats.get(chat_id)
+        if not chat:
+            return False
+        if chat["chat_type"] == "group":
+            return user_id in self._group_members[chat_id]
+        return chat_id in self._user_chats.get(user_id, ())
+
+    async def add_member(self, chat_id, member, role=ChatMembers.ROLE_MEMBER):
+        members = self._group_members.get(chat_id)
+        if members is None or member["user_id"] in members:
+            return False
+        members[member["user_id"]] = {**_member(member), "role": role}
+        insort(self._group_member_ids[chat_id], member["user_id"])
+        self._user_groups.setdefault(member["user_id"], set()).add(chat_id)
+        self._chats[chat_id]["member_count"] += 1
+        return True
+
+    async def remove_member(self, chat_id, user_id):
+        members = self._group_members.get(chat_id)
+        if not members or members.pop(user_id, None) is None:
+            return False
+        ids = self._group_member_ids[chat_id]
+        del ids[bisect_left(ids, user_id)]
+        self._user_groups[user_id].discard(chat_id)
+        self._chats[chat_id]["member_count"] -= 1
+        return True
+
+    async def list_members(self, chat_id, limit, after_user_id=0):
+        ids = self._group_member_ids.get(chat_id, [])
+        start = bisect_right(ids, after_user_id)
+        page = ids[start:start + limit]
+        members = self._group_members.get(chat_id, {})
+        return {
+            "members": [dict(members[user_id]) for user_id in page],
+            "next_after": page[-1] if len(ids) > start + limit else None,
+        }
+    #endregion
+
+    #region messages
+    async def add_message(self, chat_id, sender_id, content, client_msg_id=None, attachments=None):
+        chat = self._messages.setdefault(str(chat_id), _ChatMessages())
+        key = (sender_id, client_msg_id) if client_msg_id else None
+        if key and key in chat.keys:
+            return {**chat.keys[key], "duplicate": True}
+
+        chat.last_seq += 1
+        message = {
+            "msg_id": str(uuid4()),
+            "seq": chat.last_seq,
+            "chat_id": str(chat_id),
+            "content": content,
+            "sender_id": sender_id,
+            "timestamp": datetime.now(timezone.utc) + timedelta(hours=3),
+            "readers": [],
+        }
+        if client_msg_id:
+            message["client_msg_id"] = client_msg_id
+            chat.keys[key] = {
+                "msg_id": message["msg_id"], "seq": message["seq"],
+                "chat_id": message["chat_id"], "client_msg_id": client_msg_id,
+            }
+        if attachments:
+            message["attachments"] = list(attachments)
+        chat.items.append(message)
+        chat.trim(self.max_messages)
+        return dict(message)
+
+    async def get_messages(self, chat_id, limit, offset):
+        items = self._messages[chat_id].items if chat_id in self._messages else []
+        end = max(len(items) - offset, 0)
+        return [_message_out(m) for m in reversed(items[max(end - limit, 0):end])]
+
+    async def get_messages_after(self, chat_id, after_seq, limit):
+        chat = self._messages.get(chat_id)
+        if chat is None:
+            return {"messages": [], "last_seq": after_seq, "has_more": False, "truncated": False}
+        start = chat.index_after(after_seq)
+        page = chat.items[start:start + limit]
+        messages = [_message_out(m) for m in page]
+        return {
+            "messages": messages,
+            "last_seq": messages[-1]["seq"] if messages else after_seq,
+            "has_more": len(chat.items) > start + limit,
+            "truncated": chat.trimmed_seq > after_seq,
+        }
+    #endregion
@@ -1,12 +1,18 @@
 import logging
+from collections import OrderedDict
 from uuid import UUID
 from uuid import uuid4
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from schemas import message as MsgModel
 import src.concts as c
 from fastapi import Request
+from db import archive, attachments, mongo_buckets, stats
+from db import members as ChatMembers
+from db.mongo_config import profiled
 
 #region Helpers
 logger = logging.getLogger(__name__)
@@ -14,16 +20,134 @@ logger = logging.getLogger(__name__)
 async def get_mongo_db(request: Request):
     return request.app.state.mongo_client.baza
 
-async def _iso(dt) -> str:
+def _iso(dt) -> str:
     """Безопасное преобразование timestamp к ISO-строке."""
     if hasattr(dt, "isoformat"):
         return dt.isoformat()
     return str(dt)
 
 
-async def _valid_reader(reader: Dict[str, Any]) -> bool:
+def _valid_reader(reader: Dict[str, Any]) -> bool:
     """Проверка минимально необходимых полей reader."""
     return isinstance(reader, dict) and "user_id" in reader and "user_name" in reader
+
+
+def _message_out(m: Dict[str, Any]) -> Dict[str, Any]:
+    """Приводит документ сообщения к формату ответа API (с валидацией через Pydantic)."""
+    readers = [
+        {
+            "user_id": r["user_id"],
+            "user_name": r["user_name"],
+            "avatar": r.get("avatar"),
+        }
+        for r in m.get("readers", [])
+        if _valid_reader(r)
+    ]
+
+    message = {
+        "msg_id": str(m["msg_id"]),
+        "chat_id": str(m["chat_id"]),
+        "content": m.get("content"),
+        "sender_id": int(m["sender_id"]),
+        "timestamp": _iso(m.get("timestamp")),
+        "readers": readers,
+    }
+
+    if m.get("seq") is not None:
+        message["seq"] = int(m["seq"])
+    if m.get("attachments"):
+        message["attachments"] = list(m["attachments"])
+
+    # Валидация через Pydantic модель
+    _ = MsgModel.Messages(**message)
+    return message
+
+
+async def _next_seq(client: AsyncIOMotorClient, chat_id: str) -> int:
+    """Атомарно выдаёт следующий порядковый номер сообщения в чате.
+
+    В бакетной схеме, если чат сейчас переносится в корзины
+    (`mongo_buckets.migrate_chat`), ждёт окончания переноса.
+    """
+    counter = await client.chats_seq.find_one_and_update(
+        {"_id": chat_id},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    #Запись в chats_msgs корзины не трогает — ждать переноса нужно только бакетной схеме
+    if c.MSG_STORAGE_LAYOUT == "bucket" and counter.get("migrating_until"):
+        await mongo_buckets.wait_unlocked(client, chat_id, counter["migrating_until"])
+    return counter["seq"]
+
+
+def _chat_from_doc(chat_data: Dict[str, Any]) -> MsgModel.Chats:
+    """Собирает модель чата из документа `chats_info`."""
+    return MsgModel.Chats(
+        chat_id=chat_data["chat_id"],
+        chat_type=chat_data.get("chat_type", "simple"),
+        chat_name=chat_data.get("chat_name"),
+        members=[
+            MsgModel.Members(
+                user_id=m["user_id"],
+                user_name=m["user_name"],
+                avatar=m.get("avatar", ""),
+            )
+            for m in chat_data.get("members", [])
+        ],
+        member_count=chat_data.get("member_count"),
+    )
+
+
+class _RecentKeys:
+    """LRU-окно недавних ключей идемпотентности: ключ -> {msg_id, seq}.
+
+    Повтор, пойманный окном, подтверждается без обращения к MongoDB.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, int, str], Dict[str, Any]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, int, str]) -> Optional[Dict[str, Any]]:
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[str, int, str], value: Dict[str, Any]) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+recent_keys = _RecentKeys(c.MSG_DEDUP_WINDOW)
+
+
+def _duplicate_of(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Ответ `add_message_mongo` для повтора уже сохранённого сообщения."""
+    return {
+        "msg_id": doc["msg_id"],
+        "seq": doc.get("seq"),
+        "chat_id": doc["chat_id"],
+        "client_msg_id": doc["client_msg_id"],
+        "duplicate": True,
+    }
+
+
+async def _find_by_client_msg_id(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    sender_id: int,
+    client_msg_id: str
+) -> Optional[Dict[str, Any]]:
+    if c.MSG_STORAGE_LAYOUT == "bucket":
+        return await mongo_buckets.find_by_client_msg_id(client, chat_id, sender_id, client_msg_id)
+    return await client.chats_msgs.find_one(
+        {"chat_id": chat_id, "sender_id": sender_id, "client_msg_id": client_msg_id},
+        {"_id": 0, "msg_id": 1, "seq": 1, "chat_id": 1, "client_msg_id": 1},
+    )
 #endregion
 
 #region public API
@@ -46,7 +170,7 @@ async def get_mongo_chats(
         Exception: В случае ошибки подключения или запроса к базе данных.
     """
     try:
-        logger.info("Подключение к Mongo")
+        logger.debug("Подключение к Mongo")
         collection = client.chat_info
 
         query = {"user_id": user_id, "chat_id": str(chat_id)}
@@ -62,19 +186,59 @@ async def get_mongo_chats(
         return None
 
 
+async def get_user_chats(client: AsyncIOMotorClient, user_id: int) -> List[MsgModel.Chats]:
+    """Возвращает чаты пользователя (личные и групповые) одним запросом к `chats_info`.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        user_id (int): Идентификатор пользователя.
+
+    Returns:
+        list[MsgModel.Chats]: Чаты пользователя.
+    """
+    collection = profiled(client, "chats_info", "chat_list")
+    filter_ = {"members.user_id": user_id}
+    #Групповые чаты хранят участников отдельно — добираем их по индексу chat_members
+    group_ids = await ChatMembers.group_chat_ids(client, user_id)
+    if group_ids:
+        filter_ = {"$or": [filter_, {"chat_id": {"$in": group_ids}}]}
+    projection = {"chat_id": 1, "chat_type": 1, "chat_name": 1, "members": 1, "member_count": 1}
+
+    #Один сетевой запрос получаем все документы списком
+    docs = await collection.find(filter_, projection).to_list(length=None)
+    return [_chat_from_doc(doc) for doc in docs]
+
+
 async def add_message_mongo(
     client: AsyncIOMotorClient,
     chat_id: str,
     sender_id: int,
-    content: str
+    content: str,
+    client_msg_id: Optional[str] = None,
+    attachments: Optional[List[str]] = None
 ) -> Optional[MsgModel.Messages]:
     """Добавляет новое сообщение в чат.
 
+    Сообщению атомарно присваивается порядковый номер `seq` в пределах чата
+    (коллекция `chats_seq`), по которому клиенты находят пропуски и
+    дозапрашивают историю (`get_messages_after`). Записанное сообщение
+    учитывается в счётчиках чата (`db/stats.py`).
+
+    Если клиент передал ключ идемпотентности `client_msg_id`, повтор того же
+    ключа от того же отправителя в том же чате не создаёт новое сообщение:
+    сначала проверяется окно недавних ключей в памяти, затем — уникальный
+    индекс в MongoDB. Для повтора возвращается `{msg_id, seq, chat_id,
+    client_msg_id, duplicate: True}`. В бакетной схеме уникального индекса
+    нет: одновременные повторы мимо окна в памяти могут дать дубль
+    (`mongo_buckets.find_by_client_msg_id`).
+
     Args:
         client (AsyncIOMotorClient): Клиент MongoDB.
         chat_id (str): Идентификатор чата.
         sender_id (int): Идентификатор отправителя.
         content (str): Текст сообщения.
+        client_msg_id (Optional[str]): Ключ идемпотентности от клиента.
+        attachments (Optional[List[str]]): Идентификаторы вложений (`db/attachments.py`).
 
     Returns:
         Optional[MsgModel.Messages]: Документ сообщения из БД, либо None если не найден.
@@ -83,20 +247,59 @@ async def add_message_mongo(
         Exception: В случае ошибки при вставке или чтении из базы данных.
     """
     try:
-        logger.info("Подключение к MongoDB")
-        collection = client.chats_msgs
+        logger.debug("Подключение к MongoDB")
+        collection = profiled(client, "chats_msgs", "message_write")
+
+        #Повтор по ключу идемпотентности: сначала окно в памяти, затем индекс
+        key = (str(chat_id), sender_id, client_msg_id) if client_msg_id else None
+        if key:
+            known = recent_keys.get(key)
+            if known is None:
+                existing = await _find_by_client_msg_id(client, *key)
+                known = _duplicate_of(existing) if existing else None
+            if known is not None:
+                recent_keys.put(key, known)
+                logger.info("Повтор сообщения %s (client_msg_id=%s)", known["msg_id"], client_msg_id)
+                return dict(known)
+
         msg_id = str(uuid4())
+        seq = await _next_seq(client, str(chat_id))
 
         new_message = {
             "msg_id": msg_id,
+            "seq": seq,
             "chat_id": str(chat_id),
             "content": content,
             "sender_id": sender_id,
             "timestamp": datetime.now(timezone.utc) + timedelta(hours=3),
             "readers": [],
         }
-
-        await collection.insert_one(new_message)
+        if client_msg_id:
+            new_message["client_msg_id"] = client_msg_id
+        if attachments:
+            new_message["attachments"] = list(attachments)
+
+        if c.MSG_STORAGE_LAYOUT == "bucket":
+            await mongo_buckets.append_message(client, new_message)
+            await stats.record_message(client, new_message)
+            if key:
+                recent_keys.put(key, _duplicate_of(new_message))
+            logger.info("Сообщение добавлено в корзину: %s", msg_id)
+            return new_message
+
+        try:
+            await collection.insert_one(new_message)
+        except DuplicateKeyError:
+            #Параллельный повтор успел записаться первым (seq остаётся пропуском)
+            if not key:
+                raise
+            existing = await _find_by_client_msg_id(client, *key)
+            known = _duplicate_of(existing)
+            recent_keys.put(key, known)
+            return dict(known)
+        await stats.record_message(client, new_message)
+        if key:
+            recent_keys.put(key, _duplicate_of(new_message))
 
         chat_data = await collection.find_one({"msg_id": msg_id})
         if not chat_data:
@@ -134,7 +337,7 @@ async def add_members_to_chat(
         Exception: При других ошибках работы с базой данных.
     """
     try:
-        logger.info("Подключение к MongoDB")
+        logger.debug("Подключение к MongoDB")
         collection = client.chats_info
 
         new_member = {"user_id": user_id, "user_name": user_name, "avatar": avatar}
@@ -200,7 +403,7 @@ async def get_chat_info(
         Exception: В случае ошибки работы с базой данных.
     """
     try:
-        logger.info("Подключение к MongoDB для чата %s", chat_id)
+        logger.debug("Подключение к MongoDB для чата %s", chat_id)
         collection = client.chats_info
 
         chat_data = await collection.find_one({"chat_id": str(chat_id)})
@@ -222,6 +425,7 @@ async def get_chat_info(
             chat_type=chat_data.get("chat_type", "simple"),
             chat_name=chat_data.get("chat_name"),
             members=members,
+            member_count=chat_data.get("member_count"),
         )
 
         logger.info("Получен чат %s, участников: %d", chat_id, len(members))
@@ -254,7 +458,7 @@ async def get_chat_id(
         Exception: При ошибке поиска в базе данных.
     """
     try:
-        logger.info("Поиск чата по двум участникам")
+        logger.debug("Поиск чата по двум участникам")
         collection = client.chats_info
 
         chat_data = await collection.find_one(
@@ -281,6 +485,11 @@ async def get_messages(
 ):
     """Возвращает список сообщений чата с пагинацией.
 
+    При `MSG_STORAGE_LAYOUT=bucket` страница читается из одной-двух корзин
+    (`db/mongo_buckets.py`) вместо `skip/limit` по отдельным документам.
+    Если страница выходит за пределы горячих данных, она дочитывается из
+    архива (`db/archive.py`).
+
     Args:
         client (AsyncIOMotorClient): Клиент MongoDB.
         chat_id (str): Идентификатор чата.
@@ -294,41 +503,24 @@ async def get_messages(
         Exception: В случае ошибки чтения из базы данных.
     """
     try:
-        collection = client.chats_msgs
+        if c.MSG_STORAGE_LAYOUT == "bucket":
+            raw_messages = await mongo_buckets.get_messages_page(client, chat_id, limit, offset)
+        else:
+            raw_messages = await (
+                profiled(client, "chats_msgs", "history_read").find({"chat_id": chat_id})
+                .sort("timestamp", -1)
+                .skip(offset)
+                .limit(limit)
+                .to_list(length=None)
+            )
 
-        cursor = (
-            collection.find({"chat_id": chat_id})
-            .sort("timestamp", -1)
-            .skip(offset)
-            .limit(limit)
-        )
+        #Страница вышла за пределы горячих данных — дочитываем из архива
+        raw_messages = await archive.complete_page(client, chat_id, raw_messages, limit, offset)
 
         message_list = []
-        async for m in cursor:
+        for m in raw_messages:
             try:
-                readers = [
-                    {
-                        "user_id": r["user_id"],
-                        "user_name": r["user_name"],
-                        "avatar": r.get("avatar"),
-                    }
-                    for r in m.get("readers", [])
-                    if _valid_reader(r)
-                ]
-
-                message = {
-                    "msg_id": str(m["msg_id"]),
-                    "chat_id": str(m["chat_id"]),
-                    "content": m.get("content"),
-                    "sender_id": int(m["sender_id"]),
-                    "timestamp": _iso(m.get("timestamp")),
-                    "readers": readers,
-                }
-
-                # Валидация через Pydantic модель
-                _ = MsgModel.Messages(**message)
-                message_list.append(message)
-
+                message_list.append(_message_out(m))
             except Exception as doc_error:
                 logger.error("Ошибка обработки документа: %s", doc_error, exc_info=True)
                 continue
@@ -338,4 +530,252 @@ async def get_messages(
     except Exception as e:
         logger.error("Ошибка при получении сообщений: %s", e, exc_info=True)
         raise
-#endregion
\ No newline at end of file
+
+
+async def get_messages_after(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    after_seq: int,
+    limit: int
+) -> Dict[str, Any]:
+    """Возвращает сообщения чата с `seq > after_seq` (дельта-синхронизация).
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chat_id (str): Идентификатор чата.
+        after_seq (int): Последний `seq`, который есть у клиента.
+        limit (int): Максимальное количество сообщений в ответе.
+
+    Returns:
+        dict: `messages` — сообщения по возрастанию `seq`; `last_seq` — последний
+        отданный номер; `has_more` — есть ли ещё сообщения после него;
+        `truncated` — часть пропущенных сообщений уже недоступна для дельты
+        (ушла в архив), клиенту нужно перечитать историю постранично.
+        Разрыв в `seq` сам по себе потерей не считается: номер выдаётся до
+        записи и сгорает при её неудаче или при параллельном повторе.
+
+    Raises:
+        Exception: В случае ошибки чтения из базы данных.
+    """
+    try:
+        if c.MSG_STORAGE_LAYOUT == "bucket":
+            raw_messages = await mongo_buckets.get_messages_after(client, chat_id, after_seq, limit + 1)
+        else:
+            raw_messages = await (
+                profiled(client, "chats_msgs", "history_read")
+                .find({"chat_id": chat_id, "seq": {"$gt": after_seq}})
+                .sort("seq", 1)
+                .limit(limit + 1)
+                .to_list(length=None)
+            )
+
+        has_more = len(raw_messages) > limit
+        message_list = []
+        for m in raw_messages[:limit]:
+            try:
+                message_list.append(_message_out(m))
+            except Exception as doc_error:
+                logger.error("Ошибка обработки документа: %s", doc_error, exc_info=True)
+
+        #Архив проверяем только при разрыве: непрерывная дельта ничего не потеряла
+        truncated = False
+        if message_list and message_list[0]["seq"] != after_seq + 1:
+            truncated = await archive.archived_seq(client, chat_id) > after_seq
+
+        return {
+            "messages": message_list,
+            "last_seq": message_list[-1]["seq"] if message_list else after_seq,
+            "has_more": has_more,
+            "truncated": truncated,
+        }
+
+    except Exception as e:
+        logger.error("Ошибка дельта-синхронизации чата %s: %s", chat_id, e, exc_info=True)
+        raise
+
+
+async def ensure_indexes(client: AsyncIOMotorClient) -> List[str]:
+    """Создаёт индексы коллекций сервиса (операция идемпотентна).
+
+    Каждый индекс создаётся отдельно: ошибка одного (например, уникальный
+    `chats_info.chat_id` при дублях, оставшихся от старых версий) пишется в
+    лог и не мешает остальным. Сетевые ошибки пробрасываются.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB (база).
+
+    Returns:
+        list[str]: Индексы, которые создать не удалось.
+    """
+    steps = [
+        ("chats_info.chat_id", lambda: client.chats_info.create_index("chat_id", unique=True)),
+        ("chats_info.members.user_id", lambda: client.chats_info.create_index("members.user_id")),
+        ("chats_msgs.chat_id_timestamp", lambda: client.chats_msgs.create_index([("chat_id", 1), ("timestamp", -1)])),
+        ("chats_msgs.chat_id_seq", lambda: client.chats_msgs.create_index([("chat_id", 1), ("seq", 1)])),
+        ("chats_msgs.client_msg_id_unique", lambda: client.chats_msgs.create_index(
+            [("chat_id", 1), ("sender_id", 1), ("client_msg_id", 1)],
+            unique=True,
+            partialFilterExpression={"client_msg_id": {"$exists": True}},
+            name="client_msg_id_unique",
+        )),
+        ("chats_msgs.content_text", lambda: client.chats_msgs.create_index(
+            [("content", "text")], default_language=c.SEARCH_LANGUAGE, name="content_text"
+        )),
+        ("chats_msgs_buckets.chat_id_bucket", lambda: client.chats_msgs_buckets.create_index(
+            [("chat_id", 1), ("bucket", -1)], unique=True
+        )),
+        ("chats_msgs_buckets.chat_id_last_seq", lambda: client.chats_msgs_buckets.create_index(
+            [("chat_id", 1), ("last_seq", 1)]
+        )),
+        ("chats_msgs_buckets.client_msg_id", lambda: client.chats_msgs_buckets.create_index(
+            [("chat_id", 1), ("messages.client_msg_id", 1)], sparse=True
+        )),
+        ("chats_msgs_buckets.content_text", lambda: client.chats_msgs_buckets.create_index(
+            [("messages.content", "text")], default_language=c.SEARCH_LANGUAGE, name="content_text"
+        )),
+        ("chats_archive.chat_id_block", lambda: client.chats_archive.create_index(
+            [("chat_id", 1), ("block", 1)], unique=True
+        )),
+        ("chat_members", lambda: ChatMembers.ensure_indexes(client)),
+        ("attachments", lambda: attachments.ensure_indexes(client)),
+        ("chat_stats", lambda: stats.ensure_indexes(client)),
+    ]
+    failed = []
+    for name, create in steps:
+        try:
+            await create()
+        except OperationFailure as e:
+            failed.append(name)
+            logger.error("Не удалось создать индекс %s: %s", name, e)
+    if failed:
+        logger.error("Индексы MongoDB созданы не все, ошибки: %s", ", ".join(failed))
+    else:
+        logger.info("Индексы MongoDB проверены")
+    return failed
+
+
+async def get_chat_ids_bulk(
+    client: AsyncIOMotorClient,
+    current_id: int,
+    user_ids: List[int],
+    chat_type: str = "simple"
+) -> Dict[int, str]:
+    """Ищет существующие чаты текущего пользователя сразу с несколькими собеседниками.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        current_id (int): Текущий пользователь.
+        user_ids (List[int]): Идентификаторы собеседников.
+        chat_type (str, optional): Тип чата. По умолчанию "simple".
+
+    Returns:
+        dict[int, str]: Соответствие `user_id собеседника -> chat_id` для найденных чатов.
+
+    Raises:
+        Exception: При ошибке поиска в базе данных.
+    """
+    if not user_ids:
+        return {}
+    try:
+        collection = client.chats_info
+        wanted = set(user_ids)
+
+        docs = await collection.find(
+            {
+                "$and": [
+                    {"members.user_id": current_id},
+                    {"members.user_id": {"$in": list(wanted)}},
+                ],
+                "chat_type": chat_type,
+            },
+            {"chat_id": 1, "members.user_id": 1},
+        ).to_list(length=None)
+
+        found: Dict[int, str] = {}
+        for doc in docs:
+            for m in doc.get("members", []):
+                other_id = m["user_id"]
+                if other_id != current_id and other_id in wanted:
+                    found.setdefault(other_id, doc["chat_id"])
+
+        logger.info("Пакетный поиск чатов: найдено %d из %d", len(found), len(wanted))
+        return found
+    except Exception as e:
+        logger.error("Ошибка при пакетном поиске чатов: %s", e, exc_info=True)
+        raise
+
+
+async def create_chats_bulk(
+    client: AsyncIOMotorClient,
+    owner: Dict[str, Any],
+    targets: List[Dict[str, Any]],
+    chat_type: str = "simple"
+) -> Dict[int, str]:
+    """Создаёт личные чаты владельца с несколькими пользователями одним `insert_many`.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        owner (dict): Участник-инициатор `{"user_id", "user_name", "avatar"}`.
+        targets (List[dict]): Собеседники в том же формате.
+        chat_type (str, optional): Тип чата. По умолчанию "simple".
+
+    Returns:
+        dict[int, str]: Соответствие `user_id собеседника -> chat_id` созданных чатов.
+
+    Raises:
+        Exception: При ошибке записи в базу данных.
+    """
+    if not targets:
+        return {}
+    try:
+        collection = client.chats_info
+
+        created: Dict[int, str] = {}
+        docs = []
+        for target in targets:
+            chat_id = str(uuid4())
+            created[target["user_id"]] = chat_id
+            docs.append(
+                {
+                    "chat_id": chat_id,
+                    "chat_type": chat_type,
+                    "chat_name": None,
+                    "members": [dict(owner), dict(target)],
+                    "messages": [],
+                }
+            )
+
+        await collection.insert_many(docs, ordered=False)
+        logger.info("Пакетно создано чатов: %d", len(docs))
+        return created
+    except Exception as e:
+        logger.error("Ошибка при пакетном создании чатов: %s", e, exc_info=True)
+        raise
+
+
+async def get_chats_info_bulk(
+    client: AsyncIOMotorClient,
+    chat_ids: List[str]
+) -> Dict[str, MsgModel.Chats]:
+    """Возвращает информацию о нескольких чатах одним запросом.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chat_ids (List[str]): Идентификаторы чатов.
+
+    Returns:
+        dict[str, MsgModel.Chats]: Найденные чаты по их `chat_id`.
+
+    Raises:
+        Exception: В случае ошибки работы с базой данных.
+    """
+    if not chat_ids:
+        return {}
+    try:
+        collection = client.chats_info
+        docs = await collection.find({"chat_id": {"$in": list(chat_ids)}}).to_list(length=None)
+        return {doc["chat_id"]: _chat_from_doc(doc) for doc in docs}
+    except Exception as e:
+        logger.error("Ошибка при пакетном получении чатов: %s", e, exc_info=True)
+        raise
+#endregion
@@ -0,0 +1,319 @@
+"""Бакетное хранение сообщений (`MSG_STORAGE_LAYOUT=bucket`).
+
+Сообщения чата группируются в документы коллекции `chats_msgs_buckets`
+по `MSG_BUCKET_SIZE` штук:
+
+    {chat_id, bucket, count, first_ts, last_ts, last_seq, messages: [...]}
+
+`bucket` — порядковый номер корзины в чате (0, 1, 2, ...). Новое сообщение
+дописывается `$push` в единственную незаполненную (последнюю) корзину;
+когда она заполнена, открывается следующая. Поэтому все корзины, кроме
+последней, всегда полные, и страница `offset/limit` вычисляется
+арифметически и читается из одной-двух корзин.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
+import src.concts as c
+from db.mongo_config import profiled
+
+logger = logging.getLogger(__name__)
+
+
+async def append_message(client: AsyncIOMotorClient, message: Dict[str, Any]) -> None:
+    """Дописывает сообщение в последнюю корзину чата (или открывает новую).
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        message (dict): Документ сообщения (с `chat_id` и `timestamp`).
+
+    Raises:
+        Exception: В случае ошибки записи в базу данных.
+    """
+    collection = profiled(client, "chats_msgs_buckets", "message_write")
+    chat_id = message["chat_id"]
+    item = {k: v for k, v in message.items() if k != "chat_id"}
+    size = c.MSG_BUCKET_SIZE
+
+    while True:
+        result = await collection.update_one(
+            {"chat_id": chat_id, "count": {"$lt": size}},
+            {
+                "$push": {"messages": item},
+                "$inc": {"count": 1},
+                "$max": {"last_ts": message["timestamp"], "last_seq": message.get("seq", 0)},
+            },
+        )
+        if result.matched_count:
+            return
+
+        #Свободного места нет — открываем следующую корзину
+        last = await collection.find_one(
+            {"chat_id": chat_id}, {"bucket": 1}, sort=[("bucket", -1)]
+        )
+        try:
+            await collection.insert_one(
+                {
+                    "chat_id": chat_id,
+                    "bucket": last["bucket"] + 1 if last else 0,
+                    "count": 1,
+                    "first_ts": message["timestamp"],
+                    "last_ts": message["timestamp"],
+                    "last_seq": message.get("seq", 0),
+                    "messages": [item],
+                }
+            )
+            return
+        except DuplicateKeyError:
+            #Корзину параллельно открыл другой писатель — дописываем в неё
+            continue
+
+
+async def get_messages_page(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    limit: int,
+    offset: int
+) -> List[Dict[str, Any]]:
+    """Возвращает страницу сообщений (от новых к старым) из корзин.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chat_id (str): Идентификатор чата.
+        limit (int): Максимальное количество сообщений.
+        offset (int): Сколько самых новых сообщений пропустить.
+
+    Returns:
+        list[dict]: Сырые документы сообщений с `chat_id`.
+    """
+    if limit <= 0:
+        return []
+    collection = profiled(client, "chats_msgs_buckets", "history_read")
+    size = c.MSG_BUCKET_SIZE
+
+    head = await collection.find_one(
+        {"chat_id": chat_id}, {"bucket": 1, "count": 1}, sort=[("bucket", -1)]
+    )
+    if not head:
+        return []
+
+    #Позиции считаем от самого старого сообщения: последнее имеет индекс total-1
+    total = head["bucket"] * size + head["count"]
+    newest = total - 1 - offset
+    oldest = max(newest - limit + 1, 0)
+    if newest < 0:
+        return []
+
+    buckets = list(range(oldest // size, newest // size + 1))
+    docs = await collection.find(
+        {"chat_id": chat_id, "bucket": {"$in": buckets}}
+    ).to_list(length=None)
+    docs.sort(key=lambda d: d["bucket"])
+
+    if not docs:
+        return []
+
+    flat: List[Dict[str, Any]] = []
+    for doc in docs:
+        flat.extend(doc.get("messages", []))
+
+    #Старые корзины могли уйти в архив — отсчитываем от первой найденной
+    base = docs[0]["bucket"] * size
+    page = flat[max(oldest - base, 0):newest - base + 1]
+    page.reverse()
+    return [dict(m, chat_id=chat_id) for m in page]
+
+
+async def get_messages_after(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    after_seq: int,
+    limit: int
+) -> List[Dict[str, Any]]:
+    """Возвращает до `limit` сообщений с `seq > after_seq` по возрастанию `seq`.
+
+    Читаются только корзины, где `last_seq > after_seq`, — обычно одна-две.
+    """
+    cursor = profiled(client, "chats_msgs_buckets", "history_read").find(
+        {"chat_id": chat_id, "last_seq": {"$gt": after_seq}}
+    ).sort("bucket", 1)
+
+    result: List[Dict[str, Any]] = []
+    async for doc in cursor:
+        for m in doc.get("messages", []):
+            if m.get("seq", 0) > after_seq:
+                result.append(dict(m, chat_id=chat_id))
+        if len(result) >= limit:
+            break
+    result.sort(key=lambda m: m["seq"])
+    return result[:limit]
+
+
+async def find_by_client_msg_id(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    sender_id: int,
+    client_msg_id: str
+) -> Optional[Dict[str, Any]]:
+    """Ищет сообщение чата по ключу идемпотентности отправителя.
+
+    Уникального индекса за ключом в корзинах нет, поэтому проверка не
+    атомарна с записью: два одновременных повтора, которых ещё нет в окне
+    ключей процесса (`db/mongo.recent_keys`), например пришедшие на разные
+    экземпляры сервиса, могут записать сообщение дважды.
+    """
+    match = {"client_msg_id": client_msg_id, "sender_id": sender_id}
+    #Отправитель — в фильтре: иначе найдётся корзина с тем же ключом другого отправителя
+    doc = await client.chats_msgs_buckets.find_one(
+        {"chat_id": chat_id, "messages": {"$elemMatch": match}},
+        {"messages": {"$elemMatch": match}},
+    )
+    if not doc or not doc.get("messages"):
+        return None
+    return dict(doc["messages"][0], chat_id=chat_id)
+
+
+async def count_messages(client: AsyncIOMotorClient, chat_id: str) -> int:
+    """Количество сообщений чата в корзинах (без ушедших в архив)."""
+    collection = client.chats_msgs_buckets
+    head = await collection.find_one({"chat_id": chat_id}, {"bucket": 1, "count": 1}, sort=[("bucket", -1)])
+    if not head:
+        return 0
+    tail = await collection.find_one({"chat_id": chat_id}, {"bucket": 1}, sort=[("bucket", 1)])
+    return (head["bucket"] - tail["bucket"]) * c.MSG_BUCKET_SIZE + head["count"]
+
+
+async def lock_chat(client: AsyncIOMotorClient, chat_id: str) -> None:
+    """Ставит (или продлевает) блокировку записи в чат на время миграции.
+
+    Блокировка — срок `migrating_until` в счётчике `chats_seq`, который
+    запись сообщения и так читает при выдаче `seq` (`db/mongo._next_seq`).
+    Если миграция упала, блокировка снимается сама через `MSG_MIGRATION_LEASE`.
+    """
+    await client.chats_seq.update_one(
+        {"_id": chat_id},
+        {"$set": {"migrating_until": time.time() + c.MSG_MIGRATION_LEASE}},
+        upsert=True,
+    )
+
+
+async def unlock_chat(client: AsyncIOMotorClient, chat_id: str) -> None:
+    """Снимает блокировку записи, поставленную `lock_chat`."""
+    await client.chats_seq.update_one({"_id": chat_id}, {"$unset": {"migrating_until": ""}})
+
+
+async def wait_unlocked(client: AsyncIOMotorClient, chat_id: str, until: Optional[float]) -> None:
+    """Ждёт окончания миграции чата перед записью сообщения.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chat_id (str): Идентификатор чата.
+        until (float): `migrating_until` из счётчика чата (или None).
+
+    Raises:
+        TimeoutError: Миграция не закончилась за `MSG_MIGRATION_WAIT` секунд.
+    """
+    deadline = time.monotonic() + c.MSG_MIGRATION_WAIT
+    while until and until > time.time():
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Чат {chat_id} переносится в корзины, запись отложена")
+        await asyncio.sleep(0.05)
+        counter = await client.chats_seq.find_one({"_id": chat_id}, {"migrating_until": 1})
+        until = (counter or {}).get("migrating_until")
+
+
+async def migrate_chat(
+    client: AsyncIOMotorClient,
+    chat_id: str,
+    batch_size: int = 10
+) -> int:
+    """Переносит историю чата из `chats_msgs` в корзины.
+
+    На время переноса запись в корзины чата заблокирована (`lock_chat`):
+    писатели ждут до `MSG_MIGRATION_WAIT` секунд. Корзины строятся под временным
+    ключом `<chat_id>:migrating`, читатели до замены видят прежние корзины.
+    Сообщения, которых нет в `chats_msgs` (записаны в корзины после
+    переключения схемы, `seq` больше перенесённых), дописываются в новые
+    корзины, поэтому повторный запуск ничего не теряет. Исходные документы
+    не удаляются — это делается отдельно после проверки.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chat_id (str): Идентификатор чата.
+        batch_size (int): Сколько корзин держать в памяти и вставлять за один `insert_many`.
+
+    Returns:
+        int: Количество сообщений в новых корзинах.
+    """
+    size = c.MSG_BUCKET_SIZE
+    source = client.chats_msgs
+    target = client.chats_msgs_buckets
+    staging = f"{chat_id}:migrating"
+
+    migrated = 0
+    last_seq = 0
+    pending: List[Dict[str, Any]] = []
+    current: Dict[str, Any] = {}
+
+    async def add(m: Dict[str, Any]) -> None:
+        nonlocal migrated, last_seq, pending, current
+        if not current or current["count"] >= size:
+            current = {
+                "chat_id": staging,
+                "bucket": migrated // size,
+                "count": 0,
+                "first_ts": m["timestamp"],
+                "last_ts": m["timestamp"],
+                "last_seq": 0,
+                "messages": [],
+            }
+            pending.append(current)
+        current["messages"].append({k: v for k, v in m.items() if k != "chat_id"})
+        current["count"] += 1
+        current["last_ts"] = m["timestamp"]
+        current["last_seq"] = max(current["last_seq"], m.get("seq", 0))
+        last_seq = max(last_seq, m.get("seq", 0))
+        migrated += 1
+
+        #Отправляем только заполненные корзины, текущую оставляем копиться
+        if len(pending) > batch_size:
+            await target.insert_many(pending[:-1], ordered=False)
+            pending = pending[-1:]
+            await lock_chat(client, chat_id)
+
+    await lock_chat(client, chat_id)
+    try:
+        #Остатки упавшего запуска
+        await target.delete_many({"chat_id": staging})
+
+        async for m in source.find({"chat_id": chat_id}, {"_id": 0}).sort("timestamp", 1):
+            await add(m)
+        copied = migrated
+
+        #Сообщения, записанные только в корзины (после переключения на bucket)
+        source_seq = last_seq
+        live = target.find({"chat_id": chat_id, "last_seq": {"$gt": source_seq}}, {"_id": 0}).sort("bucket", 1)
+        async for bucket in live:
+            for m in bucket["messages"]:
+                if m.get("seq", 0) > source_seq:
+                    await add(dict(m, chat_id=chat_id))
+
+        if pending:
+            await target.insert_many(pending, ordered=False)
+
+        #Замена: запись заблокирована, поэтому между шагами ничего не теряется
+        await target.delete_many({"chat_id": chat_id})
+        await target.update_many({"chat_id": staging}, {"$set": {"chat_id": chat_id}})
+    finally:
+        await unlock_chat(client, chat_id)
+
+    logger.info(
+        "Чат %s: перенесено сообщений в корзины: %d (из них только в корзинах: %d)",
+        chat_id, migrated, migrated - copied,
+    )
+    return migrated
@@ -0,0 +1,192 @@
+"""Настройки клиента MongoDB и профили операций.
+
+`MongoClientSettings` — параметры пула, таймауты и сжатие для
+`AsyncIOMotorClient`. `OperationProfile` — read preference, read concern и
+write concern для группы операций; коллекция с нужными опциями берётся через
+`profiled(db, "chats_msgs", "history_read")`.
+
+Все значения читаются из окружения. Для профиля `<name>` это переменные
+`MONGO_PROFILE_<NAME>_READ_PREFERENCE`, `_MAX_STALENESS`, `_READ_CONCERN`,
+`_W`, `_J` и `_WTIMEOUT_MS`. По умолчанию все профили совпадают с
+настройками клиента (primary, w=1), то есть поведение не меняется, пока
+профиль явно не настроен. Исключение — `analytics` (счётчики и их сверка,
+`db/stats.py`): по умолчанию secondaryPreferred.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Union
+
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+from pymongo.write_concern import WriteConcern
+
+import src.concts as c
+
+_READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+
+def _env_int(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+@dataclass(frozen=True)
+class MongoClientSettings:
+    """Параметры `AsyncIOMotorClient`.
+
+    Attributes:
+        url (str): Строка подключения.
+        max_pool_size (int): Максимум соединений в пуле на сервер.
+        min_pool_size (int): Сколько соединений держать открытыми всегда.
+        max_idle_time_ms (Optional[int]): Закрывать соединения, простаивающие дольше.
+        wait_queue_timeout_ms (Optional[int]): Сколько ждать свободного соединения из пула.
+        connect_timeout_ms (int): Таймаут установки соединения.
+        server_selection_timeout_ms (int): Таймаут выбора сервера.
+        socket_timeout_ms (Optional[int]): Таймаут операции на сокете.
+        compressors (str): Сжатие трафика: "zlib", "snappy", "zstd" через запятую.
+        app_name (str): Имя приложения в логах/профайлере MongoDB.
+    """
+
+    url: str
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+    connect_timeout_ms: int = 5000
+    server_selection_timeout_ms: int = 10000
+    socket_timeout_ms: Optional[int] = None
+    compressors: str = ""
+    app_name: str = "chat-service"
+
+    @classmethod
+    def from_env(cls) -> "MongoClientSettings":
+        return cls(
+            url=c.MONGO_URL,
+            max_pool_size=_env_int("MONGO_MAX_POOL_SIZE", 100),
+            min_pool_size=_env_int("MONGO_MIN_POOL_SIZE", 0),
+            max_idle_time_ms=_env_int("MONGO_MAX_IDLE_TIME_MS", None),
+            wait_queue_timeout_ms=_env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS", None),
+            connect_timeout_ms=_env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+            server_selection_timeout_ms=_env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000),
+            socket_timeout_ms=_env_int("MONGO_SOCKET_TIMEOUT_MS", None),
+            compressors=os.getenv("MONGO_COMPRESSORS", ""),
+            app_name=os.getenv("MONGO_APP_NAME", "chat-service"),
+        )
+
+    def client_kwargs(self) -> Dict[str, Any]:
+        """Именованные аргументы для `AsyncIOMotorClient(url, **kwargs)`."""
+        kwargs: Dict[str, Any] = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "appname": self.app_name,
+        }
+        if self.max_idle_time_ms is not None:
+            kwargs["maxIdleTimeMS"] = self.max_idle_time_ms
+        if self.wait_queue_timeout_ms is not None:
+            kwargs["waitQueueTimeoutMS"] = self.wait_queue_timeout_ms
+        if self.socket_timeout_ms is not None:
+            kwargs["socketTimeoutMS"] = self.socket_timeout_ms
+        if self.compressors:
+            kwargs["compressors"] = self.compressors
+        return kwargs
+
+
+@dataclass(frozen=True)
+class OperationProfile:
+    """Опции чтения/записи для группы операций.
+
+    Attributes:
+        read_preference (str): primary, primaryPreferred, secondary, secondaryPreferred, nearest.
+        max_staleness_seconds (int): Допустимое отставание реплики (-1 — без ограничения).
+        read_concern (Optional[str]): local, majority, available... (None — как у клиента).
+        w (Optional[Union[int, str]]): Write concern: число узлов или "majority".
+        j (Optional[bool]): Ждать записи в журнал.
+        wtimeout_ms (Optional[int]): Таймаут подтверждения записи.
+    """
+
+    read_preference: str = "primary"
+    max_staleness_seconds: int = -1
+    read_concern: Optional[str] = None
+    w: Optional[Union[int, str]] = None
+    j: Optional[bool] = None
+    wtimeout_ms: Optional[int] = None
+
+    @classmethod
+    def from_env(cls, name: str, **defaults) -> "OperationProfile":
+        prefix = f"MONGO_PROFILE_{name.upper()}_"
+        base = cls(**defaults)
+        w = os.getenv(prefix + "W")
+        j = os.getenv(prefix + "J")
+        return cls(
+            read_preference=os.getenv(prefix + "READ_PREFERENCE", base.read_preference),
+            max_staleness_seconds=_env_int(prefix + "MAX_STALENESS", base.max_staleness_seconds),
+            read_concern=os.getenv(prefix + "READ_CONCERN", base.read_concern),
+            w=(int(w) if w.isdigit() else w) if w else base.w,
+            j=(j.lower() == "true") if j else base.j,
+            wtimeout_ms=_env_int(prefix + "WTIMEOUT_MS", base.wtimeout_ms),
+        )
+
+    def collection_options(self) -> Dict[str, Any]:
+        """Аргументы для `collection.with_options(...)`."""
+        options: Dict[str, Any] = {}
+        if self.read_preference != "primary" or self.max_staleness_seconds != -1:
+            mode = _READ_PREFERENCES[self.read_preference]
+            options["read_preference"] = (
+                ReadPreference.PRIMARY if mode is Primary
+                else mode(max_staleness=self.max_staleness_seconds)
+            )
+        if self.read_concern:
+            options["read_concern"] = ReadConcern(self.read_concern)
+        if self.w is not None or self.j is not None or self.wtimeout_ms is not None:
+            options["write_concern"] = WriteConcern(w=self.w, j=self.j, wtimeout=self.wtimeout_ms)
+        return options
+
+
+#Профили операций сервиса
+PROFILES: Dict[str, OperationProfile] = {
+    #Чтение истории сообщений (get_messages, дельта-синхронизация)
+    "history_read": OperationProfile.from_env("history_read"),
+    #Список чатов пользователя
+    "chat_list": OperationProfile.from_env("chat_list"),
+    #Запись новых сообщений
+    "message_write": OperationProfile.from_env("message_write"),
+    #Статистика и её сверка — не конкурируют с горячим путём за primary
+    "analytics": OperationProfile.from_env("analytics", read_preference="secondaryPreferred"),
+}
+
+
+_OPTIONS = {name: profile.collection_options() for name, profile in PROFILES.items()}
+
+
+def configure_profile(name: str, profile: OperationProfile) -> None:
+    """Заменяет профиль во время работы (бенчмарки, тесты)."""
+    PROFILES[name] = profile
+    _OPTIONS[name] = profile.collection_options()
+
+
+def profiled(db, collection_name: str, profile: str):
+    """Возвращает коллекцию с опциями профиля `profile`.
+
+    Для ненастроенного профиля возвращается исходная коллекция без копирования.
+    """
+    collection = getattr(db, collection_name)
+    options = _OPTIONS[profile]
+    if not options:
+        return collection
+    return collection.with_options(**options)
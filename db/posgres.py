@@ -1,4 +1,7 @@
+from typing import Optional
+
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     create_async_engine,
     async_sessionmaker,
@@ -6,22 +9,48 @@ from sqlalchemy.ext.asyncio import (
 from sqlalchemy.orm import DeclarativeBase
 from src import concts as c
 
-DATABASE_URL: str = (
-    f"postgresql+asyncpg://{c.DB_USER}:{c.DB_PASSWORD}@{c.DB_HOST}:{c.DB_PORT}/{c.DB_NAME}"
-)
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[async_sessionmaker] = None
 
-#Создаём движок 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False,  # при необходимости можно включить SQL-логи
-)
 
-#Фабрика асинхронных сессий
-async_session = async_sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,  #данные остаются доступными после commit
-)
+def database_url() -> str:
+    return f"postgresql+asyncpg://{c.DB_USER}:{c.DB_PASSWORD}@{c.DB_HOST}:{c.DB_PORT}/{c.DB_NAME}"
+
+
+def get_engine() -> AsyncEngine:
+    """Возвращает движок SQLAlchemy, создавая его при первом обращении.
+
+    Движок не создаётся при импорте модуля: пока ни один эндпоинт не
+    работает с PostgreSQL, старт сервиса не платит за драйвер и пул.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            database_url(),
+            echo=False,  # при необходимости можно включить SQL-логи
+        )
+    return _engine
+
+
+def get_session_factory() -> async_sessionmaker:
+    """Фабрика асинхронных сессий (создаётся лениво вместе с движком)."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = async_sessionmaker(
+            bind=get_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False,  #данные остаются доступными после commit
+        )
+    return _session_factory
+
+
+async def dispose_engine() -> None:
+    """Закрывает пул соединений, если движок был создан."""
+    global _engine, _session_factory
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+        _session_factory = None
 
 
 class Base(DeclarativeBase):
@@ -37,5 +66,5 @@ async def get_async_session() -> AsyncSession:
     Yields:
         AsyncSession: Асинхронная сессия для работы с базой данных.
     """
-    async with async_session() as session:
+    async with get_session_factory()() as session:
         yield session
@@ -0,0 +1,174 @@
+"""Полнотекстовый поиск по сообщениям.
+
+Поиск идёт по текстовому индексу MongoDB (`content` в `chats_msgs` или
+`messages.content` в корзинах при `MSG_STORAGE_LAYOUT=bucket`) и всегда
+ограничен чатами, в которых состоит пользователь. Время запроса ограничено
+`SEARCH_MAX_TIME_MS` (`maxTimeMS`), глубина пагинации — `SEARCH_MAX_OFFSET`,
+поэтому задержка не растёт вместе с историей. Сообщения, ушедшие в архив
+(`db/archive.py`), в поиск не попадают.
+
+Каждый результат содержит фрагмент текста вокруг первого совпадения и
+позиции подсвеченных слов внутри фрагмента:
+
+    {"message": {...}, "snippet": "…текст…", "highlights": [[start, end], ...], "score": 1.5}
+"""
+
+import re
+import logging
+from typing import Any, Dict, List, Pattern, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import src.concts as c
+from db import members as ChatMembers
+from db.mongo import _message_out
+from db.mongo_config import profiled
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r'(-?)("[^"]*"|\S+)')
+_WORD_RE = re.compile(r"\w+")
+
+
+def query_terms(query: str) -> List[str]:
+    """Слова запроса для подсветки (без исключённых через `-слово`)."""
+    terms: List[str] = []
+    for negated, token in _TOKEN_RE.findall(query or ""):
+        if negated:
+            continue
+        for word in _WORD_RE.findall(token.lower()):
+            if len(word) > 1 and word not in terms:
+                terms.append(word)
+    return terms
+
+
+def _stem(word: str) -> str:
+    #Грубая замена стемминга MongoDB: отбрасываем окончание, чтобы подсветить словоформы
+    return word if len(word) <= 4 else word[:max(4, len(word) - 2)]
+
+
+def highlight_pattern(terms: List[str]) -> Pattern:
+    stems = sorted({_stem(t) for t in terms}, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, stems)) + r")\w*", re.IGNORECASE)
+
+
+def make_snippet(content: str, pattern: Pattern, width: int) -> Tuple[str, List[List[int]]]:
+    """Вырезает фрагмент `content` вокруг первого совпадения.
+
+    Args:
+        content (str): Текст сообщения.
+        pattern (Pattern): Регулярное выражение подсвечиваемых слов.
+        width (int): Максимальная длина фрагмента (без многоточий).
+
+    Returns:
+        tuple[str, list[list[int]]]: Фрагмент и позиции `[start, end)` совпадений в нём.
+    """
+    content = content or ""
+    matches = list(pattern.finditer(content))
+    start = max(matches[0].start() - width // 3, 0) if matches else 0
+    end = min(start + width, len(content))
+    start = max(end - width, 0)
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(content) else ""
+    shift = len(prefix) - start
+    highlights = [
+        [m.start() + shift, min(m.end(), end) + shift]
+        for m in matches
+        if m.start() >= start and m.start() < end
+    ]
+    return prefix + content[start:end] + suffix, highlights
+
+
+async def user_chat_ids(client: AsyncIOMotorClient, user_id: int) -> List[str]:
+    """Идентификаторы чатов (личных и групповых), в которых состоит пользователь."""
+    simple = await profiled(client, "chats_info", "chat_list").distinct(
+        "chat_id", {"members.user_id": user_id}
+    )
+    return simple + await ChatMembers.group_chat_ids(client, user_id)
+
+
+async def _search_flat(client, chat_ids, query, limit, offset) -> List[Dict[str, Any]]:
+    cursor = (
+        profiled(client, "chats_msgs", "history_read")
+        .find(
+            {"$text": {"$search": query}, "chat_id": {"$in": chat_ids}},
+            {"score": {"$meta": "textScore"}},
+        )
+        .sort([("score", {"$meta": "textScore"}), ("timestamp", -1)])
+        .skip(offset)
+        .limit(limit + 1)
+        .max_time_ms(c.SEARCH_MAX_TIME_MS)
+    )
+    return await cursor.to_list(length=None)
+
+
+async def _search_buckets(client, chat_ids, query, terms, limit, offset) -> List[Dict[str, Any]]:
+    #Текстовый индекс находит корзины, конкретные сообщения отбираем по основам слов
+    stems = "|".join(re.escape(_stem(t)) for t in terms)
+    pipeline = [
+        {"$match": {"$text": {"$search": query}, "chat_id": {"$in": chat_ids}}},
+        {"$sort": {"score": {"$meta": "textScore"}, "bucket": -1}},
+        {"$unwind": "$messages"},
+        {"$match": {"messages.content": {"$regex": stems, "$options": "i"}}},
+        {"$skip": offset},
+        {"$limit": limit + 1},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$messages", {"chat_id": "$chat_id"}]}}},
+    ]
+    cursor = profiled(client, "chats_msgs_buckets", "history_read").aggregate(
+        pipeline, maxTimeMS=c.SEARCH_MAX_TIME_MS
+    )
+    return await cursor.to_list(length=None)
+
+
+async def search_messages(
+    client: AsyncIOMotorClient,
+    chat_ids: List[str],
+    query: str,
+    limit: int,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """Ищет сообщения в указанных чатах.
+
+    Args:
+        client (AsyncIOMotorClient): Клиент MongoDB.
+        chat_ids (list[str]): Чаты, в которых разрешён поиск.
+        query (str): Запрос в синтаксисе `$text` (фразы в кавычках, `-исключение`).
+        limit (int): Максимальное количество результатов.
+        offset (int): Смещение для пагинации.
+
+    Returns:
+        dict: `results` — найденные сообщения по убыванию релевантности со
+        `snippet` и `highlights`; `has_more` — есть ли следующая страница.
+
+    Raises:
+        pymongo.errors.ExecutionTimeout: Запрос не уложился в `SEARCH_MAX_TIME_MS`.
+    """
+    terms = query_terms(query)
+    if not chat_ids or not terms or limit <= 0:
+        return {"results": [], "has_more": False}
+
+    if c.MSG_STORAGE_LAYOUT == "bucket":
+        raw = await _search_buckets(client, chat_ids, query, terms, limit, offset)
+    else:
+        raw = await _search_flat(client, chat_ids, query, limit, offset)
+
+    pattern = highlight_pattern(terms)
+    results = []
+    for m in raw[:limit]:
+        try:
+            message = _message_out(m)
+        except Exception as doc_error:
+            logger.error("Ошибка обработки документа: %s", doc_error, exc_info=True)
+            continue
+        snippet, highlights = make_snippet(message["content"], pattern, c.SEARCH_SNIPPET_CHARS)
+        results.append(
+            {
+                "message": message,
+                "snippet": snippet,
+                "highlights": highlights,
+                "score": m.get("score"),
+            }
+        )
+
+    return {"results": results, "has_more": len(raw) > limit}
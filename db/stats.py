@@ -0,0 +1,312 @@
+"""Предрасчитанные счётчики сообщений по чатам.
+
+Коллекция `chat_stats` хранит по документу на счётчик:
+
+    {_id: "<chat_id>:total",           chat_id, kind: "total",  messages, last_at, last_seq}
+    {_id: "<chat_id>:day:<YYYY-MM-DD>", chat_id, kind: "day",    day, messages}
+    {_id: "<chat_id>:sender:<id>",     chat_id, kind: "sender", sender_id, messages, last_at}
+
+Счётчики увеличиваются при записи сообщения (`record_message`): три upsert с
+`$inc` одним неупорядоченным `bulk_write`. Вопросы «сколько сообщений в
+чате», «сообщений по дням», «самые активные чаты» читают эти документы, а
+не сканируют `chats_msgs`; чтение и сверка идут профилем `analytics`
+(по умолчанию secondaryPreferred) и не нагружают primary.
+
+Счётчики могут разойтись с данными (сбой между записью сообщения и
+счётчика, ручные правки). `reconcile_loop` раз в `STATS_RECONCILE_INTERVAL`
+секунд пересчитывает чаты по горячему хранилищу и метаданным блоков архива и
+исправляет расхождения. Для чата с архивом пересчитываются итог и дни,
+целиком лежащие в горячем хранилище; счётчики отправителей такого чата не
+сверяются — для этого пришлось бы распаковывать весь архив.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, UpdateOne
+
+import src.concts as c
+from db import archive
+from db.mongo_config import profiled
+from src.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+stats_write_errors = Counter("chat_stats_write_errors_total", "Сообщения, не учтённые в счётчиках чата")
+stats_repaired = Counter("chat_stats_repaired_total", "Счётчики, исправленные сверкой", ("kind",))
+
+
+def _day(ts: datetime) -> str:
+    return ts.date().isoformat()
+
+
+def _total_id(chat_id: str) -> str:
+    return f"{chat_id}:total"
+
+
+def _day_id(chat_id: str, day: str) -> str:
+    return f"{chat_id}:day:{day}"
+
+
+def _sender_id(chat_id: str, sender_id: Any) -> str:
+    return f"{chat_id}:sender:{sender_id}"
+
+
+async def ensure_indexes(client: AsyncIOMotorClient) -> None:
+    await client.chat_stats.create_index([("chat_id", 1), ("kind", 1), ("day", 1)])
+    await client.chat_stats.create_index([("chat_id", 1), ("kind", 1), ("messages", -1)])
+
+
+#region increments
+async def record_message(client: AsyncIOMotorClient, message: Dict[str, Any]) -> None:
+    """Учитывает записанное сообщение в счётчиках чата.
+
+    Ошибка не прерывает отправку сообщения: счётчик исправит сверка.
+    """
+    if not c.STATS_ENABLED:
+        return
+    chat_id, sender_id, ts = message["chat_id"], message["sender_id"], message["timestamp"]
+    day = _day(ts)
+    try:
+        await client.chat_stats.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": _total_id(chat_id)},
+                    {
+                        "$inc": {"messages": 1},
+                        "$max": {"last_at": ts, "last_seq": message.get("seq") or 0},
+                        "$setOnInsert": {"chat_id": chat_id, "kind": "total"},
+                    },
+                    upsert=True,
+                ),
+                UpdateOne(
+                    {"_id": _day_id(chat_id, day)},
+                    {"$inc": {"messages": 1}, "$setOnInsert": {"chat_id": chat_id, "kind": "day", "day": day}},
+                    upsert=True,
+                ),
+                UpdateOne(
+                    {"_id": _sender_id(chat_id, sender_id)},
+                    {
+                        "$inc": {"messages": 1},
+                        "$max": {"last_at": ts},
+                        "$setOnInsert": {"chat_id": chat_id, "kind": "sender", "sender_id": sender_id},
+                    },
+                    upsert=True,
+                ),
+            ],
+            ordered=False,
+        )
+    except Exception as e:
+        stats_write_errors.inc()
+        logger.warning("Счётчики чата %s не обновлены: %s", chat_id, e)
+#endregion
+
+
+#region reads
+async def get_chat_stats(client: AsyncIOMotorClient, chat_id: str, days: int, top: int) -> Dict[str, Any]:
+    """Счётчики чата: итог, сообщения по дням за `days` дней и `top` отправителей.
+
+    Returns:
+        dict: `{chat_id, messages, last_message_at, last_seq, days: [{day, messages}],
+        top_senders: [{sender_id, messages, last_message_at}]}`.
+    """
+    collection = profiled(client, "chat_stats", "analytics")
+    #Время сообщений хранится со сдвигом +3 ч (см. add_message_mongo) — дни считаем так же
+    now = datetime.now(timezone.utc) + timedelta(hours=3)
+    since = _day(now - timedelta(days=max(days - 1, 0)))
+    total, day_docs, sender_docs = await asyncio.gather(
+        collection.find_one({"_id": _total_id(chat_id)}),
+        collection.find({"chat_id": chat_id, "kind": "day", "day": {"$gte": since}}, {"_id": 0})
+        .sort("day", 1)
+        .to_list(length=None),
+        collection.find({"chat_id": chat_id, "kind": "sender"}, {"_id": 0})
+        .sort("messages", -1)
+        .limit(top)
+        .to_list(length=None),
+    )
+    total = total or {}
+    return {
+        "chat_id": chat_id,
+        "messages": total.get("messages", 0),
+        "last_message_at": total.get("last_at"),
+        "last_seq": total.get("last_seq"),
+        "days": [{"day": d["day"], "messages": d["messages"]} for d in day_docs],
+        "top_senders": [
+            {"sender_id": s["sender_id"], "messages": s["messages"], "last_message_at": s.get("last_at")}
+            for s in sender_docs
+        ],
+    }
+
+
+async def most_active_chats(client: AsyncIOMotorClient, chat_ids: List[str], limit: int) -> List[Dict[str, Any]]:
+    """Чаты из `chat_ids` по убыванию числа сообщений (точечные чтения по `_id`)."""
+    docs = (
+        await profiled(client, "chat_stats", "analytics")
+        .find({"_id": {"$in": [_total_id(chat_id) for chat_id in chat_ids]}})
+        .sort("messages", -1)
+        .limit(limit)
+        .to_list(length=None)
+    )
+    return [
+        {"chat_id": d["chat_id"], "messages": d["messages"], "last_message_at": d.get("last_at")}
+        for d in docs
+    ]
+#endregion
+
+
+#region reconciliation
+def _hot_pipeline(chat_id: str) -> List[Dict[str, Any]]:
+    unwind = []
+    if c.MSG_STORAGE_LAYOUT == "bucket":
+        unwind = [{"$unwind": "$messages"}, {"$replaceRoot": {"newRoot": "$messages"}}]
+    return [
+        {"$match": {"chat_id": chat_id}},
+        *unwind,
+        {
+            "$facet": {
+                "total": [
+                    {"$group": {"_id": None, "messages": {"$sum": 1}, "last_at": {"$max": "$timestamp"},
+                                "last_seq": {"$max": "$seq"}, "first_at": {"$min": "$timestamp"}}},
+                ],
+                "days": [
+                    {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                                "messages": {"$sum": 1}}},
+                ],
+                "senders": [
+                    {"$group": {"_id": "$sender_id", "messages": {"$sum": 1}, "last_at": {"$max": "$timestamp"}}},
+                ],
+            }
+        },
+    ]
+
+
+async def _hot_counts(client: AsyncIOMotorClient, chat_id: str) -> Dict[str, Any]:
+    source = "chats_msgs_buckets" if c.MSG_STORAGE_LAYOUT == "bucket" else "chats_msgs"
+    result = await profiled(client, source, "analytics").aggregate(_hot_pipeline(chat_id)).to_list(length=1)
+    return result[0] if result else {"total": [], "days": [], "senders": []}
+
+
+def plan_repairs(
+    chat_id: str,
+    hot: Dict[str, Any],
+    archived: int,
+    current: List[Dict[str, Any]],
+) -> List[Any]:
+    """Операции, приводящие счётчики чата к пересчитанным значениям.
+
+    Расхождение исправляется `$inc` на разницу, а не `$set` абсолютного
+    значения: `current` читается с реплики (профиль `analytics`), и
+    инкременты `record_message`, записанные на primary после чтения, при
+    `$set` были бы затёрты. Лишний счётчик удаляется, только если его
+    значение не изменилось с момента чтения.
+
+    Args:
+        chat_id (str): Чат.
+        hot (dict): Результат агрегации горячего хранилища (`total`, `days`, `senders`).
+        archived (int): Сообщений чата в архиве.
+        current (List[dict]): Текущие документы `chat_stats` чата.
+
+    Returns:
+        list: `UpdateOne`/`DeleteOne` для `bulk_write` (пусто — расхождений нет).
+    """
+    total = hot["total"][0] if hot["total"] else {"messages": 0, "last_at": None, "last_seq": None, "first_at": None}
+    current_by_id = {doc["_id"]: doc for doc in current}
+    ops: List[Any] = []
+
+    def set_if_differs(doc_id: str, kind: str, expected: int, extra: Dict[str, Any]) -> None:
+        doc = current_by_id.get(doc_id)
+        if doc is None or doc.get("messages") != expected:
+            stats_repaired.inc(kind=kind)
+            update: Dict[str, Any] = {
+                "$inc": {"messages": expected - (doc or {}).get("messages", 0)},
+                "$setOnInsert": {"chat_id": chat_id, "kind": kind},
+            }
+            if extra:
+                update["$max"] = extra
+            ops.append(UpdateOne({"_id": doc_id}, update, upsert=True))
+
+    expected_total = total["messages"] + archived
+    if expected_total or _total_id(chat_id) in current_by_id:
+        extra = {k: total[k] for k in ("last_at", "last_seq") if total.get(k) is not None}
+        set_if_differs(_total_id(chat_id), "total", expected_total, extra)
+
+    #С архивом самый ранний горячий день мог частично уйти в архив — сверяем только дни после него
+    first_day = _day(total["first_at"]) if total.get("first_at") else None
+    expected_days = {
+        d["_id"]: d["messages"] for d in hot["days"]
+        if not archived or (first_day is not None and d["_id"] > first_day)
+    }
+    for day, messages in expected_days.items():
+        set_if_differs(_day_id(chat_id, day), "day", messages, {"day": day})
+
+    expected_senders = {} if archived else {s["_id"]: s for s in hot["senders"]}
+    for sender_id, s in expected_senders.items():
+        set_if_differs(_sender_id(chat_id, sender_id), "sender", s["messages"],
+                       {"sender_id": sender_id, "last_at": s["last_at"]})
+
+    #Лишние счётчики: день или отправитель без сообщений в сверяемом диапазоне
+    for doc in current:
+        stale = (
+            doc["kind"] == "day" and doc["day"] not in expected_days
+            and (not archived or (first_day is not None and doc["day"] > first_day))
+        ) or (doc["kind"] == "sender" and not archived and doc["sender_id"] not in expected_senders)
+        if stale:
+            stats_repaired.inc(kind=doc["kind"])
+            ops.append(DeleteOne({"_id": doc["_id"], "messages": doc.get("messages")}))
+    return ops
+
+
+async def reconcile_chat(client: AsyncIOMotorClient, chat_id: str) -> int:
+    """Пересчитывает счётчики чата и исправляет расхождения.
+
+    Исправления — разница к прочитанному (`plan_repairs`), поэтому
+    сообщения, учтённые `record_message` во время сверки, не теряются.
+    Сообщение, которое попало в пересчёт, но ещё не в прочитанные счётчики
+    (отставание реплики), может быть учтено неточно — такое расхождение
+    исправит следующий проход.
+
+    Returns:
+        int: Количество исправленных документов.
+    """
+    hot, blocks, current = await asyncio.gather(
+        _hot_counts(client, chat_id),
+        archive.store.list_blocks(client, chat_id),
+        profiled(client, "chat_stats", "analytics").find({"chat_id": chat_id}).to_list(length=None),
+    )
+    ops = plan_repairs(chat_id, hot, sum(b.get("count", 0) for b in blocks), current)
+    if ops:
+        await client.chat_stats.bulk_write(ops, ordered=False)
+        logger.info("Счётчики чата %s исправлены: %d", chat_id, len(ops))
+    return len(ops)
+
+
+async def run_reconciliation(client: AsyncIOMotorClient) -> int:
+    """Один проход сверки по всем чатам (по `STATS_RECONCILE_BATCH` чатов с паузой)."""
+    chat_ids = await profiled(client, "chats_info", "analytics").distinct("chat_id")
+    repaired = 0
+    for i, chat_id in enumerate(chat_ids, 1):
+        try:
+            repaired += await reconcile_chat(client, chat_id)
+        except Exception as e:
+            logger.error("Ошибка сверки счётчиков чата %s: %s", chat_id, e, exc_info=True)
+        if i % c.STATS_RECONCILE_BATCH == 0:
+            #Не занимаем Mongo длинной серией агрегаций
+            await asyncio.sleep(c.STATS_RECONCILE_PAUSE)
+    return repaired
+
+
+async def reconcile_loop(client: AsyncIOMotorClient) -> None:
+    """Фоновая сверка раз в `STATS_RECONCILE_INTERVAL` секунд (запускается из lifespan)."""
+    while True:
+        await asyncio.sleep(c.STATS_RECONCILE_INTERVAL)
+        try:
+            repaired = await run_reconciliation(client)
+            logger.info("Сверка счётчиков завершена, исправлено: %d", repaired)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка сверки счётчиков: %s", e, exc_info=True)
+#endregion
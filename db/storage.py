@@ -0,0 +1,190 @@
+"""Интерфейс хранилища чатов, участников и сообщений.
+
+Обработчики `main.py` работают с хранилищем через `Storage` (зависимость
+`get_storage`), а не с коллекциями Motor напрямую. Реализация выбирается
+переменной `STORAGE_BACKEND`:
+
+- `mongo` (по умолчанию) — `MongoStorage`, текущие функции `db/mongo.py` и
+  `db/members.py`;
+- `memory` — `MemoryStorage` (`db/memory_storage.py`): словари с индексами в
+  памяти процесса. Для бенчмарков логики сервиса без MongoDB, локальной
+  разработки и одноузловых развёртываний; данные живут до перезапуска.
+
+Поиск, вложения, счётчики и архив остаются на MongoDB и интерфейсом не
+покрываются: с `memory` их эндпоинты отвечают 501, а фоновые архивация и
+сверка счётчиков не запускаются.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import src.concts as c
+from db import members as ChatMembers
+from db import mongo as MongoDB
+from db.search import user_chat_ids
+from schemas import message as MsgModel
+
+
+class Storage(ABC):
+    """Операции с чатами, участниками и сообщениями.
+
+    Сигнатуры и форматы ответов совпадают с функциями `db/mongo.py` и
+    `db/members.py` без первого аргумента `client`.
+    """
+
+    name: str
+
+    async def ensure_indexes(self) -> List[str]:
+        """Готовит хранилище к работе (индексы и т.п.).
+
+        Returns:
+            list[str]: Что подготовить не удалось.
+        """
+        return []
+
+    #region chats
+    @abstractmethod
+    async def get_user_chats(self, user_id: int) -> List[MsgModel.Chats]: ...
+
+    @abstractmethod
+    async def user_chat_ids(self, user_id: int) -> List[str]: ...
+
+    @abstractmethod
+    async def get_chat_info(self, chat_id: str) -> Optional[MsgModel.Chats]: ...
+
+    @abstractmethod
+    async def get_chat_id(self, current_id: int, user_id: int) -> Optional[str]: ...
+
+    @abstractmethod
+    async def add_members_to_chat(self, chat_id: str, user_id: int, user_name: str, avatar: str) -> MsgModel.Chats: ...
+
+    @abstractmethod
+    async def get_chat_ids_bulk(self, current_id: int, user_ids: List[int]) -> Dict[int, str]: ...
+
+    @abstractmethod
+    async def create_chats_bulk(self, owner: Dict[str, Any], targets: List[Dict[str, Any]]) -> Dict[int, str]: ...
+
+    @abstractmethod
+    async def get_chats_info_bulk(self, chat_ids: List[str]) -> Dict[str, MsgModel.Chats]: ...
+    #endregion
+
+    #region members
+    @abstractmethod
+    async def create_group_chat(self, chat_name: str, owner: Dict[str, Any], members: List[Dict[str, Any]]) -> str: ...
+
+    @abstractmethod
+    async def get_member(self, chat_id: str, user_id: int) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def is_member(self, chat_id: str, user_id: int) -> bool: ...
+
+    @abstractmethod
+    async def add_member(self, chat_id: str, member: Dict[str, Any], role: str = ChatMembers.ROLE_MEMBER) -> bool: ...
+
+    @abstractmethod
+    async def remove_member(self, chat_id: str, user_id: int) -> bool: ...
+
+    @abstractmethod
+    async def list_members(self, chat_id: str, limit: int, after_user_id: int = 0) -> Dict[str, Any]: ...
+    #endregion
+
+    #region messages
+    @abstractmethod
+    async def add_message(
+        self,
+        chat_id: str,
+        sender_id: int,
+        content: str,
+        client_msg_id: Optional[str] = None,
+        attachments: Optional[List[str]] = None,
+    ) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_messages(self, chat_id: str, limit: int, offset: int) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    async def get_messages_after(self, chat_id: str, after_seq: int, limit: int) -> Dict[str, Any]: ...
+    #endregion
+
+
+class MongoStorage(Storage):
+    """Хранилище в MongoDB: обёртка над функциями `db/mongo.py` и `db/members.py`."""
+
+    name = "mongo"
+
+    def __init__(self, client: AsyncIOMotorClient):
+        self.client = client
+
+    async def ensure_indexes(self) -> List[str]:
+        return await MongoDB.ensure_indexes(self.client)
+
+    async def get_user_chats(self, user_id):
+        return await MongoDB.get_user_chats(self.client, user_id)
+
+    async def user_chat_ids(self, user_id):
+        return await user_chat_ids(self.client, user_id)
+
+    async def get_chat_info(self, chat_id):
+        return await MongoDB.get_chat_info(self.client, chat_id)
+
+    async def get_chat_id(self, current_id, user_id):
+        return await MongoDB.get_chat_id(self.client, current_id, user_id)
+
+    async def add_members_to_chat(self, chat_id, user_id, user_name, avatar):
+        return await MongoDB.add_members_to_chat(self.client, chat_id, user_id, user_name, avatar)
+
+    async def get_chat_ids_bulk(self, current_id, user_ids):
+        return await MongoDB.get_chat_ids_bulk(self.client, current_id, user_ids)
+
+    async def create_chats_bulk(self, owner, targets):
+        return await MongoDB.create_chats_bulk(self.client, owner, targets)
+
+    async def get_chats_info_bulk(self, chat_ids):
+        return await MongoDB.get_chats_info_bulk(self.client, chat_ids)
+
+    async def create_group_chat(self, chat_name, owner, members):
+        return await ChatMembers.create_group_chat(self.client, chat_name, owner, members)
+
+    async def get_member(self, chat_id, user_id):
+        return await ChatMembers.get_member(self.client, chat_id, user_id)
+
+    async def is_member(self, chat_id, user_id):
+        return await ChatMembers.is_member(self.client, chat_id, user_id)
+
+    async def add_member(self, chat_id, member, role=ChatMembers.ROLE_MEMBER):
+        return await ChatMembers.add_member(self.client, chat_id, member, role)
+
+    async def remove_member(self, chat_id, user_id):
+        return await ChatMembers.remove_member(self.client, chat_id, user_id)
+
+    async def list_members(self, chat_id, limit, after_user_id=0):
+        return await ChatMembers.list_members(self.client, chat_id, limit, after_user_id)
+
+    async def add_message(self, chat_id, sender_id, content, client_msg_id=None, attachments=None):
+        return await MongoDB.add_message_mongo(
+            self.client, chat_id=chat_id, sender_id=sender_id, content=content,
+            client_msg_id=client_msg_id, attachments=attachments,
+        )
+
+    async def get_messages(self, chat_id, limit, offset):
+        return await MongoDB.get_messages(self.client, chat_id, limit, offset)
+
+    async def get_messages_after(self, chat_id, after_seq, limit):
+        return await MongoDB.get_messages_after(self.client, chat_id, after_seq, limit)
+
+
+def create_storage(mongo_db: AsyncIOMotorClient, backend: Optional[str] = None) -> Storage:
+    """Создаёт хранилище по `STORAGE_BACKEND` (`mongo` или `memory`)."""
+    backend = backend or c.STORAGE_BACKEND
+    if backend == "memory":
+        #db.memory_storage наследует Storage из этого модуля
+        from db.memory_storage import MemoryStorage
+        return MemoryStorage()
+    return MongoStorage(mongo_db)
+
+
+async def get_storage(request: Request) -> Storage:
+    return request.app.state.storage
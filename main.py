@@ -1,31 +1,108 @@
-import json
+import hmac
+import time
 import asyncio
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 from contextlib import asynccontextmanager
 
-import httpx
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import Body, Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.websockets import WebSocket, WebSocketDisconnect
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import ExecutionTimeout
 
 import db.mongo as MongoDB
+from db import attachments as Attachments
+from db import members as ChatMembers
+from db import stats as ChatStats
+from db.archive import archival_loop
 from db.mongo import get_mongo_db
+from db.mongo_config import MongoClientSettings
+from db.search import search_messages
+from db.storage import create_storage, get_storage
 from schemas import message as MsgModel
+from schemas.frames import EPHEMERAL_TYPES, parse_frame
 import src.auth as auth
+import src.broadcast as broadcast
+import src.capture as capture
 import src.concts as c
-from src.blacklist import check_user_blocked_by_username
+import src.drain as drain
+import src.ephemeral as ephemeral
+import src.handshake as handshake
+import src.log_config as log_config
+import src.loop_monitor as loop_monitor
+import src.upstream as upstream
+from src.blacklist import check_user_blocked_by_username, is_unknown
+from src.codec import negotiate
+from src.circuit_breaker import LatencyBudgetMiddleware
+from src.metrics import Gauge, render as render_metrics
+from src.rate_limit import check_frame, new_connection_bucket, rate_limited_frames, user_buckets
+from src.user_cache import get_user_by_username, get_users_by_usernames
 
 from uuid import uuid4
+from urllib.parse import quote
 
 #region helpers
+async def warm_up(app: FastAPI) -> None:
+    """Прогревает пулы соединений и помечает приложение готовым (`/ready`).
+
+    Открывает `MONGO_WARM_CONNECTIONS` соединений с MongoDB параллельными
+    `ping`, проверяет индексы и заранее открывает соединение с бекендом,
+    чтобы первый пользовательский запрос не платил за рукопожатия.
+
+    Без ответа MongoDB приложение не готово, и `ping` повторяется. С
+    хранилищем в памяти (`STORAGE_BACKEND=memory`) MongoDB не прогревается
+    и на готовность не влияет. Ошибки индексов готовность не блокируют: они
+    постоянные (например, дубли под уникальным индексом), поэтому пишутся в
+    лог и в `startup_index_failures`.
+    """
+    started = time.perf_counter()
+    mongo_client = app.state.mongo_client
+    #Хранилищу в памяти MongoDB не нужна: поиск, счётчики и вложения с ним отключены
+    while app.state.storage.name == "mongo":
+        try:
+            await asyncio.gather(
+                *(mongo_client.admin.command("ping") for _ in range(max(c.MONGO_WARM_CONNECTIONS, 1)))
+            )
+            break
+        except Exception as e:
+            logging.error("MongoDB недоступна при прогреве: %s", e)
+            await asyncio.sleep(1)
+
+    try:
+        if app.state.storage.name == "mongo":
+            failed = await MongoDB.ensure_indexes(mongo_client.baza)
+        else:
+            failed = await app.state.storage.ensure_indexes()
+    except Exception as e:
+        logging.error("Не удалось проверить индексы: %s", e, exc_info=True)
+        failed = ["*"]
+    index_failures.set(len(failed))
+    await upstream.warm_up()
+
+    app.state.ready = True
+    warmup_seconds.set(time.perf_counter() - started)
+    logging.info("Прогрев завершён за %.3f с", time.perf_counter() - started)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Лайф-цикл приложения: подключение/закрытие MongoDB клиента.
 
     При старте приложения создаёт клиент `AsyncIOMotorClient` и кладёт его в
-    `app.state.mongo_client`. При завершении — корректно закрывает соединение.
+    `app.state.mongo_client`, а хранилище чатов и сообщений
+    (`STORAGE_BACKEND`, `db/storage.py`) — в `app.state.storage`. Пулы соединений прогреваются в фоне
+    (`warm_up`), поэтому сервер начинает принимать соединения сразу, а
+    `/ready` становится зелёным, когда прогрев завершён. Если включено,
+    запускается фоновая архивация истории и сверка счётчиков чатов. При
+    завершении — корректно закрывает соединения.
+
+    Логирование переводится на очередь с фоновым писателем
+    (`src/log_config.py`) на всё время жизни приложения. Если задан
+    `CAPTURE_FILE`, трафик записывается для воспроизведения (`src/capture.py`).
+    Сторож цикла событий (`src/loop_monitor.py`) меряет задержку цикла и
+    снимает стек при его остановке.
 
     Args:
         app (FastAPI): Экземпляр приложения FastAPI.
@@ -33,16 +110,40 @@ async def lifespan(app: FastAPI):
     Yields:
         None: Управление возвращается FastAPI для запуска приложения.
     """
+    log_config.setup_logging()
+    capture.start()
+    loop_monitor.start()
+    archive_task = None
+    stats_task = None
+    app.state.ready = False
+    app.state.warmup_task = None
     try:
-        # Инициализация при старте
-        app.state.mongo_client = AsyncIOMotorClient(c.MONGO_URL)
-        logging.info(f"MongoDB подключен: {app.state.mongo_client}")
+        # Инициализация при старте (без сетевых вызовов — клиент подключается лениво)
+        settings = MongoClientSettings.from_env()
+        app.state.mongo_client = AsyncIOMotorClient(settings.url, **settings.client_kwargs())
+        logging.info("MongoDB подключен: %s", app.state.mongo_client)
+        app.state.storage = create_storage(app.state.mongo_client.baza)
+        logging.info("Хранилище чатов: %s", app.state.storage.name)
+        app.state.warmup_task = asyncio.create_task(warm_up(app))
+        #Архив и сверка счётчиков читают сообщения из MongoDB
+        if c.ARCHIVE_ENABLED and app.state.storage.name == "mongo":
+            archive_task = asyncio.create_task(archival_loop(app.state.mongo_client.baza))
+        if c.STATS_ENABLED and c.STATS_RECONCILE_INTERVAL > 0 and app.state.storage.name == "mongo":
+            stats_task = asyncio.create_task(ChatStats.reconcile_loop(app.state.mongo_client.baza))
         yield
     finally:
-        # Закрытие при завершении
+        # Закрытие при завершении: сначала дренаж оставшихся websocket-соединений
+        await drain.drain()
+        for task in (archive_task, stats_task, app.state.warmup_task):
+            if task:
+                task.cancel()
+        await upstream.close()
         if app.state.mongo_client:
             app.state.mongo_client.close()
             logging.info("MongoDB соединение закрыто")
+        loop_monitor.stop()
+        capture.stop()
+        log_config.shutdown_logging()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -59,9 +160,15 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(LatencyBudgetMiddleware)
+if c.CAPTURE_FILE:
+    app.add_middleware(capture.CaptureMiddleware)
 
 connected_clients: Dict[str, Dict[str, Any]] = {}
 
+warmup_seconds = Gauge("startup_warmup_seconds", "Длительность прогрева пулов соединений при старте")
+index_failures = Gauge("startup_index_failures", "Индексы MongoDB, которые не удалось создать при старте")
+
 async def init_chat() -> MsgModel.Chats:
     """Инициализирует пустую модель чата.
 
@@ -78,6 +185,30 @@ async def init_chat() -> MsgModel.Chats:
     )
     return chat
 
+
+async def require_member(storage, chat_id: str, user_id: int) -> None:
+    """Проверяет членство пользователя в чате (точечный запрос по индексу).
+
+    Raises:
+        HTTPException: 403 — пользователь не состоит в чате (или чата нет).
+    """
+    if not await storage.is_member(chat_id, user_id):
+        raise HTTPException(status_code=403, detail="Нет доступа к чату")
+
+
+def require_mongo_backend(storage) -> None:
+    """Проверяет, что данные чатов лежат в MongoDB.
+
+    Поиск, счётчики и вложения читают коллекции MongoDB напрямую и
+    интерфейсом `Storage` не покрываются: с хранилищем в памяти они вернули
+    бы пустые или чужие данные.
+
+    Raises:
+        HTTPException: 501 — `STORAGE_BACKEND` не `mongo`.
+    """
+    if storage.name != "mongo":
+        raise HTTPException(status_code=501, detail=f"Недоступно при STORAGE_BACKEND={storage.name}")
+
 #endregion
 
 #region endpoints
@@ -85,7 +216,7 @@ async def init_chat() -> MsgModel.Chats:
 async def socket_get_chats_endpoint(
     user_id: int = 0,
     current_user=Depends(auth.whoami),
-    client=Depends(get_mongo_db),
+    storage=Depends(get_storage),
 ):
     """Возвращает список чатов пользователя с полной структурой данных.
 
@@ -95,14 +226,14 @@ async def socket_get_chats_endpoint(
     Args:
         user_id (int, optional): ID пользователя, для которого запрашиваются чаты.
         current_user: Текущий авторизованный пользователь (через Depends).
-        client: Экземпляр базы MongoDB (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
 
     Returns:
         list[MsgModel.Chats]: Список чатов пользователя.
 
     Raises:
         HTTPException: 401 — если пользователь не аутентифицирован.
-        HTTPException: 500 — при ошибках чтения из MongoDB.
+        HTTPException: 500 — при ошибках чтения из хранилища.
     """
     effective_user_id = user_id or getattr(current_user, "user_id", 0)
     if not effective_user_id:
@@ -110,30 +241,7 @@ async def socket_get_chats_endpoint(
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     try:
-        collection = client.chats_info
-        filter_ = {"members.user_id": effective_user_id}
-        projection = {"chat_id": 1, "chat_type": 1, "chat_name": 1, "members": 1}
-
-        #Один сетевой запрос получаем все документы списком
-        docs = await collection.find(filter_, projection).to_list(length=None)
-
-        chat_list = [
-            MsgModel.Chats(
-                chat_id=doc["chat_id"],
-                chat_type=doc.get("chat_type", "simple"),
-                chat_name=doc.get("chat_name"),
-                members=[
-                    MsgModel.Members(
-                        user_id=m["user_id"],
-                        user_name=m["user_name"],
-                        avatar=m.get("avatar", ""),
-                    )
-                    for m in doc.get("members", [])
-                ],
-            )
-            for doc in docs
-        ]
-
+        chat_list = await storage.get_user_chats(effective_user_id)
         logging.info("Выгрузка чатов: %d шт.", len(chat_list))
         return chat_list
 
@@ -148,13 +256,13 @@ async def create_chat_with_user(
     request: Request,
     username: str,
     user_id: int = 0,
-    client=Depends(get_mongo_db),
+    storage=Depends(get_storage),
     current_user=Depends(auth.whoami),
 ):
     """Создаёт новый чат или возвращает существующий чат с указанным пользователем.
 
     Шаги:
-      1) Получает карточку целевого пользователя по `username` из user-service.
+      1) Получает карточку целевого пользователя по `username` (кэш или user-service).
       2) Проверяет взаимные блокировки (`check_user_blocked_by_username`).
       3) Ищет существующий чат между инициатором и целевым пользователем.
       4) Если чата нет — создаёт новый и добавляет обоих участников.
@@ -164,7 +272,7 @@ async def create_chat_with_user(
         request: HTTP-запрос (для cookies при проверке блокировки).
         username: Имя пользователя, с которым нужно создать чат.
         user_id: Явно заданный ID инициатора (если 0 — берётся из `current_user`).
-        client: Экземпляр базы MongoDB (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
         current_user: Текущий авторизованный пользователь (через Depends).
 
     Returns:
@@ -174,6 +282,7 @@ async def create_chat_with_user(
         HTTPException: 401 — пользователь не аутентифицирован.
         HTTPException: 404 — целевой пользователь не найден или чат не найден после создания.
         HTTPException: 403 — пользователи заблокированы.
+        HTTPException: 503 — блокировки не удалось проверить.
         HTTPException: 400 — ошибка на этапе получения пользователя.
         HTTPException: 500 — внутренняя ошибка при работе с БД/сервисами.
     """
@@ -182,18 +291,11 @@ async def create_chat_with_user(
         logging.error("Пользователь не аутентифицирован")
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    #Получаем целевого пользователя
+    #Получаем целевого пользователя (через TTL-кэш профилей)
     try:
-        async with httpx.AsyncClient(timeout=5.0) as hc:
-            resp = await hc.get(f"{c.BACKEND_URL}{c.USER_PREFIX}/user/", params={"username": username})
-            if resp.status_code != 200:
-                raise HTTPException(status_code=404, detail="Пользователь не найден")
-            user_data = resp.json()
-            target_user = {
-                "user_id": user_data["id"],
-                "user_name": user_data["username"],
-                "avatar": user_data.get("avatar", ""),
-            }
+        target_user = await get_user_by_username(username)
+        if target_user is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
     except HTTPException:
         raise
     except Exception as e:
@@ -205,9 +307,10 @@ async def create_chat_with_user(
         is_blocked = await check_user_blocked_by_username(
             request=request, blocked_username=target_user["user_name"]
         )
-        if isinstance(is_blocked, dict) and (
-            is_blocked.get("blocked_by_user") or is_blocked.get("you_blocked_user")
-        ):
+        #Без ответа user-service блокировки неизвестны — чат не создаём
+        if is_unknown(is_blocked):
+            raise HTTPException(status_code=503, detail="Не удалось проверить блокировки")
+        if is_blocked.get("blocked_by_user") or is_blocked.get("you_blocked_user"):
             raise HTTPException(status_code=403, detail=is_blocked)
     except HTTPException:
         raise
@@ -217,7 +320,7 @@ async def create_chat_with_user(
 
     #Ищем существующий чат
     try:
-        mongo_chat_id = await MongoDB.get_chat_id(client, effective_user_id, target_user["user_id"])
+        mongo_chat_id = await storage.get_chat_id(effective_user_id, target_user["user_id"])
     except Exception as e:
         logging.error("Ошибка поиска чата в MongoDB: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Ошибка поиска чата")
@@ -229,15 +332,13 @@ async def create_chat_with_user(
             mongo_chat_id = new_chat.chat_id
 
             await asyncio.gather(
-                MongoDB.add_members_to_chat(
-                    client,
+                storage.add_members_to_chat(
                     chat_id=mongo_chat_id,
                     user_id=effective_user_id,
                     user_name=current_user.username,
                     avatar=current_user.avatar,
                 ),
-                MongoDB.add_members_to_chat(
-                    client,
+                storage.add_members_to_chat(
                     chat_id=mongo_chat_id,
                     user_id=target_user["user_id"],
                     user_name=target_user["user_name"],
@@ -249,7 +350,7 @@ async def create_chat_with_user(
             raise HTTPException(status_code=500, detail="Ошибка создания чата")
 
     #Возвращаем полную информацию о чате
-    chat_info = await MongoDB.get_chat_info(client, mongo_chat_id)
+    chat_info = await storage.get_chat_info(mongo_chat_id)
     if not chat_info:
         raise HTTPException(status_code=404, detail="Чат не найден после создания")
 
@@ -257,89 +358,466 @@ async def create_chat_with_user(
     return chat_info
 
 
+@app.post(c.PATH_PREFIX + "/wss/create_chats", response_model=List[MsgModel.BatchChatResult])
+async def create_chats_with_users(
+    request: Request,
+    usernames: List[str] = Body(...),
+    storage=Depends(get_storage),
+    current_user=Depends(auth.whoami),
+):
+    """Пакетно создаёт (или находит) личные чаты с несколькими пользователями.
+
+    Шаги:
+      1) Конкурентно получает профили всех пользователей (кэш или user-service).
+      2) Параллельно проверяет взаимные блокировки.
+      3) Одним запросом ищет уже существующие чаты.
+      4) Недостающие чаты создаёт одним `insert_many`.
+      5) Одним запросом читает итоговую информацию о всех чатах.
+
+    Args:
+        request: HTTP-запрос (для cookies при проверке блокировки).
+        usernames: Имена пользователей (тело запроса, JSON-массив).
+        storage: Хранилище чатов и сообщений (через Depends).
+        current_user: Текущий авторизованный пользователь (через Depends).
+
+    Returns:
+        list[MsgModel.BatchChatResult]: Результат по каждому имени в порядке запроса.
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 400 — пустой список или превышен `BATCH_CHAT_LIMIT`.
+        HTTPException: 500 — внутренняя ошибка при работе с БД.
+    """
+    #Инициатор — только аутентифицированный пользователь: владелец чатов берётся из current_user
+    effective_user_id = getattr(current_user, "user_id", None)
+    if not effective_user_id:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    names = list(dict.fromkeys(usernames))
+    if not names or len(names) > c.BATCH_CHAT_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Ожидается от 1 до {c.BATCH_CHAT_LIMIT} пользователей")
+
+    status: Dict[str, str] = {}
+
+    #Профили пользователей
+    profiles = await get_users_by_usernames(names)
+    targets = {}
+    for name in names:
+        profile = profiles.get(name)
+        if isinstance(profile, Exception):
+            status[name] = "error"
+        elif profile is None or profile["user_id"] == effective_user_id:
+            status[name] = "not_found"
+        else:
+            targets[name] = profile
+
+    #Проверки блокировок — параллельно, через общий пул соединений
+    checks = await asyncio.gather(
+        *(
+            check_user_blocked_by_username(request=request, blocked_username=t["user_name"])
+            for t in targets.values()
+        )
+    )
+    for name, is_blocked in zip(list(targets), checks):
+        if is_unknown(is_blocked):
+            status[name] = "error"
+            targets.pop(name)
+        elif is_blocked.get("blocked_by_user") or is_blocked.get("you_blocked_user"):
+            status[name] = "blocked"
+            targets.pop(name)
+
+    #Поиск существующих и создание недостающих чатов пакетными операциями
+    try:
+        chat_ids = await storage.get_chat_ids_bulk(
+            effective_user_id, [t["user_id"] for t in targets.values()]
+        )
+        owner = {
+            "user_id": effective_user_id,
+            "user_name": current_user.username,
+            "avatar": current_user.avatar,
+        }
+        chat_ids.update(
+            await storage.create_chats_bulk(
+                owner, [t for t in targets.values() if t["user_id"] not in chat_ids]
+            )
+        )
+        chats = await storage.get_chats_info_bulk(list(chat_ids.values()))
+    except Exception as e:
+        logging.error("Ошибка пакетного создания чатов: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Ошибка создания чатов")
+
+    results = []
+    for name in names:
+        chat = chats.get(chat_ids.get(targets[name]["user_id"])) if name in targets else None
+        if chat is not None:
+            results.append(MsgModel.BatchChatResult(username=name, status="ok", chat=chat))
+        else:
+            results.append(MsgModel.BatchChatResult(username=name, status=status.get(name, "error")))
+
+    logging.info("Пакетное создание чатов: %d запрошено, %d готово", len(names), len(targets))
+    return results
+
+
+@app.post(c.PATH_PREFIX + "/wss/create_group_chat", response_model=MsgModel.Chats)
+async def create_group_chat(
+    chat_name: str,
+    usernames: List[str] = Body(default=[]),
+    current_user=Depends(auth.whoami),
+    storage=Depends(get_storage),
+):
+    """Создаёт групповой чат. Создатель становится владельцем (`owner`).
+
+    Args:
+        chat_name: Название чата.
+        usernames: Начальные участники (тело запроса, JSON-массив, до `BATCH_CHAT_LIMIT`).
+        current_user: Текущий авторизованный пользователь (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
+
+    Returns:
+        MsgModel.Chats: Созданный чат с `member_count` (участники — через `/members`).
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 400 — пустое название или превышен `BATCH_CHAT_LIMIT`.
+        HTTPException: 500 — внутренняя ошибка при работе с БД.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    names = list(dict.fromkeys(usernames))
+    if not chat_name.strip() or len(names) > c.BATCH_CHAT_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Нужно название и не более {c.BATCH_CHAT_LIMIT} участников")
+
+    #Профили участников; ненайденные пропускаем
+    profiles = await get_users_by_usernames(names) if names else {}
+    initial = [p for p in profiles.values() if isinstance(p, dict)]
+
+    owner = {
+        "user_id": current_user.user_id,
+        "user_name": current_user.username,
+        "avatar": current_user.avatar,
+    }
+    try:
+        chat_id = await storage.create_group_chat(chat_name.strip(), owner, initial)
+    except Exception as e:
+        logging.error("Ошибка создания группового чата: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Ошибка создания чата")
+
+    return await storage.get_chat_info(chat_id)
+
+
+@app.get(c.PATH_PREFIX + "/wss/chats/{chat_id}/members", response_model=MsgModel.MemberPage)
+async def list_chat_members(
+    chat_id: str,
+    limit: int = 100,
+    after_user_id: int = 0,
+    current_user=Depends(auth.whoami),
+    storage=Depends(get_storage),
+):
+    """Постраничный список участников чата (по возрастанию `user_id`).
+
+    Args:
+        chat_id: Идентификатор чата.
+        limit: Размер страницы (не больше `MEMBERS_PAGE_LIMIT`).
+        after_user_id: Курсор — `next_after` предыдущей страницы.
+        current_user: Текущий авторизованный пользователь (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
+
+    Returns:
+        MsgModel.MemberPage: Участники и курсор следующей страницы.
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 403 — пользователь не состоит в чате.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    await require_member(storage, chat_id, current_user.user_id)
+
+    chat_info = await storage.get_chat_info(chat_id)
+    if chat_info.chat_type != "group":
+        return MsgModel.MemberPage(members=chat_info.members)
+    limit = max(1, min(limit, c.MEMBERS_PAGE_LIMIT))
+    return await storage.list_members(chat_id, limit, after_user_id)
+
+
+@app.post(c.PATH_PREFIX + "/wss/chats/{chat_id}/members", response_model=MsgModel.Members)
+async def add_chat_member(
+    chat_id: str,
+    username: str,
+    current_user=Depends(auth.whoami),
+    storage=Depends(get_storage),
+):
+    """Добавляет пользователя в групповой чат (только владелец или админ).
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 403 — нет прав на добавление участников.
+        HTTPException: 404 — пользователь не найден.
+        HTTPException: 409 — пользователь уже состоит в чате.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    caller = await storage.get_member(chat_id, current_user.user_id)
+    if not caller or caller.get("role") not in (ChatMembers.ROLE_OWNER, ChatMembers.ROLE_ADMIN):
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+
+    target_user = await get_user_by_username(username)
+    if target_user is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    if not await storage.add_member(chat_id, target_user):
+        raise HTTPException(status_code=409, detail="Пользователь уже в чате")
+    return MsgModel.Members(**target_user, role=ChatMembers.ROLE_MEMBER)
+
+
+@app.delete(c.PATH_PREFIX + "/wss/chats/{chat_id}/members/{user_id}")
+async def remove_chat_member(
+    chat_id: str,
+    user_id: int,
+    current_user=Depends(auth.whoami),
+    storage=Depends(get_storage),
+):
+    """Удаляет участника из группового чата.
+
+    Выйти из чата может любой участник; удалить другого — владелец или админ.
+    Владельца удалить нельзя.
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 403 — нет прав на удаление участника.
+        HTTPException: 400 — попытка удалить владельца.
+        HTTPException: 404 — пользователь не состоит в чате.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    caller, target = await asyncio.gather(
+        storage.get_member(chat_id, current_user.user_id),
+        storage.get_member(chat_id, user_id),
+    )
+    if not caller:
+        raise HTTPException(status_code=403, detail="Нет доступа к чату")
+    if user_id != current_user.user_id and caller.get("role") not in (ChatMembers.ROLE_OWNER, ChatMembers.ROLE_ADMIN):
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    if not target:
+        raise HTTPException(status_code=404, detail="Пользователь не состоит в чате")
+    if target.get("role") == ChatMembers.ROLE_OWNER:
+        raise HTTPException(status_code=400, detail="Владельца нельзя удалить из чата")
+
+    await storage.remove_member(chat_id, user_id)
+    return {"status": "ok"}
+
+
 @app.websocket(c.PATH_PREFIX + "/wss/chat")
 async def chat_room(
     websocket: WebSocket,
     chat_id: str,
-    current_user=Depends(auth.whoami_socket),
+    batch: bool = False,
+    after_seq: Optional[int] = None,
 ):
     """Вебсокет-комната чата.
 
-    Проверяет авторизацию, существование чата и блокировки, затем:
+    Проверяет авторизацию, существование чата и блокировки (параллельно,
+    `src/handshake.py`), затем:
     - подключает клиента к комнате;
+    - ограничивает частоту входящих сообщений (на соединение и на пользователя);
     - ретранслирует входящие сообщения всем участникам комнаты;
-    - сохраняет каждое сообщение в MongoDB.
+    - сохраняет каждое сообщение в хранилище (`db/storage.py`).
+
+    Сообщения сверх лимита отклоняются фреймом
+    `{"type": "error", "code": "rate_limited", "retry_after_ms": N}`, либо,
+    при `WS_RATE_LIMIT_MODE=delay`, задерживаются не более чем на
+    `WS_RATE_LIMIT_MAX_DELAY` секунд.
+
+    Клиент, подключившийся с `?batch=1`, при включённой склейке
+    (`WS_COALESCE_MS > 0`) получает сообщения пачками — см. `src/broadcast.py`.
+
+    Фреймы типизированы (`schemas/frames.py`): `message` (или фрейм без
+    `type`) сохраняется и рассылается от имени пользователя соединения в его
+    чат — фрейм с чужими `chat_id`/`sender_id` отклоняется `bad_frame`; `typing`, `presence` и `read` —
+    эфемерные события: они троттлятся, рассылаются остальным участникам
+    комнаты и не пишутся в MongoDB (`src/ephemeral.py`). При входе и выходе
+    пользователя комната получает `presence` online/offline.
+
+    Каждое сообщение сохраняется до рассылки и уходит с `msg_id` и порядковым
+    номером `seq`. Если клиент передал `client_msg_id`, отправитель получает
+    `{"type": "ack", "client_msg_id", "msg_id", "seq", "duplicate"}`; повтор
+    с тем же ключом подтверждается без записи и без повторной рассылки, а при
+    ошибке записи приходит `{"type": "error", "code": "not_saved", "client_msg_id"}`.
+
+    Перед остановкой пода соединения дренируются (`src/drain.py`): клиент
+    получает `{"type": "reconnect", "after_ms", "resume_token"}` и,
+    переподключившись с `?resume=<token>`, пропускает проверки рукопожатия. Переподключившийся клиент передаёт `?after_seq=N` и сразу
+    после подключения получает пропущенное фреймом
+    `{"type": "sync", "messages": [...], "last_seq", "has_more", "truncated"}`.
+
+    Клиент, предложивший подпротокол `chat.msgpack.v1`, обменивается
+    бинарными фреймами MessagePack со строгой проверкой схемы (`src/codec.py`);
+    остальные — текстовыми JSON-фреймами.
     """
-    #Проверка аутентификации пользователя
-    if current_user.user_id is None and current_user == 0:
-        logging.error("Пользователь не аутентифицирован")
-        await websocket.close(code=1008, reason="Not authenticated")
+    #Под останавливается — новые соединения не принимаем
+    if drain.is_draining():
+        await websocket.close(code=1012, reason="Service restart")
         return
 
-    #Получаем информацию о чате и проверяем блокировки
+    #Авторизация, чат и блокировки — параллельным конвейером (src/handshake.py)
+    storage = websocket.app.state.storage
     mongo_db = websocket.app.state.mongo_client.baza
-    chat_info: MsgModel.Chats = await MongoDB.get_chat_info(mongo_db, chat_id)
-    if not chat_info:
-        await websocket.close(code=1011, reason="Chat not found in DB")
+    try:
+        current_user = await handshake.authorize(websocket, storage, chat_id)
+    except handshake.HandshakeRejected as e:
+        await websocket.close(code=e.code, reason=e.reason)
         return
 
-    recipient = next((m for m in chat_info.members if m.user_id != current_user.user_id), None)
-    if not recipient:
-        await websocket.close(code=1011, reason="User not found in current chat")
-        return
+    codec = negotiate(websocket)
+    await websocket.accept(subprotocol=codec.subprotocol)
 
-    is_blocked = await check_user_blocked_by_username(
-        request=websocket, blocked_username=recipient.user_name
-    )
-    if is_blocked.get("blocked_by_user") or is_blocked.get("you_blocked_user"):
-        await websocket.close(code=1011, reason="Blocked by user")
-        return
-
-    await websocket.accept()
+    conn_bucket = new_connection_bucket()
+    user_bucket = user_buckets.acquire(current_user.user_id)
+    throttle = ephemeral.EventThrottle()
 
     try:
         #Регистрируем соединение в комнате
-        room = connected_clients.setdefault(chat_id, {"websocket_list": []})
+        room = connected_clients.setdefault(chat_id, {"websocket_list": [], "online": {}})
         room_sockets = room["websocket_list"]
         room_sockets.append(websocket)
+        broadcast.register(websocket, coalesce=batch, codec=codec)
+        drain.track(websocket, current_user, chat_id)
+
+        #Первое соединение пользователя в комнате — сообщаем остальным, что он онлайн
+        online = room["online"]
+        online[current_user.user_id] = online.get(current_user.user_id, 0) + 1
+        if online[current_user.user_id] == 1:
+            await ephemeral.publish(room_sockets, websocket, {
+                "type": "presence", "status": "online", "chat_id": chat_id, "user_id": current_user.user_id,
+            })
+
+        #Дельта-синхронизация после переподключения
+        if after_seq is not None:
+            delta = await storage.get_messages_after(chat_id, after_seq, c.SYNC_MAX_MESSAGES)
+            await broadcast.send_to(websocket, {"type": "sync", **delta})
 
         while True:
-            #Получаем и разбираем входящее сообщение
-            data = json.loads(await websocket.receive_text())
-
-            #Готовим полезную нагрузку для рассылки
-            outgoing = json.dumps(
-                {
-                    "chat_id": data.get("chat_id"),
-                    "sender_id": data.get("sender_id"),
-                    "content": data.get("content"),
+            raw = await codec.receive(websocket)
+
+            #Разбираем входящий фрейм по типу
+            try:
+                frame = parse_frame(codec.decode(raw), strict=codec.strict)
+            except ValueError as e:
+                await broadcast.send_to(
+                    websocket, {"type": "error", "code": "bad_frame", "detail": str(e)[:200]}
+                )
+                continue
+
+            #Эфемерные события: без записи в MongoDB и без токенов лимита сообщений
+            if frame.type in EPHEMERAL_TYPES:
+                await ephemeral.handle(throttle, room_sockets, websocket, chat_id, current_user.user_id, frame)
+                continue
+
+            #Чат и отправитель — только из соединения: поля фрейма лишь сверяем
+            if (frame.chat_id is not None and frame.chat_id != chat_id) or (
+                frame.sender_id is not None and frame.sender_id != current_user.user_id
+            ):
+                await broadcast.send_to(websocket, {
+                    "type": "error", "code": "bad_frame",
+                    "detail": "chat_id/sender_id не совпадают с соединением", "client_msg_id": frame.client_msg_id,
+                })
+                continue
+
+            #Ограничение частоты: отклоняем или придерживаем фрейм сверх лимита
+            wait = check_frame(conn_bucket, user_bucket)
+            if wait:
+                if c.WS_RATE_LIMIT_MODE == "delay" and wait <= c.WS_RATE_LIMIT_MAX_DELAY:
+                    rate_limited_frames.inc(action="delayed")
+                    await asyncio.sleep(wait)
+                    conn_bucket.consume()
+                    user_bucket.consume()
+                else:
+                    rate_limited_frames.inc(action="rejected")
+                    await broadcast.send_to(
+                        websocket, {"type": "error", "code": "rate_limited", "retry_after_ms": int(wait * 1000) + 1}
+                    )
+                    continue
+
+            #Вложения должны быть загружены в этот же чат (хранилище вложений — только MongoDB)
+            if frame.attachments and (storage.name != "mongo" or await Attachments.count_chat_attachments(
+                mongo_db, chat_id, frame.attachments
+            ) != len(set(frame.attachments))):
+                await broadcast.send_to(
+                    websocket, {"type": "error", "code": "bad_attachment", "client_msg_id": frame.client_msg_id}
+                )
+                continue
+
+            #Сообщение в обработке: дренаж дождётся записи и рассылки
+            async with drain.inflight():
+                #Сохраняем сообщение: получаем msg_id и порядковый номер seq
+                saved = await storage.add_message(
+                    chat_id=chat_id,
+                    sender_id=current_user.user_id,
+                    content=frame.content,
+                    client_msg_id=frame.client_msg_id,
+                    attachments=frame.attachments,
+                )
+
+                #Подтверждаем отправителю, чтобы клиент прекратил повторы
+                if frame.client_msg_id:
+                    if not saved:
+                        await broadcast.send_to(
+                            websocket, {"type": "error", "code": "not_saved", "client_msg_id": frame.client_msg_id}
+                        )
+                        continue
+                    await broadcast.send_to(websocket, {
+                        "type": "ack",
+                        "client_msg_id": frame.client_msg_id,
+                        "msg_id": saved.get("msg_id"),
+                        "seq": saved.get("seq"),
+                        "duplicate": bool(saved.get("duplicate")),
+                    })
+                    if saved.get("duplicate"):
+                        continue
+
+                #Готовим полезную нагрузку для рассылки
+                outgoing = {
+                    "chat_id": chat_id,
+                    "sender_id": current_user.user_id,
+                    "content": frame.content,
+                    "msg_id": saved.get("msg_id") if saved else None,
+                    "seq": saved.get("seq") if saved else None,
+                    "client_msg_id": frame.client_msg_id,
+                    "attachments": frame.attachments,
                 }
-            )
 
-            #Рассылаем всем участникам комнаты
-            for ws in list(room_sockets):
-                try:
-                    await ws.send_text(outgoing)
-                except Exception as e:
-                    logging.error("Ошибка при отправке сообщения: %s", e)
-
-            #Сохраняем сообщение
-            await MongoDB.add_message_mongo(
-                mongo_db,
-                chat_id=data.get("chat_id"),
-                sender_id=data.get("sender_id"),
-                content=data.get("content"),
-            )
+                #Рассылаем только подключённым участникам комнаты (а не всему составу чата)
+                await broadcast.broadcast(room_sockets, outgoing)
 
     except WebSocketDisconnect:
         logging.info("Пользователь отключился")
     finally:
+        user_buckets.release(current_user.user_id)
+        drain.untrack(websocket)
+        throttle.cancel()
+        broadcast.unregister(websocket)
         #Акуратно вычищаем комнату от текущего сокета
+        #Удаляем на месте: остальные соединения комнаты держат ссылку на этот же список
         if chat_id in connected_clients:
-            room_sockets = connected_clients[chat_id]["websocket_list"]
-            connected_clients[chat_id]["websocket_list"] = [ws for ws in room_sockets if ws is not websocket]
-            if not connected_clients[chat_id]["websocket_list"]:
+            room = connected_clients[chat_id]
+            room_sockets = room["websocket_list"]
+            if websocket in room_sockets:
+                room_sockets.remove(websocket)
+            if not room_sockets:
                 connected_clients.pop(chat_id)
+            else:
+                #Закрылось последнее соединение пользователя — он офлайн
+                online = room["online"]
+                online[current_user.user_id] = online.get(current_user.user_id, 1) - 1
+                if online[current_user.user_id] <= 0:
+                    online.pop(current_user.user_id, None)
+                    await ephemeral.publish(room_sockets, None, {
+                        "type": "presence", "status": "offline", "chat_id": chat_id, "user_id": current_user.user_id,
+                    })
 
 
 
@@ -349,7 +827,7 @@ async def get_message_limit(
     limit: int,
     chat_id: str,
     current_user=Depends(auth.whoami),
-    client=Depends(get_mongo_db),
+    storage=Depends(get_storage),
 ):
     """Возвращает сообщения чата с пагинацией.
 
@@ -358,18 +836,326 @@ async def get_message_limit(
         limit (int): Максимальное количество сообщений в ответе.
         chat_id (str): Идентификатор чата.
         current_user: Текущий авторизованный пользователь (через Depends).
-        client: Экземпляр базы MongoDB (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
 
     Returns:
         list[dict]: Список сообщений (как словари), упорядоченных по убыванию `timestamp`.
 
     Raises:
         HTTPException: 401 — если пользователь не аутентифицирован.
+        HTTPException: 403 — если пользователь не состоит в чате.
     """
     if current_user.user_id is None:
         logging.error("Пользователь не аутентифицирован")
         raise HTTPException(status_code=401, detail="Not authenticated")
-    messages = await MongoDB.get_messages(client, chat_id, limit, offset)
+    await require_member(storage, chat_id, current_user.user_id)
+    messages = await storage.get_messages(chat_id, limit, offset)
     return messages
 
+
+@app.get(c.PATH_PREFIX + "/wss/chat_messages/{chat_id}/sync")
+async def sync_messages(
+    chat_id: str,
+    after_seq: int = 0,
+    limit: int = c.SYNC_MAX_MESSAGES,
+    current_user=Depends(auth.whoami),
+    storage=Depends(get_storage),
+):
+    """Возвращает сообщения чата, пришедшие после `after_seq` (дельта-синхронизация).
+
+    Args:
+        chat_id (str): Идентификатор чата.
+        after_seq (int): Последний `seq`, который уже есть у клиента.
+        limit (int): Максимум сообщений в ответе (не больше `SYNC_MAX_MESSAGES`).
+        current_user: Текущий авторизованный пользователь (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
+
+    Returns:
+        dict: `messages` по возрастанию `seq`, `last_seq`, `has_more`, `truncated`.
+
+    Raises:
+        HTTPException: 401 — если пользователь не аутентифицирован.
+        HTTPException: 403 — если пользователь не состоит в чате.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    await require_member(storage, chat_id, current_user.user_id)
+    limit = max(1, min(limit, c.SYNC_MAX_MESSAGES))
+    return await storage.get_messages_after(chat_id, after_seq, limit)
+
+
+@app.get(c.PATH_PREFIX + "/wss/search", response_model=MsgModel.SearchResults)
+async def search_chat_messages(
+    q: str,
+    chat_id: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    current_user=Depends(auth.whoami),
+    client=Depends(get_mongo_db),
+    storage=Depends(get_storage),
+):
+    """Полнотекстовый поиск по сообщениям чатов пользователя.
+
+    Ищет только в чатах, где пользователь состоит (или в одном из них, если
+    передан `chat_id`). Результаты отсортированы по релевантности и содержат
+    фрагмент текста с позициями совпадений — см. `db/search.py`.
+
+    Args:
+        q (str): Поисковый запрос (фразы в кавычках, `-слово` для исключения).
+        chat_id (Optional[str]): Искать только в этом чате.
+        limit (int): Максимум результатов (не больше `SEARCH_PAGE_LIMIT`).
+        offset (int): Смещение для пагинации (не больше `SEARCH_MAX_OFFSET`).
+        current_user: Текущий авторизованный пользователь (через Depends).
+        client: Экземпляр базы MongoDB (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
+
+    Returns:
+        MsgModel.SearchResults: Найденные сообщения и признак следующей страницы.
+
+    Raises:
+        HTTPException: 401 — если пользователь не аутентифицирован.
+        HTTPException: 501 — хранилище не MongoDB (`STORAGE_BACKEND=memory`).
+        HTTPException: 400 — пустой запрос или слишком глубокая пагинация.
+        HTTPException: 403 — пользователь не состоит в `chat_id`.
+        HTTPException: 504 — запрос не уложился в `SEARCH_MAX_TIME_MS`.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    require_mongo_backend(storage)
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Пустой запрос")
+    if offset < 0 or offset > c.SEARCH_MAX_OFFSET:
+        raise HTTPException(status_code=400, detail=f"offset должен быть от 0 до {c.SEARCH_MAX_OFFSET}")
+    limit = max(1, min(limit, c.SEARCH_PAGE_LIMIT))
+
+    chat_ids = await storage.user_chat_ids(current_user.user_id)
+    if chat_id is not None:
+        if chat_id not in chat_ids:
+            raise HTTPException(status_code=403, detail="Нет доступа к чату")
+        chat_ids = [chat_id]
+
+    try:
+        return await search_messages(client, chat_ids, q, limit, offset)
+    except ExecutionTimeout:
+        logging.warning("Поиск превысил %d мс: %r", c.SEARCH_MAX_TIME_MS, q)
+        raise HTTPException(status_code=504, detail="Поиск занял слишком много времени, уточните запрос")
+
+
+@app.get(c.PATH_PREFIX + "/wss/chats/{chat_id}/stats", response_model=MsgModel.ChatStats)
+async def get_chat_stats(
+    chat_id: str,
+    days: int = 30,
+    top: int = 10,
+    current_user=Depends(auth.whoami),
+    client=Depends(get_mongo_db),
+    storage=Depends(get_storage),
+):
+    """Статистика чата из предрасчитанных счётчиков (`db/stats.py`).
+
+    Args:
+        chat_id: Идентификатор чата.
+        days: За сколько последних дней вернуть сообщения по дням (не больше `STATS_MAX_DAYS`).
+        top: Сколько самых активных отправителей вернуть (не больше `STATS_TOP_LIMIT`).
+        current_user: Текущий авторизованный пользователь (через Depends).
+        client: Экземпляр базы MongoDB (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
+
+    Returns:
+        MsgModel.ChatStats: Итог, сообщения по дням и самые активные отправители.
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 501 — хранилище не MongoDB (`STORAGE_BACKEND=memory`).
+        HTTPException: 403 — пользователь не состоит в чате.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    require_mongo_backend(storage)
+    await require_member(storage, chat_id, current_user.user_id)
+    days = max(1, min(days, c.STATS_MAX_DAYS))
+    top = max(0, min(top, c.STATS_TOP_LIMIT))
+    return await ChatStats.get_chat_stats(client, chat_id, days, top)
+
+
+@app.get(c.PATH_PREFIX + "/wss/stats/active_chats", response_model=List[MsgModel.ActiveChat])
+async def get_active_chats(
+    limit: int = 10,
+    current_user=Depends(auth.whoami),
+    client=Depends(get_mongo_db),
+    storage=Depends(get_storage),
+):
+    """Самые активные чаты пользователя по числу сообщений.
+
+    Args:
+        limit: Сколько чатов вернуть (не больше `STATS_TOP_LIMIT`).
+        current_user: Текущий авторизованный пользователь (через Depends).
+        client: Экземпляр базы MongoDB (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
+
+    Returns:
+        List[MsgModel.ActiveChat]: Чаты по убыванию числа сообщений.
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 501 — хранилище не MongoDB (`STORAGE_BACKEND=memory`).
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    require_mongo_backend(storage)
+    limit = max(1, min(limit, c.STATS_TOP_LIMIT))
+    chat_ids = await storage.user_chat_ids(current_user.user_id)
+    return await ChatStats.most_active_chats(client, chat_ids, limit)
+
+
+@app.post(c.PATH_PREFIX + "/wss/chats/{chat_id}/attachments", response_model=MsgModel.Attachment)
+async def upload_attachment(
+    request: Request,
+    chat_id: str,
+    filename: str,
+    current_user=Depends(auth.whoami),
+    client=Depends(get_mongo_db),
+    storage=Depends(get_storage),
+):
+    """Потоковая загрузка вложения в чат.
+
+    Тело запроса — содержимое файла как есть (не multipart), тип берётся из
+    заголовка `Content-Type`. Тело читается и сохраняется кусками, поэтому
+    память не зависит от размера файла. Полученный `attachment_id` клиент
+    указывает в поле `attachments` сообщения.
+
+    Args:
+        request: HTTP-запрос с содержимым файла в теле.
+        chat_id: Идентификатор чата.
+        filename: Имя файла.
+        current_user: Текущий авторизованный пользователь (через Depends).
+        client: Экземпляр базы MongoDB (через Depends).
+        storage: Хранилище чатов и сообщений (через Depends).
+
+    Returns:
+        MsgModel.Attachment: Метаданные сохранённого вложения.
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 501 — хранилище не MongoDB (`STORAGE_BACKEND=memory`).
+        HTTPException: 403 — пользователь не состоит в чате.
+        HTTPException: 413 — файл больше `ATTACHMENT_MAX_BYTES`.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    require_mongo_backend(storage)
+    await require_member(storage, chat_id, current_user.user_id)
+
+    declared = request.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > c.ATTACHMENT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Файл слишком большой")
+
+    try:
+        return await Attachments.save_attachment(
+            client,
+            request.stream(),
+            chat_id=chat_id,
+            uploader_id=current_user.user_id,
+            filename=filename,
+            content_type=request.headers.get("Content-Type", "application/octet-stream"),
+        )
+    except Attachments.AttachmentTooLarge:
+        raise HTTPException(status_code=413, detail="Файл слишком большой")
+
+
+@app.get(c.PATH_PREFIX + "/wss/attachments/{attachment_id}")
+async def download_attachment(
+    request: Request,
+    attachment_id: str,
+    current_user=Depends(auth.whoami),
+    client=Depends(get_mongo_db),
+    storage=Depends(get_storage),
+):
+    """Потоковая выдача вложения с поддержкой `Range` (один диапазон байт).
+
+    Встроенно показываются только безопасные картинки, звук и видео
+    (`Attachments.served_type`), остальное — на скачивание как
+    `application/octet-stream`; ответы всегда с `X-Content-Type-Options: nosniff`.
+
+    Raises:
+        HTTPException: 401 — пользователь не аутентифицирован.
+        HTTPException: 501 — хранилище не MongoDB (`STORAGE_BACKEND=memory`).
+        HTTPException: 404 — вложение не найдено.
+        HTTPException: 403 — пользователь не состоит в чате вложения.
+        HTTPException: 416 — некорректный диапазон.
+    """
+    if current_user.user_id is None:
+        logging.error("Пользователь не аутентифицирован")
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    require_mongo_backend(storage)
+    meta = await Attachments.get_attachment(client, attachment_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Вложение не найдено")
+    await require_member(storage, meta["chat_id"], current_user.user_id)
+
+    length = meta["length"]
+    media_type, disposition = Attachments.served_type(meta["content_type"])
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{meta["sha256"]}"',
+        "Content-Disposition": f"{disposition}; filename*=UTF-8''{quote(meta['filename'])}",
+        "X-Content-Type-Options": "nosniff",
+    }
+    try:
+        byte_range = Attachments.parse_range(request.headers.get("Range"), length)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Некорректный диапазон", headers={
+            "Content-Range": f"bytes */{length}", "X-Content-Type-Options": "nosniff",
+        })
+
+    if byte_range is None or length == 0:
+        start, end, status_code = 0, length - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(max(end - start + 1, 0))
+
+    body = Attachments.iter_content(client, meta, start, end) if length else iter(())
+    return StreamingResponse(body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+@app.get("/health")
+async def health_endpoint():
+    """Liveness: процесс жив и обрабатывает запросы."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready_endpoint(request: Request):
+    """Readiness: 200, когда пулы MongoDB и HTTP прогреты, иначе 503 (и во время дренажа)."""
+    if getattr(request.app.state, "ready", False) and not drain.is_draining():
+        return {"status": "ready"}
+    return JSONResponse(status_code=503, content={"status": "warming_up"})
+
+
+@app.post("/drain")
+async def drain_endpoint(request: Request):
+    """Дренаж перед остановкой (preStop-хук): закрывает websocket-соединения с токенами возобновления.
+
+    Если задан `DRAIN_TOKEN`, его нужно передать в заголовке `X-Drain-Token`,
+    иначе вызов разрешён только с localhost.
+    """
+    if c.DRAIN_TOKEN:
+        if not hmac.compare_digest(request.headers.get("X-Drain-Token", ""), c.DRAIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Forbidden")
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    closed = await drain.drain()
+    return {"status": "drained", "connections": closed}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Метрики сервиса в формате Prometheus (состояние breaker'ов, задержки апстримов и др.)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 #endregion
\ No newline at end of file
@@ -0,0 +1,90 @@
+from typing import Annotated, List, Literal, Optional, Union
+
+from pydantic import BaseModel, Field, TypeAdapter
+
+import src.concts as c
+
+
+class MessageFrame(BaseModel):
+    """Сообщение чата — сохраняется в MongoDB и рассылается участникам.
+
+    Фрейм без поля `type` считается сообщением (совместимость со старыми клиентами).
+
+    Attributes:
+        type (str): Всегда "message".
+        chat_id (Optional[str]): Идентификатор чата; если задан, должен совпадать
+            с чатом соединения.
+        sender_id (Optional[int]): Идентификатор отправителя; если задан, должен
+            совпадать с пользователем соединения. Сохраняются и рассылаются
+            значения соединения, а не фрейма.
+        content (Optional[str]): Текст сообщения.
+        client_msg_id (Optional[str]): Ключ идемпотентности: повторная отправка
+            с тем же ключом не создаёт дубль, а получает повторный `ack`.
+        attachments (List[str]): Идентификаторы вложений, загруженных в этот чат.
+    """
+
+    type: Literal["message"] = "message"
+    chat_id: Optional[str] = None
+    sender_id: Optional[int] = None
+    content: Optional[str] = None
+    client_msg_id: Optional[str] = Field(default=None, min_length=1, max_length=64)
+    attachments: List[str] = Field(default_factory=list, max_length=c.ATTACHMENT_MAX_PER_MESSAGE)
+
+
+class TypingFrame(BaseModel):
+    """Индикатор набора текста (эфемерное событие, в базу не пишется).
+
+    Attributes:
+        type (str): Всегда "typing".
+        state (bool): True — пользователь печатает, False — перестал.
+    """
+
+    type: Literal["typing"]
+    state: bool = True
+
+
+class PresenceFrame(BaseModel):
+    """Статус присутствия пользователя в чате (эфемерное событие).
+
+    Attributes:
+        type (str): Всегда "presence".
+        status (str): online, away или offline.
+    """
+
+    type: Literal["presence"]
+    status: Literal["online", "away", "offline"]
+
+
+class ReadFrame(BaseModel):
+    """Сдвиг курсора прочтения (эфемерное событие).
+
+    Attributes:
+        type (str): Всегда "read".
+        seq (int): Последний прочитанный `seq`.
+    """
+
+    type: Literal["read"]
+    seq: int = Field(ge=0)
+
+
+ClientFrame = Union[MessageFrame, TypingFrame, PresenceFrame, ReadFrame]
+EPHEMERAL_TYPES = ("typing", "presence", "read")
+
+_frame_adapter = TypeAdapter(Annotated[ClientFrame, Field(discriminator="type")])
+
+
+def parse_frame(data: dict, strict: bool = False) -> ClientFrame:
+    """Разбирает входящий фрейм по полю `type`.
+
+    Args:
+        data (dict): Декодированный фрейм.
+        strict (bool): Строгая проверка типов без приведения (для MessagePack).
+
+    Raises:
+        ValueError: Неизвестный тип фрейма или некорректные поля
+            (`pydantic.ValidationError` — наследник `ValueError`).
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Фрейм должен быть JSON-объектом")
+    data.setdefault("type", "message")
+    return _frame_adapter.validate_python(data, strict=strict)
@@ -9,11 +9,13 @@ class Members(BaseModel):
         user_id (int): Уникальный идентификатор пользователя.
         user_name (str): Имя пользователя (отображаемое).
         avatar (Optional[str]): Ссылка на аватар пользователя.
+        role (Optional[str]): Роль в групповом чате: owner, admin или member.
     """
 
     user_id: int
     user_name: str
     avatar: Optional[str] = None
+    role: Optional[str] = None
 
 
 class Messages(BaseModel):
@@ -26,6 +28,8 @@ class Messages(BaseModel):
         sender_id (int): Идентификатор отправителя.
         timestamp (datetime): Время отправки сообщения (UTC).
         readers (List[Members]): Список участников, которые прочитали сообщение.
+        seq (Optional[int]): Порядковый номер сообщения в чате (нет у старых сообщений).
+        attachments (Optional[List[str]]): Идентификаторы вложений сообщения.
     """
 
     msg_id: str
@@ -34,6 +38,8 @@ class Messages(BaseModel):
     sender_id: int
     timestamp: datetime
     readers: List[Members]
+    seq: Optional[int] = None
+    attachments: Optional[List[str]] = None
 
 
 class Chats(BaseModel):
@@ -43,10 +49,149 @@ class Chats(BaseModel):
         chat_id (str): Уникальный идентификатор чата.
         chat_type (str): Тип чата (по умолчанию 'simple').
         chat_name (Optional[str]): Название чата (для групповых).
-        members (List[Members]): Список участников чата.
+        members (List[Members]): Список участников чата (у групповых чатов пуст —
+            участники листаются отдельным запросом).
+        member_count (Optional[int]): Количество участников группового чата.
     """
 
     chat_id: str
     chat_type: str = "simple"
     chat_name: Optional[str] = None
     members: List[Members]
+    member_count: Optional[int] = None
+
+
+class BatchChatResult(BaseModel):
+    """Результат пакетного создания чата для одного пользователя.
+
+    Attributes:
+        username (str): Имя пользователя из запроса.
+        status (str): `ok`, `not_found`, `blocked` или `error`.
+        chat (Optional[Chats]): Созданный или найденный чат (только для `ok`).
+    """
+
+    username: str
+    status: str
+    chat: Optional[Chats] = None
+
+
+class SearchHit(BaseModel):
+    """Найденное сообщение.
+
+    Attributes:
+        message (Messages): Сообщение целиком.
+        snippet (str): Фрагмент текста вокруг первого совпадения.
+        highlights (List[List[int]]): Позиции `[start, end)` совпадений во фрагменте.
+        score (Optional[float]): Релевантность по текстовому индексу.
+    """
+
+    message: Messages
+    snippet: str
+    highlights: List[List[int]]
+    score: Optional[float] = None
+
+
+class SearchResults(BaseModel):
+    """Страница результатов поиска.
+
+    Attributes:
+        results (List[SearchHit]): Найденные сообщения по убыванию релевантности.
+        has_more (bool): Есть ли следующая страница.
+    """
+
+    results: List[SearchHit]
+    has_more: bool
+
+
+class MemberPage(BaseModel):
+    """Страница участников чата.
+
+    Attributes:
+        members (List[Members]): Участники по возрастанию `user_id`.
+        next_after (Optional[int]): Курсор следующей страницы (`after_user_id`), None — страниц больше нет.
+    """
+
+    members: List[Members]
+    next_after: Optional[int] = None
+
+
+class Attachment(BaseModel):
+    """Метаданные вложения.
+
+    Attributes:
+        attachment_id (str): Идентификатор вложения (указывается в `Messages.attachments`).
+        chat_id (str): Чат, в который загружено вложение.
+        filename (str): Имя файла.
+        content_type (str): MIME-тип.
+        length (int): Размер в байтах.
+        sha256 (str): Контрольная сумма содержимого.
+        created_at (datetime): Время загрузки.
+    """
+
+    attachment_id: str
+    chat_id: str
+    filename: str
+    content_type: str
+    length: int
+    sha256: str
+    created_at: datetime
+
+
+class DayCount(BaseModel):
+    """Сообщения чата за день.
+
+    Attributes:
+        day (str): Дата `YYYY-MM-DD`.
+        messages (int): Количество сообщений.
+    """
+
+    day: str
+    messages: int
+
+
+class SenderCount(BaseModel):
+    """Сообщения одного отправителя в чате.
+
+    Attributes:
+        sender_id (int): Идентификатор отправителя.
+        messages (int): Количество сообщений.
+        last_message_at (Optional[datetime]): Время последнего сообщения.
+    """
+
+    sender_id: int
+    messages: int
+    last_message_at: Optional[datetime] = None
+
+
+class ChatStats(BaseModel):
+    """Счётчики сообщений чата (`db/stats.py`).
+
+    Attributes:
+        chat_id (str): Идентификатор чата.
+        messages (int): Всего сообщений.
+        last_message_at (Optional[datetime]): Время последнего сообщения.
+        last_seq (Optional[int]): Последний `seq`.
+        days (List[DayCount]): Сообщения по дням (по возрастанию даты).
+        top_senders (List[SenderCount]): Самые активные отправители.
+    """
+
+    chat_id: str
+    messages: int
+    last_message_at: Optional[datetime] = None
+    last_seq: Optional[int] = None
+    days: List[DayCount]
+    top_senders: List[SenderCount]
+
+
+class ActiveChat(BaseModel):
+    """Чат в списке самых активных.
+
+    Attributes:
+        chat_id (str): Идентификатор чата.
+        messages (int): Всего сообщений.
+        last_message_at (Optional[datetime]): Время последнего сообщения.
+    """
+
+    chat_id: str
+    messages: int
+    last_message_at: Optional[datetime] = None
@@ -1,7 +1,53 @@
+import logging
+
 import httpx
 from schemas.user import WhoAmI
 from fastapi import Request, WebSocket
 from src import concts as c
+from src.resume import verify_token
+from src.circuit_breaker import StaleCache, UpstreamError, auth_breaker, degraded_responses
+from src.upstream import cookie_header, get_client
+
+#Последние успешно определённые пользователи по токену — для деградированного режима
+_identity_cache = StaleCache(max_age=c.AUTH_STALE_TTL)
+
+
+async def _request_me(cookies) -> httpx.Response:
+    response = await get_client().get(
+        f"{c.BACKEND_URL}{c.AUTH_PREFIX}/auth/me",
+        headers={**c.HEADERS, **cookie_header(cookies)},
+    )
+    if response.status_code >= 500:
+        raise UpstreamError(f"auth-service: {response.status_code}")
+    return response
+
+
+async def _resolve_user(cookies) -> WhoAmI:
+    """Запрашивает `/auth/me` через breaker auth-service.
+
+    При недоступности сервиса (breaker разомкнут, бюджет исчерпан, таймаут,
+    5xx) в режиме `AUTH_DEGRADED_MODE=cache` отдаёт последнего успешно
+    определённого пользователя для того же токена.
+    """
+    token = cookies.get(c.COOKIE_NAME)
+    try:
+        response = await auth_breaker.call(_request_me, cookies, timeout=c.AUTH_SERVICE_TIMEOUT)
+        response.raise_for_status()
+        user = WhoAmI(**response.json())
+        if token:
+            _identity_cache.put(token, user)
+        return user
+    except httpx.HTTPStatusError as e:
+        logging.warning("Ошибка авторизации /me: %s %s", e.response.status_code, e.response.text)
+        return WhoAmI()
+    except Exception as e:
+        logging.error("Ошибка запроса /me: %r", e)
+        if c.AUTH_DEGRADED_MODE == "cache" and token:
+            cached = _identity_cache.get(token)
+            if cached is not None:
+                degraded_responses.inc(upstream=auth_breaker.name)
+                return cached
+        return WhoAmI()
 
 
 async def whoami(request: Request) -> WhoAmI:
@@ -10,34 +56,16 @@ async def whoami(request: Request) -> WhoAmI:
     Выполняет запрос к бекенду (`/auth/me`), используя куки запроса,
     и возвращает информацию о пользователе. Если запрос завершается
     с ошибкой (например, пользователь не авторизован), возвращается
-    пустая модель `WhoAmI`.
+    пустая модель `WhoAmI`. Если auth-service недоступен, может быть
+    возвращён закэшированный пользователь (см. `AUTH_DEGRADED_MODE`).
 
     Args:
         request (Request): Объект FastAPI запроса, содержащий cookies.
 
     Returns:
         WhoAmI: Модель с данными пользователя (или пустая при ошибке).
-
-    Raises:
-        httpx.HTTPStatusError: Если бекенд возвращает ошибку авторизации.
-        Exception: При других сетевых ошибках.
     """
-    cookies = request.cookies
-
-    async with httpx.AsyncClient(cookies=cookies) as client:
-        try:
-            response = await client.get(
-                f"{c.BACKEND_URL}{c.AUTH_PREFIX}/auth/me",
-                headers=c.HEADERS,
-            )
-            response.raise_for_status()
-            return WhoAmI(**response.json())
-        except httpx.HTTPStatusError as e:
-            print("Ошибка авторизации /me:", e.response.status_code, e.response.text)
-            return WhoAmI()
-        except Exception as e:
-            print("Ошибка запроса /me:", str(e))
-            return WhoAmI()
+    return await _resolve_user(request.cookies)
 
 
 async def whoami_socket(request: WebSocket) -> WhoAmI:
@@ -45,31 +73,23 @@ async def whoami_socket(request: WebSocket) -> WhoAmI:
 
     Выполняет запрос к бекенду (`/auth/me`), используя cookies,
     прикреплённые к WebSocket соединению, и возвращает информацию
-    о пользователе. При ошибках возвращается пустая модель `WhoAmI`.
+    о пользователе. При ошибках возвращается пустая модель `WhoAmI`,
+    при недоступности auth-service — возможно, закэшированный пользователь.
+
+    Если передан действительный токен возобновления (`?resume=`, см.
+    `src/resume.py`), пользователь берётся из токена без запроса к бекенду,
+    а `request.state.resumed` выставляется в True.
 
     Args:
         request (WebSocket): Объект WebSocket соединения, содержащий cookies.
 
     Returns:
         WhoAmI: Модель с данными пользователя (или пустая при ошибке).
-
-    Raises:
-        httpx.HTTPStatusError: Если бекенд возвращает ошибку авторизации.
-        Exception: При других сетевых ошибках.
     """
-    cookies = request.cookies
-
-    async with httpx.AsyncClient(cookies=cookies) as client:
-        try:
-            response = await client.get(
-                f"{c.BACKEND_URL}{c.AUTH_PREFIX}/auth/me",
-                headers=c.HEADERS,
-            )
-            response.raise_for_status()
-            return WhoAmI(**response.json())
-        except httpx.HTTPStatusError as e:
-            print("Ошибка авторизации /me:", e.response.status_code, e.response.text)
-            return WhoAmI()
-        except Exception as e:
-            print("Ошибка запроса /me:", str(e))
-            return WhoAmI()
+    token = request.query_params.get("resume")
+    if token:
+        user = verify_token(token, request.query_params.get("chat_id"))
+        if user is not None:
+            request.state.resumed = True
+            return user
+    return await _resolve_user(request.cookies)
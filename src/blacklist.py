@@ -1,7 +1,19 @@
 import logging
-import requests
+
+import httpx
 import src.concts as c
 from fastapi import Request
+from src.circuit_breaker import StaleCache, UpstreamError, degraded_responses, user_breaker
+from src.upstream import cookie_header, get_client
+
+#Последние успешные ответы blacklist по (токен, имя) — для деградированного режима
+_blacklist_cache = StaleCache(max_age=c.BLACKLIST_STALE_TTL)
+
+_NOT_BLOCKED = {"blocked_by_user": False, "you_blocked_user": False}
+_BLOCKED = {"blocked_by_user": True, "you_blocked_user": False}
+#Результат неизвестен (сервис недоступен, в кэше нет ответа): флаги не означают
+#ни блокировки, ни её отсутствия — вызывающий проверяет `is_unknown` первым
+_UNKNOWN = {"blocked_by_user": False, "you_blocked_user": False, "unknown": True}
 
 
 async def check_user_blocked_by_username(request: Request, blocked_username: str) -> dict:
@@ -9,31 +21,63 @@ async def check_user_blocked_by_username(request: Request, blocked_username: str
 
     Выполняет запрос к user-service (`/blacklist/check`) для проверки,
     находится ли указанный пользователь в чёрном списке. В качестве
-    авторизации используются cookies из текущего запроса.
+    авторизации используются cookies из текущего запроса. Запрос идёт
+    через breaker user-service; при его недоступности результат
+    определяется `BLACKLIST_DEGRADED_MODE`.
 
     Args:
         request (Request): Объект FastAPI запроса, содержащий cookies пользователя.
         blocked_username (str): Имя пользователя, для которого выполняется проверка.
 
     Returns:
-        dict | bool: Словарь с результатом проверки (если статус 200),
-        либо False в случае ошибки запроса или недоступности сервиса.
-
-    Raises:
-        Exception: В случае сетевой ошибки или таймаута при обращении к сервису.
+        dict | bool: Словарь с результатом проверки: ответ user-service (статус
+        200) или ответ деградированного режима; в режиме `cache` без ответа в
+        кэше — `{"unknown": True, ...}`. False — user-service ответил не 200.
+        Неизвестный результат (`is_unknown`) нужно отклонять как сбой (503 / 1011),
+        а не как блокировку.
     """
+    key = (request.cookies.get(c.COOKIE_NAME), blocked_username)
     try:
-        response = requests.get(
-            c.BACKEND_URL + c.USER_PREFIX + "/blacklist/check",
-            params={"username": blocked_username},
-            timeout=2,
-            cookies=request.cookies
+        response = await user_breaker.call(
+            _request_check, request.cookies, blocked_username, timeout=c.BLACKLIST_TIMEOUT
         )
+
         if response.status_code == 200:
-            return response.json()
+            result = response.json()
+            _blacklist_cache.put(key, result)
+            return result
         else:
             logging.warning(f"Blacklist check failed: {response.status_code}")
             return False
     except Exception as e:
-        logging.error(f"Ошибка запроса к user-service (check blacklist): {e}")
-        return False
+        logging.error(f"Ошибка запроса к user-service (check blacklist): {e!r}")
+        return _degraded(key)
+
+
+def is_unknown(result) -> bool:
+    """Результат проверки блокировок не получен (False или `"unknown": True`)."""
+    return not isinstance(result, dict) or bool(result.get("unknown"))
+
+
+def _degraded(key) -> dict:
+    """Ответ blacklist при недоступности user-service."""
+    mode = c.BLACKLIST_DEGRADED_MODE
+    if mode == "cache":
+        cached = _blacklist_cache.get(key)
+        if cached is not None:
+            degraded_responses.inc(upstream=user_breaker.name)
+            return cached
+        return dict(_UNKNOWN)
+    degraded_responses.inc(upstream=user_breaker.name)
+    return dict(_BLOCKED) if mode == "deny" else dict(_NOT_BLOCKED)
+
+
+async def _request_check(cookies, blocked_username: str) -> httpx.Response:
+    response = await get_client().get(
+        c.BACKEND_URL + c.USER_PREFIX + "/blacklist/check",
+        params={"username": blocked_username},
+        headers=cookie_header(cookies),
+    )
+    if response.status_code >= 500:
+        raise UpstreamError(f"user-service: {response.status_code}")
+    return response
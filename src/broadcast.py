@@ -0,0 +1,162 @@
+"""Рассылка сообщений комнаты с опциональной склейкой исходящих фреймов.
+
+Каждому соединению соответствует `Outbox`. В обычном режиме сообщение сразу
+уходит отдельным фреймом. Если склейка включена (`WS_COALESCE_MS > 0`) и
+клиент подключился с `?batch=1`, сообщения, пришедшие в течение окна,
+отправляются одним фреймом:
+
+    {"type": "batch", "messages": [<msg>, <msg>, ...]}
+
+Одиночное сообщение в окне уходит как есть. Вместе с permessage-deflate
+(включается в uvicorn, см. `WS_PER_MESSAGE_DEFLATE`) склейка уменьшает число
+фреймов, системных вызовов и трафик во время всплесков.
+
+Соединение может использовать JSON или MessagePack (`src/codec.py`);
+сообщение кодируется один раз на формат, а не на получателя.
+"""
+
+import json
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, Optional, Union
+
+from fastapi.websockets import WebSocket
+
+import src.concts as c
+from src.codec import JSON, Frame
+from src.metrics import Counter, Gauge
+
+outbound_messages = Counter("ws_outbound_messages_total", "Исходящие сообщения", ["mode"])
+outbound_frames = Counter("ws_outbound_frames_total", "Исходящие websocket-фреймы", ["mode"])
+outbound_bytes = Counter("ws_outbound_bytes_total", "Исходящие байты (до сжатия)", ["mode"])
+ws_connections = Gauge("ws_connections", "Открытые websocket-соединения", ["mode"])
+
+
+class Outbox:
+    """Исходящая очередь одного соединения.
+
+    Attributes:
+        websocket (WebSocket): Соединение получателя.
+        window (float): Окно склейки в секундах (0 — без склейки).
+        max_batch (int): Максимум сообщений в одном фрейме.
+        codec: Кодек соединения (`src/codec.py`), по умолчанию JSON.
+    """
+
+    def __init__(self, websocket: WebSocket, window: float, max_batch: int, codec=JSON):
+        self.websocket = websocket
+        self.window = window
+        self.max_batch = max_batch
+        self.codec = codec
+        self.mode = "batched" if window > 0 else "direct"
+        self._pending: list = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def send(self, payload: Frame) -> None:
+        """Отправляет закодированное кодеком соединения сообщение сразу или ставит его в окно склейки."""
+        if self.window <= 0:
+            await self._send_frame(payload, 1)
+            return
+
+        self._pending.append(payload)
+        if len(self._pending) >= self.max_batch:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error("Ошибка при отправке пакета сообщений: %s", e)
+
+    async def flush(self) -> None:
+        """Отправляет накопленные сообщения одним фреймом."""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        frame = batch[0] if len(batch) == 1 else self.codec.batch(batch)
+        await self._send_frame(frame, len(batch))
+
+    async def _send_frame(self, frame: Frame, messages: int) -> None:
+        await self.codec.send_frame(self.websocket, frame)
+        outbound_frames.inc(mode=self.mode)
+        outbound_messages.inc(messages, mode=self.mode)
+        outbound_bytes.inc(len(frame.encode() if isinstance(frame, str) else frame), mode=self.mode)
+
+    def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending.clear()
+
+
+_outboxes: Dict[WebSocket, Outbox] = {}
+
+
+def register(websocket: WebSocket, coalesce: bool = False, codec=JSON) -> Outbox:
+    """Создаёт исходящую очередь соединения.
+
+    Args:
+        websocket (WebSocket): Соединение.
+        coalesce (bool): Клиент поддерживает пакетные фреймы (`?batch=1`).
+        codec: Кодек, согласованный при рукопожатии.
+    """
+    window = c.WS_COALESCE_MS / 1000 if coalesce else 0
+    outbox = Outbox(websocket, window, c.WS_COALESCE_MAX_BATCH, codec)
+    _outboxes[websocket] = outbox
+    ws_connections.inc(mode=outbox.mode)
+    return outbox
+
+
+def unregister(websocket: WebSocket) -> None:
+    outbox = _outboxes.pop(websocket, None)
+    if outbox is not None:
+        outbox.close()
+        ws_connections.dec(mode=outbox.mode)
+
+
+async def flush(websocket: WebSocket) -> None:
+    """Немедленно отправляет накопленные сообщения соединения (например, перед закрытием)."""
+    outbox = _outboxes.get(websocket)
+    if outbox is not None:
+        await outbox.flush()
+
+
+async def send_to(websocket: WebSocket, obj: Any) -> None:
+    """Отправляет служебный фрейм (ack, ошибка, sync...) кодеком соединения, минуя склейку."""
+    outbox = _outboxes.get(websocket)
+    codec = outbox.codec if outbox is not None else JSON
+    await codec.send_frame(websocket, codec.encode(obj))
+
+
+async def broadcast(sockets: Iterable[WebSocket], message: Union[str, Dict[str, Any]]) -> None:
+    """Рассылает сообщение всем соединениям комнаты.
+
+    Args:
+        sockets (Iterable[WebSocket]): Соединения комнаты.
+        message (str | dict): Сообщение — объект или уже сериализованный JSON.
+    """
+    encoded: Dict[str, Frame] = {}
+    if isinstance(message, str):
+        encoded[JSON.name] = message
+
+    for ws in list(sockets):
+        outbox = _outboxes.get(ws)
+        codec = outbox.codec if outbox is not None else JSON
+        try:
+            #Кодируем один раз на формат, а не на получателя
+            frame = encoded.get(codec.name)
+            if frame is None:
+                obj = json.loads(message) if isinstance(message, str) else message
+                frame = encoded[codec.name] = codec.encode(obj)
+            if outbox is None:
+                await codec.send_frame(ws, frame)
+            else:
+                await outbox.send(frame)
+        except Exception as e:
+            logging.error("Ошибка при отправке сообщения: %s", e)
@@ -0,0 +1,263 @@
+"""Запись реального трафика для нагрузочного воспроизведения.
+
+Включается переменной `CAPTURE_FILE`: ASGI-middleware пишет в этот файл по
+одной JSON-строке на событие, со временем от начала записи `t` (секунды):
+
+    {"t", "kind": "http", "conn", "user", "method", "path", "query", "body"|"body_bytes", "status", "dur_ms"}
+    {"t", "kind": "ws_open", "conn", "user", "path", "query", "fmt"}
+    {"t", "kind": "ws_in", "conn", "frame"|"bytes"}
+    {"t", "kind": "ws_out", "conn", "type", "bytes"}
+    {"t", "kind": "ws_close", "conn", "code"}
+
+Данные обезличиваются до записи: идентификаторы, имена и ключи заменяются
+стабильными псевдонимами (HMAC с `CAPTURE_SALT`; без соли она случайна на
+процесс), поэтому связи «тот же чат / тот же пользователь» сохраняются, а
+исходные значения не восстановить. Тексты сообщений заменяются строкой той
+же длины, cookie и токены возобновления не пишутся, пользователь — псевдоним
+auth-cookie. Путь пишется по шаблону маршрута с псевдонимами параметров.
+
+Запись идёт через очередь в фоновом потоке, как и логирование. Файл
+воспроизводится `tools/replay_capture.py`.
+"""
+
+import os
+import hmac
+import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+from itertools import count
+from http.cookies import SimpleCookie
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+import msgpack
+
+import src.concts as c
+
+#Поля со структурой нагрузки — пишутся как есть
+KEEP_KEYS = {
+    "type", "status", "state", "seq", "after_seq", "before_seq", "limit", "offset",
+    "batch", "role", "chat_type", "duplicate", "code",
+}
+#Свободный текст — заменяется строкой той же длины
+TEXT_KEYS = {"content", "q", "detail"}
+#Не пишутся вовсе
+DROP_KEYS = {"resume", "resume_token"}
+
+_ids = count(1)
+
+
+class Anonymizer:
+    """Стабильные необратимые псевдонимы для значений захвата."""
+
+    def __init__(self, salt: bytes):
+        self.salt = salt
+
+    def _digest(self, value: Any) -> bytes:
+        return hmac.new(self.salt, str(value).encode(), hashlib.sha256).digest()
+
+    def pseudonym(self, value: Any) -> Any:
+        """Числа остаются числами (для полей вроде `sender_id`), строки — `p<hex>`."""
+        if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+            number = int.from_bytes(self._digest(int(value))[:4], "big") % 999_999_999 + 1
+            return number if isinstance(value, int) else str(number)
+        return "p" + self._digest(value).hex()[:16]
+
+    def value(self, obj: Any, key: Optional[str] = None) -> Any:
+        """Обезличивает значение рекурсивно с учётом имени поля."""
+        if key in KEEP_KEYS or obj is None or isinstance(obj, (bool, float)):
+            return obj
+        if key in TEXT_KEYS and isinstance(obj, str):
+            return "x" * len(obj)
+        if isinstance(obj, dict):
+            return {k: self.value(v, k) for k, v in obj.items() if k not in DROP_KEYS}
+        if isinstance(obj, list):
+            return [self.value(v, key) for v in obj]
+        if isinstance(obj, (int, str)):
+            return self.pseudonym(obj)
+        return None
+
+    def query(self, raw: bytes) -> str:
+        pairs = parse_qsl(raw.decode("latin-1"), keep_blank_values=True)
+        return urlencode([(k, self.value(v, k)) for k, v in pairs if k not in DROP_KEYS])
+
+    def path(self, scope: Dict[str, Any]) -> str:
+        """Путь по шаблону маршрута с псевдонимами параметров (если маршрут найден)."""
+        route = scope.get("route")
+        params = scope.get("path_params") or {}
+        template = getattr(route, "path_format", None)
+        if template is None:
+            return scope.get("path", "")
+        return template.format(**{k: self.pseudonym(v) for k, v in params.items()})
+
+    def user(self, headers: List) -> Optional[str]:
+        """Псевдоним пользователя по auth-cookie (None — без авторизации)."""
+        for name, value in headers:
+            if name == b"cookie":
+                morsel = SimpleCookie(value.decode("latin-1")).get(c.COOKIE_NAME)
+                if morsel is not None:
+                    return "u" + self._digest(morsel.value).hex()[:12]
+        return None
+
+
+class Recorder:
+    """Пишет события в JSONL-файл из фонового потока."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.started = time.monotonic()
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, kind: str, **fields) -> None:
+        self._queue.put({"t": round(time.monotonic() - self.started, 6), "kind": kind, **fields})
+
+    def _run(self) -> None:
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    break
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+
+recorder: Optional[Recorder] = None
+anonymizer = Anonymizer(c.CAPTURE_SALT.encode() if c.CAPTURE_SALT else os.urandom(16))
+
+
+def start(path: Optional[str] = None) -> Optional[Recorder]:
+    """Начинает запись в `path` (по умолчанию `CAPTURE_FILE`); без пути ничего не делает."""
+    global recorder
+    path = path or c.CAPTURE_FILE
+    if path and recorder is None:
+        recorder = Recorder(path)
+        logging.warning("Запись трафика включена: %s", path)
+    return recorder
+
+
+def stop() -> None:
+    global recorder
+    if recorder is not None:
+        recorder.close()
+        recorder = None
+
+
+def _decode_frame(message: Dict[str, Any]) -> Any:
+    if message.get("text") is not None:
+        return json.loads(message["text"])
+    return msgpack.unpackb(message["bytes"], raw=False)
+
+
+def _frame_size(message: Dict[str, Any]) -> int:
+    if message.get("text") is not None:
+        return len(message["text"].encode())
+    return len(message.get("bytes") or b"")
+
+
+class CaptureMiddleware:
+    """ASGI-middleware записи HTTP-запросов и websocket-фреймов.
+
+    Пока запись не начата (`start()`), запросы проходят без изменений.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        rec = recorder
+        if rec is None or scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        if scope["type"] == "http":
+            return await self._http(rec, scope, receive, send)
+        return await self._websocket(rec, scope, receive, send)
+
+    async def _http(self, rec: Recorder, scope, receive, send):
+        started = time.perf_counter()
+        body = bytearray()
+        body_bytes = 0
+        status = 500
+
+        async def receive_wrapper():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_bytes += len(chunk)
+                if len(body) < c.CAPTURE_MAX_BODY:
+                    body.extend(chunk)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            event = {
+                "conn": next(_ids),
+                "user": anonymizer.user(scope.get("headers", [])),
+                "method": scope["method"],
+                "path": anonymizer.path(scope),
+                "query": anonymizer.query(scope.get("query_string", b"")),
+                "status": status,
+                "dur_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+            if body_bytes:
+                try:
+                    event["body"] = anonymizer.value(json.loads(bytes(body)))
+                except ValueError:
+                    #Не JSON (например, вложение) — при воспроизведении отправятся случайные байты того же размера
+                    event["body_bytes"] = body_bytes
+            rec.record("http", **event)
+
+    async def _websocket(self, rec: Recorder, scope, receive, send):
+        conn = next(_ids)
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "websocket.receive":
+                try:
+                    rec.record("ws_in", conn=conn, frame=anonymizer.value(_decode_frame(message)))
+                except Exception:
+                    rec.record("ws_in", conn=conn, bytes=_frame_size(message))
+            elif message["type"] == "websocket.disconnect":
+                rec.record("ws_close", conn=conn, code=message.get("code", 1000))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "websocket.accept":
+                #Маршрут уже найден — путь пишется по шаблону
+                rec.record(
+                    "ws_open",
+                    conn=conn,
+                    user=anonymizer.user(scope.get("headers", [])),
+                    path=anonymizer.path(scope),
+                    query=anonymizer.query(scope.get("query_string", b"")),
+                    fmt="msgpack" if message.get("subprotocol") else "json",
+                )
+            elif message["type"] == "websocket.send" and c.CAPTURE_WS_OUT:
+                try:
+                    frame_type = _decode_frame(message).get("type", "message")
+                except Exception:
+                    frame_type = None
+                rec.record("ws_out", conn=conn, type=frame_type, bytes=_frame_size(message))
+            elif message["type"] == "websocket.close":
+                rec.record("ws_close", conn=conn, code=message.get("code", 1000))
+            await send(message)
+
+        await self.app(scope, receive_wrapper, send_wrapper)
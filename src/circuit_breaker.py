@@ -0,0 +1,236 @@
+"""Circuit breaker'ы и бюджет задержки для вызовов внешних сервисов.
+
+Каждый апстрим (auth-service, user-service) получает свой `CircuitBreaker`.
+После серии ошибок breaker размыкается и сразу отклоняет вызовы, через
+`reset_timeout` пропускает пробные запросы (half-open) и по их результату
+замыкается обратно или снова размыкается.
+
+Бюджет задержки — общий дедлайн на все апстрим-вызовы одного запроса.
+Его выставляет `LatencyBudgetMiddleware`, а breaker урезает таймаут вызова
+до оставшегося бюджета.
+"""
+
+import time
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import src.concts as c
+from src.metrics import Counter, Gauge, Histogram
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_state = Gauge(
+    "upstream_circuit_state", "Состояние breaker'а: 0 closed, 1 half-open, 2 open", ["upstream"]
+)
+breaker_calls = Counter(
+    "upstream_calls_total", "Вызовы апстримов по исходу", ["upstream", "outcome"]
+)
+breaker_latency = Histogram(
+    "upstream_latency_seconds", "Длительность вызовов апстримов", ["upstream"]
+)
+degraded_responses = Counter(
+    "upstream_degraded_total", "Ответы, отданные в деградированном режиме", ["upstream"]
+)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("upstream_deadline", default=None)
+
+
+class UpstreamUnavailable(Exception):
+    """Апстрим недоступен: breaker разомкнут или бюджет задержки исчерпан."""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Breaker разомкнут, вызов отклонён без обращения к сети."""
+
+
+class BudgetExhaustedError(UpstreamUnavailable):
+    """Бюджет задержки текущего запроса исчерпан."""
+
+
+class UpstreamError(Exception):
+    """Апстрим ответил ошибкой сервера (5xx) — считается отказом breaker'а."""
+
+
+def remaining_budget() -> Optional[float]:
+    """Остаток бюджета задержки текущего запроса в секундах (None — без бюджета)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def set_budget(seconds: float):
+    """Выставляет бюджет задержки для текущего контекста, возвращает токен для сброса."""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_budget(token) -> None:
+    _deadline.reset(token)
+
+
+class CircuitBreaker:
+    """Breaker одного апстрима.
+
+    Attributes:
+        name (str): Имя апстрима (метка в метриках).
+        failure_threshold (int): Ошибок подряд до размыкания.
+        reset_timeout (float): Сколько секунд breaker остаётся разомкнутым.
+        half_open_max (int): Сколько пробных вызовов пропускать одновременно.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, half_open_max: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._set_state(CLOSED)
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        return self._state
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        breaker_state.set(_STATE_VALUES[state], upstream=self.name)
+
+    def _acquire(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and self._probes < self.half_open_max:
+            self._probes += 1
+            return True
+        breaker_calls.inc(upstream=self.name, outcome="rejected")
+        raise CircuitOpenError(f"{self.name}: circuit open")
+
+    def _on_success(self) -> None:
+        self._failures = 0
+        if self._state != CLOSED:
+            logging.info("Breaker %s замкнут", self.name)
+            self._set_state(CLOSED)
+
+    def _on_failure(self) -> None:
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                logging.warning("Breaker %s разомкнут после %d ошибок", self.name, self._failures)
+            self._opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, timeout: float, **kwargs) -> Any:
+        """Выполняет вызов апстрима через breaker.
+
+        Args:
+            func: Корутинная функция, выполняющая запрос.
+            timeout (float): Собственный таймаут вызова; урезается до остатка бюджета.
+                Срабатывание урезанного таймаута не считается отказом апстрима.
+
+        Returns:
+            Any: Результат `func`.
+
+        Raises:
+            CircuitOpenError: Breaker разомкнут.
+            BudgetExhaustedError: Бюджет задержки запроса уже исчерпан.
+            asyncio.TimeoutError: Вызов не уложился в таймаут.
+            Exception: Любая ошибка `func` пробрасывается дальше.
+        """
+        budget = remaining_budget()
+        #Таймаут урезан бюджетом: его срабатывание — не отказ апстрима
+        budget_bound = budget is not None and budget < timeout
+        if budget is not None:
+            if budget <= 0:
+                breaker_calls.inc(upstream=self.name, outcome="budget_exhausted")
+                raise BudgetExhaustedError(f"{self.name}: latency budget exhausted")
+            timeout = min(timeout, budget)
+
+        probe = self._acquire()
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(func(*args, **kwargs), timeout)
+        except asyncio.TimeoutError:
+            if budget_bound:
+                breaker_calls.inc(upstream=self.name, outcome="budget_timeout")
+            else:
+                self._on_failure()
+                breaker_calls.inc(upstream=self.name, outcome="timeout")
+            raise
+        except Exception:
+            self._on_failure()
+            breaker_calls.inc(upstream=self.name, outcome="failure")
+            raise
+        else:
+            self._on_success()
+            breaker_calls.inc(upstream=self.name, outcome="success")
+            return result
+        finally:
+            if probe:
+                self._probes -= 1
+            breaker_latency.observe(time.monotonic() - started, upstream=self.name)
+
+
+class StaleCache:
+    """Кэш последних успешных ответов апстрима для деградированного режима.
+
+    Attributes:
+        max_age (float): Сколько секунд ответ можно отдавать вместо живого.
+        maxsize (int): Максимальное количество ключей.
+    """
+
+    def __init__(self, max_age: float, maxsize: int = 10000):
+        self.max_age = max_age
+        self.maxsize = maxsize
+        self._data: Dict[Hashable, tuple] = {}
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if key not in self._data and len(self._data) >= self.maxsize:
+            self._data.pop(next(iter(self._data)))
+        self._data[key] = (time.monotonic(), value)
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.max_age:
+            return None
+        return entry[1]
+
+
+auth_breaker = CircuitBreaker(
+    "auth-service", c.BREAKER_FAILURE_THRESHOLD, c.BREAKER_RESET_TIMEOUT, c.BREAKER_HALF_OPEN_MAX
+)
+user_breaker = CircuitBreaker(
+    "user-service", c.BREAKER_FAILURE_THRESHOLD, c.BREAKER_RESET_TIMEOUT, c.BREAKER_HALF_OPEN_MAX
+)
+
+
+class LatencyBudgetMiddleware:
+    """ASGI-middleware: выставляет бюджет задержки на апстрим-вызовы запроса.
+
+    Для HTTP бюджет покрывает весь запрос, для WebSocket — рукопожатие
+    (авторизацию и проверки перед `accept`).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            seconds = c.REQUEST_LATENCY_BUDGET
+        elif scope["type"] == "websocket":
+            seconds = c.WS_HANDSHAKE_BUDGET
+        else:
+            return await self.app(scope, receive, send)
+
+        token = set_budget(seconds)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_budget(token)
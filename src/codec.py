@@ -0,0 +1,98 @@
+"""Кодеки websocket-фреймов: JSON (по умолчанию) и MessagePack.
+
+Клиент выбирает MessagePack при рукопожатии заголовком
+`Sec-WebSocket-Protocol: chat.msgpack.v1`; тогда все фреймы в обе стороны —
+бинарные MessagePack. Входящие фреймы такого клиента проверяются строго
+(`parse_frame(..., strict=True)`): без приведения типов, `"1"` не станет
+числом. Без подпротокола всё остаётся как раньше — текстовые JSON-фреймы.
+
+Пакетный фрейм склейки (`src/broadcast.py`) собирается из уже
+закодированных сообщений без повторной сериализации в обоих форматах.
+"""
+
+import json
+from typing import Any, Iterable, List, Optional, Union
+
+import msgpack
+from fastapi.websockets import WebSocket, WebSocketDisconnect
+
+MSGPACK_SUBPROTOCOL = "chat.msgpack.v1"
+
+Frame = Union[str, bytes]
+
+
+class JsonCodec:
+    """Текстовые JSON-фреймы."""
+
+    name = "json"
+    subprotocol: Optional[str] = None
+    strict = False
+
+    def encode(self, obj: Any) -> str:
+        return json.dumps(obj)
+
+    def decode(self, frame: Frame) -> Any:
+        return json.loads(frame)
+
+    def batch(self, frames: List[str]) -> str:
+        #Сообщения уже сериализованы — склеиваем без повторного json.dumps
+        return '{"type": "batch", "messages": [' + ", ".join(frames) + "]}"
+
+    async def receive(self, websocket: WebSocket) -> Frame:
+        return await websocket.receive_text()
+
+    async def send_frame(self, websocket: WebSocket, frame: Frame) -> None:
+        await websocket.send_text(frame)
+
+
+def _array_header(n: int) -> bytes:
+    if n < 16:
+        return bytes([0x90 | n])
+    if n < 1 << 16:
+        return b"\xdc" + n.to_bytes(2, "big")
+    return b"\xdd" + n.to_bytes(4, "big")
+
+
+_BATCH_PREFIX = b"\x82" + msgpack.packb("type") + msgpack.packb("batch") + msgpack.packb("messages")
+
+
+class MsgpackCodec:
+    """Бинарные MessagePack-фреймы со строгой проверкой входящих."""
+
+    name = "msgpack"
+    subprotocol: Optional[str] = MSGPACK_SUBPROTOCOL
+    strict = True
+
+    def encode(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, frame: Frame) -> Any:
+        if not isinstance(frame, (bytes, bytearray)):
+            raise ValueError("Ожидался бинарный фрейм MessagePack")
+        try:
+            return msgpack.unpackb(frame, raw=False, strict_map_key=True)
+        except Exception as e:
+            raise ValueError(f"Некорректный MessagePack: {e}") from e
+
+    def batch(self, frames: List[bytes]) -> bytes:
+        return _BATCH_PREFIX + _array_header(len(frames)) + b"".join(frames)
+
+    async def receive(self, websocket: WebSocket) -> Frame:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        data = message.get("bytes")
+        return data if data is not None else message.get("text", "")
+
+    async def send_frame(self, websocket: WebSocket, frame: Frame) -> None:
+        await websocket.send_bytes(frame)
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+
+
+def negotiate(websocket: WebSocket) -> Union[JsonCodec, MsgpackCodec]:
+    """Выбирает кодек по подпротоколам, предложенным клиентом при рукопожатии."""
+    offered: Iterable[str] = websocket.scope.get("subprotocols") or ()
+    return MSGPACK if MSGPACK_SUBPROTOCOL in offered else JSON
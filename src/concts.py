@@ -22,6 +22,11 @@ USER_PREFIX = "/api/user-service"
 
 #Database
 DB_SCHEMA = "public"
+DB_USER = os.getenv("POSTGRES_USER", "postgres")
+DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "postgres")
+DB_HOST = os.getenv("POSTGRES_HOST", "localhost")
+DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+DB_NAME = os.getenv("POSTGRES_DB", "chat_service")
 COOKIE_NAME = "access_token"
 
 #Redis
@@ -31,6 +36,117 @@ REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 
 #MongoDB
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+#Схема хранения сообщений: "flat" — документ на сообщение, "bucket" — корзины по MSG_BUCKET_SIZE
+MSG_STORAGE_LAYOUT = os.getenv("MSG_STORAGE_LAYOUT", "flat")
+MSG_BUCKET_SIZE = int(os.getenv("MSG_BUCKET_SIZE", "200"))
+MSG_MIGRATION_LEASE = float(os.getenv("MSG_MIGRATION_LEASE", "30"))  # срок блокировки записи в чат при переносе в корзины, с
+MSG_MIGRATION_WAIT = float(os.getenv("MSG_MIGRATION_WAIT", "10"))  # сколько запись ждёт окончания переноса, с
+MONGO_WARM_CONNECTIONS = int(os.getenv("MONGO_WARM_CONNECTIONS", "5"))  # соединений, открываемых при старте
+SYNC_MAX_MESSAGES = int(os.getenv("SYNC_MAX_MESSAGES", "500"))  # макс. сообщений в ответе дельта-синхронизации
+MSG_DEDUP_WINDOW = int(os.getenv("MSG_DEDUP_WINDOW", "10000"))  # ключей идемпотентности в памяти
+
+#Полнотекстовый поиск по сообщениям
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "russian")  # язык стемминга текстового индекса
+SEARCH_MAX_TIME_MS = int(os.getenv("SEARCH_MAX_TIME_MS", "500"))  # потолок времени запроса в MongoDB
+SEARCH_PAGE_LIMIT = int(os.getenv("SEARCH_PAGE_LIMIT", "50"))  # макс. результатов на страницу
+SEARCH_MAX_OFFSET = int(os.getenv("SEARCH_MAX_OFFSET", "1000"))  # глубже листать нельзя
+SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "160"))
+
+#Архив холодной истории
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"  # фоновая архивация
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_HOT_LIMIT = int(os.getenv("ARCHIVE_HOT_LIMIT", "0"))  # макс. горячих сообщений на чат, 0 — без лимита
+ARCHIVE_BLOCK_SIZE = int(os.getenv("ARCHIVE_BLOCK_SIZE", "1000"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))  # секунды между проходами
+ARCHIVE_BACKEND = os.getenv("ARCHIVE_BACKEND", "mongo")  # "mongo" | "file"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+ARCHIVE_CACHE_BLOCKS = int(os.getenv("ARCHIVE_CACHE_BLOCKS", "256"))  # распакованных блоков в памяти
+
+#Хранилище чатов, участников и сообщений (db/storage.py): "mongo" | "memory"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+MEMORY_STORAGE_MAX_MESSAGES = int(os.getenv("MEMORY_STORAGE_MAX_MESSAGES", "10000"))  # на чат, 0 — без ограничения
+
+#Счётчики сообщений по чатам (db/stats.py)
+STATS_ENABLED = os.getenv("STATS_ENABLED", "true").lower() == "true"
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", "21600"))  # секунды между сверками, 0 — без сверки
+STATS_RECONCILE_BATCH = int(os.getenv("STATS_RECONCILE_BATCH", "100"))  # чатов между паузами
+STATS_RECONCILE_PAUSE = float(os.getenv("STATS_RECONCILE_PAUSE", "1"))  # секунды
+STATS_MAX_DAYS = int(os.getenv("STATS_MAX_DAYS", "365"))
+STATS_TOP_LIMIT = int(os.getenv("STATS_TOP_LIMIT", "50"))
+
+#Вложения
+ATTACHMENT_BACKEND = os.getenv("ATTACHMENT_BACKEND", "gridfs")  # "gridfs" | "file"
+ATTACHMENT_DIR = os.getenv("ATTACHMENT_DIR", "./attachments")
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(50 * 1024 * 1024)))
+ATTACHMENT_CHUNK_SIZE = int(os.getenv("ATTACHMENT_CHUNK_SIZE", str(255 * 1024)))  # кусок записи/чтения
+ATTACHMENT_MAX_PER_MESSAGE = int(os.getenv("ATTACHMENT_MAX_PER_MESSAGE", "10"))
+
+#User-service
+USER_SERVICE_TIMEOUT = float(os.getenv("USER_SERVICE_TIMEOUT", "5"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # секунды
+USER_CACHE_MAXSIZE = int(os.getenv("USER_CACHE_MAXSIZE", "10000"))
+BATCH_CHAT_LIMIT = int(os.getenv("BATCH_CHAT_LIMIT", "50"))  # макс. пользователей в пакетном создании
+MEMBERS_PAGE_LIMIT = int(os.getenv("MEMBERS_PAGE_LIMIT", "500"))  # макс. участников на страницу списка
+
+#Upstream-вызовы: пул соединений, таймауты, бюджет задержки и circuit breaker
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+AUTH_SERVICE_TIMEOUT = float(os.getenv("AUTH_SERVICE_TIMEOUT", "2"))
+BLACKLIST_TIMEOUT = float(os.getenv("BLACKLIST_TIMEOUT", "2"))
+REQUEST_LATENCY_BUDGET = float(os.getenv("REQUEST_LATENCY_BUDGET", "4"))  # на все апстримы HTTP-запроса
+WS_HANDSHAKE_BUDGET = float(os.getenv("WS_HANDSHAKE_BUDGET", "3"))  # на проверки перед accept
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "10"))
+BREAKER_HALF_OPEN_MAX = int(os.getenv("BREAKER_HALF_OPEN_MAX", "1"))
+#Деградированный режим: "cache" — отдавать последний успешный ответ, "deny"/"allow" — фиксированный
+AUTH_DEGRADED_MODE = os.getenv("AUTH_DEGRADED_MODE", "cache")
+AUTH_STALE_TTL = float(os.getenv("AUTH_STALE_TTL", "300"))
+BLACKLIST_DEGRADED_MODE = os.getenv("BLACKLIST_DEGRADED_MODE", "cache")
+BLACKLIST_STALE_TTL = float(os.getenv("BLACKLIST_STALE_TTL", "300"))
+
+#WebSocket: ограничение частоты входящих сообщений (token bucket)
+WS_CONN_RATE = float(os.getenv("WS_CONN_RATE", "5"))  # сообщений/сек на соединение
+WS_CONN_BURST = float(os.getenv("WS_CONN_BURST", "10"))
+WS_USER_RATE = float(os.getenv("WS_USER_RATE", "10"))  # сообщений/сек на пользователя (все соединения)
+WS_USER_BURST = float(os.getenv("WS_USER_BURST", "20"))
+WS_RATE_LIMIT_MODE = os.getenv("WS_RATE_LIMIT_MODE", "reject")  # "reject" | "delay"
+WS_RATE_LIMIT_MAX_DELAY = float(os.getenv("WS_RATE_LIMIT_MAX_DELAY", "1"))  # сек, для режима delay
+
+#WebSocket: склейка исходящих сообщений
+#(permessage-deflate согласует uvicorn: WS_PER_MESSAGE_DEFLATE в Dockerfile/docker-compose)
+WS_COALESCE_MS = float(os.getenv("WS_COALESCE_MS", "0"))  # окно склейки, 0 — выключено
+WS_COALESCE_MAX_BATCH = int(os.getenv("WS_COALESCE_MAX_BATCH", "50"))  # сообщений в одном фрейме
+WS_TYPING_INTERVAL = float(os.getenv("WS_TYPING_INTERVAL", "2"))  # мин. интервал повторных typing-событий, секунды
+WS_PRESENCE_INTERVAL = float(os.getenv("WS_PRESENCE_INTERVAL", "10"))
+WS_READ_INTERVAL = float(os.getenv("WS_READ_INTERVAL", "1"))
+WS_EPHEMERAL_MIN_GAP = float(os.getenv("WS_EPHEMERAL_MIN_GAP", "0.2"))  # даже при смене состояния
+
+#Дренаж соединений при остановке и возобновление сессий
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "10"))  # ожидание сообщений в обработке, секунды
+DRAIN_RECONNECT_MIN_MS = int(os.getenv("DRAIN_RECONNECT_MIN_MS", "500"))
+DRAIN_RECONNECT_MAX_MS = int(os.getenv("DRAIN_RECONNECT_MAX_MS", "15000"))  # разброс переподключений
+DRAIN_TOKEN = os.getenv("DRAIN_TOKEN")  # если задан — требуется в заголовке X-Drain-Token
+RESUME_TOKEN_SECRET = os.getenv("RESUME_TOKEN_SECRET")  # по умолчанию SECRET_KEY
+RESUME_TOKEN_TTL = float(os.getenv("RESUME_TOKEN_TTL", "120"))
+
+#Запись трафика для воспроизведения (tools/replay_capture.py), по умолчанию выключена
+CAPTURE_FILE = os.getenv("CAPTURE_FILE")  # путь к JSONL-файлу записи
+CAPTURE_SALT = os.getenv("CAPTURE_SALT")  # соль псевдонимов; без неё — случайная на процесс
+CAPTURE_MAX_BODY = int(os.getenv("CAPTURE_MAX_BODY", "65536"))  # байт тела запроса в записи
+CAPTURE_WS_OUT = os.getenv("CAPTURE_WS_OUT", "true").lower() == "true"  # размеры исходящих фреймов
+
+#Сторож цикла событий (src/loop_monitor.py)
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))  # период замера задержки, секунды
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.5"))  # остановка, после которой снимается стек
+LOOP_STALL_STACK_LIMIT = int(os.getenv("LOOP_STALL_STACK_LIMIT", "30"))  # кадров стека в логе
+
+
+#Логирование
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" | "json"
+#Доли записей ниже WARNING для частых логгеров: "logger=rate,..."
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "db.mongo=0.1,db.mongo_buckets=0.1")
 
 
 #HTTP
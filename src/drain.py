@@ -0,0 +1,99 @@
+"""Дренаж websocket-соединений перед остановкой пода.
+
+`drain()` вызывается из preStop-хука (`POST /drain`) или при завершении
+приложения:
+
+1. Сервис перестаёт принимать новые сокеты, `/ready` отвечает 503.
+2. Дожидается сообщений, которые уже принимаются (запись в MongoDB и
+   рассылка), не дольше `DRAIN_TIMEOUT` секунд, и отправляет накопленные
+   пакеты исходящих очередей.
+3. Каждому клиенту отправляет
+   `{"type": "reconnect", "after_ms": N, "resume_token": "..."}` с
+   `after_ms`, случайно распределённым в `[DRAIN_RECONNECT_MIN_MS,
+   DRAIN_RECONNECT_MAX_MS]`, и закрывает соединение кодом 1012.
+
+Случайная задержка растягивает переподключения во времени, а токен
+возобновления (`src/resume.py`) избавляет их от повторного рукопожатия.
+"""
+
+import random
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+
+from fastapi.websockets import WebSocket
+
+import src.broadcast as broadcast
+import src.concts as c
+from schemas.user import WhoAmI
+from src.metrics import Counter
+from src.resume import issue_token
+
+drained_connections = Counter("ws_drained_connections_total", "Соединения, закрытые дренажом")
+
+_draining = False
+_inflight = 0
+_idle = asyncio.Event()
+_idle.set()
+_sessions: Dict[WebSocket, Tuple[WhoAmI, str]] = {}
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+def track(websocket: WebSocket, user: WhoAmI, chat_id: str) -> None:
+    """Запоминает открытое соединение, чтобы при дренаже выдать ему токен."""
+    _sessions[websocket] = (user, chat_id)
+
+
+def untrack(websocket: WebSocket) -> None:
+    _sessions.pop(websocket, None)
+
+
+@asynccontextmanager
+async def inflight():
+    """Отмечает обработку сообщения, которую дренаж должен дождаться."""
+    global _inflight
+    _inflight += 1
+    _idle.clear()
+    try:
+        yield
+    finally:
+        _inflight -= 1
+        if _inflight == 0:
+            _idle.set()
+
+
+async def _close(websocket: WebSocket, user: WhoAmI, chat_id: str) -> None:
+    try:
+        await broadcast.flush(websocket)
+        after_ms = random.randint(c.DRAIN_RECONNECT_MIN_MS, c.DRAIN_RECONNECT_MAX_MS)
+        await broadcast.send_to(
+            websocket, {"type": "reconnect", "after_ms": after_ms, "resume_token": issue_token(user, chat_id)}
+        )
+        await websocket.close(code=1012, reason="Service restart")
+        drained_connections.inc()
+    except Exception as e:
+        logging.warning("Ошибка при дренаже соединения: %s", e)
+
+
+async def drain() -> int:
+    """Переводит сервис в режим дренажа и закрывает все соединения.
+
+    Returns:
+        int: Количество закрытых соединений.
+    """
+    global _draining
+    _draining = True
+
+    try:
+        await asyncio.wait_for(_idle.wait(), timeout=c.DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logging.warning("Дренаж: %d сообщений не успели обработаться за %.1f с", _inflight, c.DRAIN_TIMEOUT)
+
+    sessions = list(_sessions.items())
+    await asyncio.gather(*(_close(ws, user, chat_id) for ws, (user, chat_id) in sessions))
+    logging.info("Дренаж завершён, закрыто соединений: %d", len(sessions))
+    return len(sessions)
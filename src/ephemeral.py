@@ -0,0 +1,141 @@
+"""Эфемерные события комнаты: набор текста, присутствие, курсор прочтения.
+
+События не сохраняются в MongoDB и не расходуют токены лимита сообщений —
+их частоту ограничивает `EventThrottle`: повтор того же состояния чаще, чем
+раз в `WS_<KIND>_INTERVAL` секунд, отбрасывается, смена состояния
+(например, typing true -> false) проходит, если с прошлого события того же
+вида прошло не меньше `WS_EPHEMERAL_MIN_GAP` секунд. Смена, пришедшая
+раньше, не теряется: последнее такое состояние рассылается, как только
+промежуток истечёт, иначе у собеседников «печатает» висело бы до таймаута.
+Событие рассылается всем подключённым участникам комнаты, кроме отправителя:
+
+    {"type": "typing", "chat_id": ..., "user_id": ..., "state": true}
+"""
+
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi.websockets import WebSocket
+
+import src.broadcast as broadcast
+import src.concts as c
+from src.metrics import Counter
+
+ephemeral_events = Counter(
+    "ws_ephemeral_events_total", "Эфемерные события комнаты", ["kind", "action"]
+)
+
+#Минимальный интервал между одинаковыми событиями одного соединения, секунды
+INTERVALS: Dict[str, float] = {
+    "typing": c.WS_TYPING_INTERVAL,
+    "presence": c.WS_PRESENCE_INTERVAL,
+    "read": c.WS_READ_INTERVAL,
+}
+
+
+class EventThrottle:
+    """Троттлинг эфемерных событий одного соединения.
+
+    Для каждого вида события помнит время и состояние последнего
+    пропущенного события и не больше одной отложенной смены состояния.
+    Память — O(число видов событий).
+    """
+
+    __slots__ = ("_last", "_deferred")
+
+    def __init__(self):
+        self._last: Dict[str, Tuple[float, Any]] = {}
+        self._deferred: Dict[str, asyncio.Task] = {}
+
+    def allow(self, kind: str, state: Any, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        last = self._last.get(kind)
+        if last is not None:
+            interval = INTERVALS.get(kind, 0) if last[1] == state else c.WS_EPHEMERAL_MIN_GAP
+            if now - last[0] < interval:
+                return False
+        self._last[kind] = (now, state)
+        return True
+
+    def delay(self, kind: str, state: Any, now: Optional[float] = None) -> Optional[float]:
+        """Через сколько секунд отброшенная смена состояния может пройти.
+
+        Returns:
+            Optional[float]: Задержка или None, если `state` — повтор последнего
+            пропущенного состояния (его откладывать не нужно).
+        """
+        now = time.monotonic() if now is None else now
+        last = self._last.get(kind)
+        if last is None or last[1] == state:
+            return None
+        return max(last[0] + c.WS_EPHEMERAL_MIN_GAP - now, 0.0)
+
+    def defer(self, kind: str, state: Any, delay: float, send: Callable[[], Awaitable[None]]) -> None:
+        """Отправляет `state` через `delay` секунд, заменяя прежнюю отложенную смену."""
+        self.cancel(kind)
+
+        async def later() -> None:
+            await asyncio.sleep(delay)
+            self._deferred.pop(kind, None)
+            if self.allow(kind, state):
+                await send()
+
+        self._deferred[kind] = asyncio.create_task(later())
+
+    def cancel(self, kind: Optional[str] = None) -> None:
+        """Отменяет отложенную смену вида `kind` (None — все, при закрытии соединения)."""
+        for k in ([kind] if kind else list(self._deferred)):
+            task = self._deferred.pop(k, None)
+            if task:
+                task.cancel()
+
+
+async def publish(
+    sockets: Iterable[WebSocket],
+    sender: Optional[WebSocket],
+    event: Dict[str, Any],
+) -> None:
+    """Рассылает событие всем соединениям комнаты, кроме отправителя."""
+    await broadcast.broadcast([ws for ws in sockets if ws is not sender], event)
+    ephemeral_events.inc(kind=event["type"], action="sent")
+
+
+async def handle(
+    throttle: EventThrottle,
+    sockets: Iterable[WebSocket],
+    sender: WebSocket,
+    chat_id: str,
+    user_id: int,
+    frame,
+) -> bool:
+    """Обрабатывает эфемерный фрейм клиента.
+
+    Args:
+        throttle (EventThrottle): Троттлинг соединения-отправителя.
+        sockets (Iterable[WebSocket]): Соединения комнаты.
+        sender (WebSocket): Соединение-отправитель.
+        chat_id (str): Идентификатор чата.
+        user_id (int): Идентификатор отправителя (из аутентификации, не из фрейма).
+        frame: `TypingFrame`, `PresenceFrame` или `ReadFrame`.
+
+    Returns:
+        bool: True — событие разослано, False — отброшено или отложено
+        троттлингом.
+    """
+    event = frame.model_dump()
+    kind = event["type"]
+    state = tuple(v for k, v in event.items() if k != "type")
+    event.update(chat_id=chat_id, user_id=user_id)
+    #Новое событие вида заменяет отложенное: иначе оно пришло бы после более свежего
+    throttle.cancel(kind)
+    if not throttle.allow(kind, state):
+        delay = throttle.delay(kind, state)
+        if delay is None:
+            ephemeral_events.inc(kind=kind, action="throttled")
+        else:
+            throttle.defer(kind, state, delay, lambda: publish(sockets, sender, event))
+            ephemeral_events.inc(kind=kind, action="deferred")
+        return False
+    await publish(sockets, sender, event)
+    return True
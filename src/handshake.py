@@ -0,0 +1,132 @@
+"""Рукопожатие websocket-комнаты чата: авторизация, чат и блокировки.
+
+Независимые запросы идут параллельно: пользователь (`auth.whoami_socket`)
+и карточка чата (`get_chat_info`) запрашиваются одновременно, а проверка
+членства или блокировок, которой нужны оба ответа, стартует сразу после
+них. Время подключения — примерно `max(auth, chat_info) + blacklist`
+вместо суммы трёх запросов.
+
+Первый отказ (пользователь не определён, чата нет) или сбой запроса
+отменяет ещё выполняющиеся запросы; сбой и неизвестный результат проверки
+блокировок тоже отклоняют подключение (код 1011). Сессия, возобновлённая
+по токену (`src/resume.py`), проверки пропускает: они пройдены при
+исходном подключении.
+
+Длительность каждого этапа пишется в `ws_handshake_stage_seconds`
+(`auth`, `chat_info`, `membership`, `blacklist`, `total`), отказы — в
+`ws_handshake_rejected_total` по причинам.
+"""
+
+import time
+import asyncio
+import logging
+
+from fastapi.websockets import WebSocket
+
+import src.auth as auth
+from db.storage import Storage
+from schemas.user import WhoAmI
+from src.blacklist import check_user_blocked_by_username, is_unknown
+from src.metrics import Counter, Histogram
+
+handshake_stage_seconds = Histogram(
+    "ws_handshake_stage_seconds", "Длительность этапов рукопожатия websocket", ["stage"],
+)
+handshake_rejected = Counter("ws_handshake_rejected_total", "Отклонённые рукопожатия websocket", ["reason"])
+
+
+class HandshakeRejected(Exception):
+    """Подключение отклонено: закрыть сокет с `code` и `reason`.
+
+    Attributes:
+        code (int): Код закрытия websocket.
+        reason (str): Причина закрытия для клиента.
+        label (str): Причина для метрики.
+    """
+
+    def __init__(self, code: int, reason: str, label: str):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+        self.label = label
+
+
+async def _timed(stage: str, awaitable):
+    #Отменённый этап не замеряем: его длительность ничего не говорит о зависимости
+    started = time.perf_counter()
+    result = await awaitable
+    handshake_stage_seconds.observe(time.perf_counter() - started, stage=stage)
+    return result
+
+
+async def authorize(websocket: WebSocket, storage: Storage, chat_id: str) -> WhoAmI:
+    """Проверяет подключение к комнате `chat_id` и возвращает пользователя.
+
+    Args:
+        websocket (WebSocket): Подключение (cookies, `?resume=`).
+        storage (Storage): Хранилище чатов.
+        chat_id (str): Идентификатор чата.
+
+    Returns:
+        WhoAmI: Текущий пользователь.
+
+    Raises:
+        HandshakeRejected: Подключение нужно закрыть.
+    """
+    started = time.perf_counter()
+    try:
+        return await _authorize(websocket, storage, chat_id)
+    except HandshakeRejected as e:
+        handshake_rejected.inc(reason=e.label)
+        raise
+    except Exception as e:
+        #Сбой зависимости (MongoDB, auth-service) — отказ в подключении, а не необработанная ошибка
+        logging.error("Ошибка рукопожатия чата %s: %r", chat_id, e)
+        handshake_rejected.inc(reason="error")
+        raise HandshakeRejected(1011, "Handshake failed", "error") from e
+    finally:
+        handshake_stage_seconds.observe(time.perf_counter() - started, stage="total")
+
+
+async def _authorize(websocket: WebSocket, storage: Storage, chat_id: str) -> WhoAmI:
+    user_task = asyncio.create_task(_timed("auth", auth.whoami_socket(websocket)))
+    chat_task = asyncio.create_task(_timed("chat_info", storage.get_chat_info(chat_id)))
+    pending = {user_task, chat_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if user_task in done:
+                user = user_task.result()
+                if user.user_id is None:
+                    logging.error("Пользователь не аутентифицирован")
+                    raise HandshakeRejected(1008, "Not authenticated", "not_authenticated")
+                if getattr(websocket.state, "resumed", False):
+                    return user
+            if chat_task in done and chat_task.result() is None:
+                raise HandshakeRejected(1011, "Chat not found in DB", "chat_not_found")
+    finally:
+        for task in pending:
+            task.cancel()
+
+    chat_info = chat_task.result()
+    if chat_info.chat_type == "group":
+        #Групповой чат: точечная проверка членства, блокировки между участниками не проверяются
+        if not await _timed("membership", storage.get_member(chat_id, user.user_id)):
+            raise HandshakeRejected(1008, "Not a chat member", "not_member")
+        return user
+
+    if not any(m.user_id == user.user_id for m in chat_info.members):
+        raise HandshakeRejected(1008, "Not a chat member", "not_member")
+    recipient = next((m for m in chat_info.members if m.user_id != user.user_id), None)
+    if not recipient:
+        raise HandshakeRejected(1011, "User not found in current chat", "no_recipient")
+
+    is_blocked = await _timed("blacklist", check_user_blocked_by_username(
+        request=websocket, blocked_username=recipient.user_name
+    ))
+    #Ответ не получен (user-service ответил не 200 или недоступен и ответа нет в кэше)
+    if is_unknown(is_blocked):
+        raise HandshakeRejected(1011, "Blacklist check unavailable", "blacklist_unavailable")
+    if is_blocked.get("blocked_by_user") or is_blocked.get("you_blocked_user"):
+        raise HandshakeRejected(1011, "Blocked by user", "blocked")
+    return user
@@ -0,0 +1,160 @@
+"""Асинхронное логирование с выборкой частых событий.
+
+`setup_logging()` вешает на корневой логгер `QueueHandler`: в потоке
+обработчика запрос записи стоит проверку фильтров, подстановку `msg % args`
+и `put` в очередь, а форматирование и запись в stderr выполняет фоновый
+поток `QueueListener`.
+
+Для логгеров горячего пути (`LOG_SAMPLING`, например
+`db.mongo=0.1,db.mongo_buckets=0.1`) записи ниже WARNING проходят с
+заданной долей: 0.1 — каждая десятая. Предупреждения и ошибки не
+отбрасываются никогда.
+
+Формат вывода — `LOG_FORMAT`: `text` или `json` (одна JSON-строка на запись).
+"""
+
+import json
+import queue
+import logging
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import src.concts as c
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.Handler] = None
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Разбирает `"logger=rate,logger=rate"` в словарь."""
+    rates: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        name, _, rate = item.strip().partition("=")
+        if name and rate:
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю `rate` записей ниже WARNING от указанных логгеров.
+
+    Выборка детерминированная (каждая N-я запись логгера), без генератора
+    случайных чисел на горячем пути.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.periods = {name: (round(1 / rate) if rate > 0 else 0) for name, rate in rates.items()}
+        self._counters: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        period = self.periods.get(record.name)
+        if period is None or period == 1:
+            return True
+        if period == 0:
+            return False
+        count = self._counters.get(record.name, 0)
+        self._counters[record.name] = count + 1
+        return count % period == 0
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """`QueueHandler` без полного форматирования в вызывающем потоке.
+
+    Стандартный `prepare()` форматирует запись целиком и копирует её, чтобы
+    передать в другой процесс. Очередь здесь внутрипроцессная, поэтому в
+    вызывающем потоке подставляются только аргументы (`msg % args`): иначе
+    фоновый поток прочитал бы изменяемые аргументы уже в более позднем
+    состоянии. Форматирование (время, трассировка, JSON) остаётся фоновому
+    потоку.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись; поля из `extra=` попадают в объект."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def build_formatter(fmt: str) -> logging.Formatter:
+    if fmt == "json":
+        return JsonFormatter()
+    return logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    sampling: Optional[str] = None,
+    target: Optional[logging.Handler] = None,
+) -> logging.handlers.QueueListener:
+    """Настраивает корневой логгер на очередь с фоновым писателем.
+
+    Повторный вызов заменяет предыдущую конфигурацию.
+
+    Args:
+        level (Optional[str]): Уровень (по умолчанию `LOG_LEVEL`).
+        fmt (Optional[str]): `text` или `json` (по умолчанию `LOG_FORMAT`).
+        sampling (Optional[str]): Доли записей по логгерам (по умолчанию `LOG_SAMPLING`).
+        target (Optional[logging.Handler]): Конечный обработчик (по умолчанию stderr).
+
+    Returns:
+        QueueListener: Запущенный фоновый писатель.
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+
+    target = target or logging.StreamHandler()
+    target.setFormatter(build_formatter(fmt or c.LOG_FORMAT))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = LazyQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sampling(c.LOG_SAMPLING if sampling is None else sampling)))
+
+    #Имя процесса/задачи asyncio в форматах не используется — не собираем их для каждой записи
+    logging.logMultiprocessing = False
+    logging.logProcesses = False
+    if hasattr(logging, "logAsyncioTasks"):
+        logging.logAsyncioTasks = False
+
+    root = logging.getLogger()
+    root.setLevel((level or c.LOG_LEVEL).upper())
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    _listener.start()
+    _queue_handler = handler
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь и останавливает фоновый писатель."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
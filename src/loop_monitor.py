@@ -0,0 +1,117 @@
+"""Сторож цикла событий: задержка цикла и стеки блокирующих вызовов.
+
+Фоновая задача каждые `LOOP_MONITOR_INTERVAL` секунд засыпает и меряет, на
+сколько позже запланированного она проснулась — это задержка цикла
+(`event_loop_lag_seconds`): сколько ждала бы любая корутина, готовая к
+выполнению.
+
+Задача заодно обновляет отметку времени, за которой следит отдельный поток.
+Если отметка не обновлялась дольше `LOOP_STALL_THRESHOLD` секунд, цикл
+занят синхронным кодом: поток снимает стек потока цикла
+(`sys._current_frames`) и пишет его в лог. На вершине стека — блокирующий
+вызов (синхронный HTTP, `time.sleep`, тяжёлый разбор и т.п.), ниже — колбэк
+или корутина, из которой он сделан. На одну остановку снимается один стек.
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import src.concts as c
+from src.metrics import Counter, Histogram
+
+loop_lag = Histogram(
+    "event_loop_lag_seconds", "Задержка пробуждения задачи-сторожа относительно расписания",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+loop_stalls = Counter("event_loop_stalls_total", "Остановки цикла событий дольше LOOP_STALL_THRESHOLD")
+
+
+class LoopMonitor:
+    """Задача замера задержки и поток, снимающий стек при остановке цикла.
+
+    Attributes:
+        interval (float): Период замера задержки, секунды.
+        threshold (float): Сколько цикл может не отвечать до снятия стека, секунды.
+        stalls (Deque[Dict]): Последние остановки: `started`, `stack`.
+    """
+
+    def __init__(self, interval: float, threshold: float, stack_limit: int = 30):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_limit = stack_limit
+        self.stalls: Deque[Dict] = deque(maxlen=16)
+        self._heartbeat = time.monotonic()
+        self._reported: Optional[float] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Запускает замер в текущем цикле событий и поток-сторож."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def _measure(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            loop_lag.observe(max(time.perf_counter() - started - self.interval, 0.0))
+            self._heartbeat = time.monotonic()
+
+    def _watch(self) -> None:
+        #Проверяем чаще порога, чтобы стек снимался близко к началу остановки
+        period = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(period):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat
+            if stalled > self.threshold + self.interval and self._reported != heartbeat:
+                self._reported = heartbeat
+                self._report(stalled)
+
+    def _report(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = "".join(traceback.format_stack(frame, limit=self.stack_limit))
+        loop_stalls.inc()
+        self.stalls.append({"started": time.time() - stalled, "stack": stack})
+        logging.warning("Цикл событий не отвечает %.3f с, стек потока цикла:\n%s", stalled, stack)
+
+
+monitor: Optional[LoopMonitor] = None
+
+
+def start() -> Optional[LoopMonitor]:
+    """Запускает сторож в текущем цикле событий, если `LOOP_MONITOR_ENABLED`."""
+    global monitor
+    if c.LOOP_MONITOR_ENABLED and monitor is None:
+        monitor = LoopMonitor(c.LOOP_MONITOR_INTERVAL, c.LOOP_STALL_THRESHOLD, c.LOOP_STALL_STACK_LIMIT)
+        monitor.start()
+    return monitor
+
+
+def stop() -> None:
+    global monitor
+    if monitor is not None:
+        monitor.stop()
+        monitor = None
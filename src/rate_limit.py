@@ -0,0 +1,100 @@
+"""Token bucket ограничение частоты входящих websocket-фреймов.
+
+Каждое соединение получает собственную корзину, а все соединения одного
+пользователя делят общую корзину из `UserBuckets`. Проверка и списание —
+O(1) по времени и памяти на сообщение, состояние хранится в памяти процесса.
+"""
+
+import time
+from typing import Dict, Hashable, Optional, Tuple
+
+import src.concts as c
+from src.metrics import Counter
+
+rate_limited_frames = Counter(
+    "ws_rate_limited_total", "Фреймы, упёршиеся в лимит частоты", ["action"]
+)
+
+
+class TokenBucket:
+    """Корзина токенов: `rate` токенов в секунду, не более `burst` в запасе.
+
+    Attributes:
+        rate (float): Скорость пополнения, токенов в секунду.
+        burst (float): Ёмкость корзины (допустимый всплеск).
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Через сколько секунд появится токен (0 — доступен сейчас)."""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        """Списывает токен; после ожидания баланс может кратковременно уйти в минус."""
+        self.tokens -= 1
+
+
+class UserBuckets:
+    """Общие корзины пользователей с подсчётом ссылок.
+
+    Корзина создаётся при первом подключении пользователя и удаляется,
+    когда закрывается его последнее соединение.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Hashable, Tuple[TokenBucket, int]] = {}
+
+    def acquire(self, user_id: Hashable) -> TokenBucket:
+        bucket, refs = self._buckets.get(user_id, (None, 0))
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+        self._buckets[user_id] = (bucket, refs + 1)
+        return bucket
+
+    def release(self, user_id: Hashable) -> None:
+        bucket, refs = self._buckets.get(user_id, (None, 0))
+        if refs <= 1:
+            self._buckets.pop(user_id, None)
+        else:
+            self._buckets[user_id] = (bucket, refs - 1)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+user_buckets = UserBuckets(rate=c.WS_USER_RATE, burst=c.WS_USER_BURST)
+
+
+def new_connection_bucket() -> TokenBucket:
+    return TokenBucket(rate=c.WS_CONN_RATE, burst=c.WS_CONN_BURST)
+
+
+def check_frame(conn_bucket: TokenBucket, user_bucket: TokenBucket) -> float:
+    """Проверяет обе корзины для очередного фрейма.
+
+    Returns:
+        float: 0 — фрейм пропущен и токены списаны; иначе — сколько секунд
+        нужно подождать до появления токена в обеих корзинах (ничего не списано).
+    """
+    now = time.monotonic()
+    wait = max(conn_bucket.wait_time(now), user_bucket.wait_time(now))
+    if wait == 0:
+        conn_bucket.consume()
+        user_bucket.consume()
+    return wait
@@ -0,0 +1,82 @@
+"""Токены возобновления websocket-сессии.
+
+При дренаже (`src/drain.py`) клиент получает подписанный HMAC-SHA256 токен с
+пользователем и чатом. Переподключаясь с `?resume=<token>` в течение
+`RESUME_TOKEN_TTL` секунд, клиент пропускает полное рукопожатие: запрос
+`/auth/me`, чтение чата и проверку блокировок — всё это уже было проверено
+при исходном подключении. Токен привязан к чату и не действует для другого
+`chat_id`.
+
+Формат: `base64url(json).base64url(hmac)`. Ключ — `RESUME_TOKEN_SECRET`
+(или `SECRET_KEY`); без ключа токены не выдаются и не принимаются.
+"""
+
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+from typing import Optional
+
+from schemas.user import WhoAmI
+import src.concts as c
+
+
+def _secret() -> Optional[bytes]:
+    secret = c.RESUME_TOKEN_SECRET or c.SECRET_KEY
+    return secret.encode() if secret else None
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def issue_token(user: WhoAmI, chat_id: str, now: Optional[float] = None) -> Optional[str]:
+    """Выдаёт токен возобновления для пользователя в чате (None — ключ не настроен)."""
+    secret = _secret()
+    if secret is None or user.user_id is None:
+        return None
+    now = time.time() if now is None else now
+    payload = json.dumps(
+        {
+            "u": user.user_id,
+            "n": user.username,
+            "a": user.avatar,
+            "c": chat_id,
+            "exp": int(now + c.RESUME_TOKEN_TTL),
+        },
+        separators=(",", ":"),
+    ).encode()
+    signature = hmac.new(secret, payload, hashlib.sha256).digest()
+    return _b64encode(payload) + "." + _b64encode(signature)
+
+
+def verify_token(token: str, chat_id: str, now: Optional[float] = None) -> Optional[WhoAmI]:
+    """Проверяет подпись, срок и чат токена.
+
+    Returns:
+        Optional[WhoAmI]: Пользователь из токена или None, если токен недействителен.
+    """
+    secret = _secret()
+    if secret is None or not token:
+        return None
+    try:
+        payload_part, signature_part = token.split(".", 1)
+        payload = _b64decode(payload_part)
+        expected = hmac.new(secret, payload, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_part)):
+            return None
+        data = json.loads(payload)
+    except Exception as e:
+        logging.warning("Некорректный токен возобновления: %r", e)
+        return None
+
+    now = time.time() if now is None else now
+    if data.get("c") != chat_id or data.get("exp", 0) < now:
+        return None
+    return WhoAmI(user_id=data["u"], username=data.get("n"), avatar=data.get("a"))
@@ -0,0 +1,55 @@
+"""Общий HTTP-клиент для вызовов auth-service и user-service.
+
+Один `httpx.AsyncClient` на процесс держит пул keep-alive соединений, поэтому
+запросы к апстримам не платят за новое TCP/TLS-рукопожатие. Клиент создаётся
+лениво, а прогревается и закрывается в `lifespan`.
+
+Cookies пользователя передаются явным заголовком на каждый запрос. Своё
+хранилище cookies у клиента отключено, чтобы `Set-Cookie` из ответа одного
+пользователя не ушёл в запросы другого.
+"""
+
+import logging
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Mapping, Optional
+
+import httpx
+import src.concts as c
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Возвращает общий HTTP-клиент, создавая его при первом обращении."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+            limits=httpx.Limits(
+                max_connections=c.UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=c.UPSTREAM_MAX_KEEPALIVE,
+            ),
+        )
+    return _client
+
+
+def cookie_header(cookies: Mapping[str, str]) -> Dict[str, str]:
+    """Заголовок `Cookie` из cookies входящего запроса."""
+    if not cookies:
+        return {}
+    return {"Cookie": "; ".join(f"{k}={v}" for k, v in cookies.items())}
+
+
+async def warm_up() -> None:
+    """Открывает соединения с бекендом заранее, до первого пользовательского запроса."""
+    try:
+        await get_client().get(c.BACKEND_URL, timeout=c.AUTH_SERVICE_TIMEOUT)
+    except Exception as e:
+        logging.warning("Не удалось прогреть соединение с %s: %r", c.BACKEND_URL, e)
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,166 @@
+import time
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+import httpx
+import src.concts as c
+from src.circuit_breaker import UpstreamError, degraded_responses, user_breaker
+from src.upstream import get_client
+
+
+class UserProfileCache:
+    """TTL-кэш профилей user-service.
+
+    Профиль хранится одновременно по `user_name` и по `user_id`, поэтому
+    повторный поиск по любому из ключей не уходит в сеть, пока запись жива.
+
+    Attributes:
+        ttl (float): Время жизни записи в секундах.
+        maxsize (int): Максимальное количество профилей в кэше.
+    """
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._by_name: Dict[str, tuple] = {}
+        self._by_id: Dict[int, tuple] = {}
+
+    def _alive(self, entry: Optional[tuple], allow_stale: bool) -> Optional[dict]:
+        if entry is None:
+            return None
+        expires_at, profile = entry
+        if expires_at < time.monotonic() and not allow_stale:
+            return None
+        return profile
+
+    def get_by_name(self, username: str, allow_stale: bool = False) -> Optional[dict]:
+        """Возвращает профиль по имени пользователя или None.
+
+        `allow_stale=True` отдаёт и протухшую запись — для деградированного режима.
+        """
+        return self._alive(self._by_name.get(username), allow_stale)
+
+    def get_by_id(self, user_id: int, allow_stale: bool = False) -> Optional[dict]:
+        """Возвращает профиль по ID пользователя или None."""
+        return self._alive(self._by_id.get(user_id), allow_stale)
+
+    def put(self, profile: dict) -> None:
+        """Сохраняет профиль под обоими ключами."""
+        if len(self._by_name) >= self.maxsize:
+            self._evict()
+        entry = (time.monotonic() + self.ttl, profile)
+        self._by_name[profile["user_name"]] = entry
+        self._by_id[profile["user_id"]] = entry
+
+    def invalidate(self, username: str) -> None:
+        """Удаляет профиль из кэша (например, после смены аватара)."""
+        entry = self._by_name.pop(username, None)
+        if entry is not None:
+            self._by_id.pop(entry[1]["user_id"], None)
+
+    def clear(self) -> None:
+        self._by_name.clear()
+        self._by_id.clear()
+
+    def _evict(self) -> None:
+        """Выкидывает протухшие записи, а если их нет — самую старую."""
+        now = time.monotonic()
+        expired = [name for name, (exp, _) in self._by_name.items() if exp < now]
+        if not expired:
+            expired = [next(iter(self._by_name))]
+        for name in expired:
+            self.invalidate(name)
+
+
+user_cache = UserProfileCache(ttl=c.USER_CACHE_TTL, maxsize=c.USER_CACHE_MAXSIZE)
+
+
+async def _request_user(username: str) -> httpx.Response:
+    resp = await get_client().get(f"{c.BACKEND_URL}{c.USER_PREFIX}/user/", params={"username": username})
+    if resp.status_code >= 500:
+        raise UpstreamError(f"user-service: {resp.status_code}")
+    return resp
+
+
+async def _fetch_user(username: str) -> Optional[dict]:
+    """Запрашивает профиль через breaker user-service.
+
+    Если сервис недоступен, а в кэше есть протухший профиль — отдаёт его.
+    """
+    try:
+        resp = await user_breaker.call(_request_user, username, timeout=c.USER_SERVICE_TIMEOUT)
+    except Exception:
+        stale = user_cache.get_by_name(username, allow_stale=True)
+        if stale is None:
+            raise
+        degraded_responses.inc(upstream=user_breaker.name)
+        return stale
+    if resp.status_code != 200:
+        return None
+    user_data = resp.json()
+    return {
+        "user_id": user_data["id"],
+        "user_name": user_data["username"],
+        "avatar": user_data.get("avatar", ""),
+    }
+
+
+async def get_user_by_username(username: str) -> Optional[dict]:
+    """Возвращает профиль пользователя по имени, используя кэш.
+
+    Args:
+        username (str): Имя пользователя.
+
+    Returns:
+        dict | None: Профиль `{"user_id", "user_name", "avatar"}` или None,
+        если user-service не нашёл пользователя.
+
+    Raises:
+        Exception: При сетевой ошибке обращения к user-service.
+    """
+    profile = user_cache.get_by_name(username)
+    if profile is not None:
+        return profile
+
+    profile = await _fetch_user(username)
+    if profile is not None:
+        user_cache.put(profile)
+    return profile
+
+
+async def get_users_by_usernames(usernames: Iterable[str]) -> Dict[str, Optional[dict]]:
+    """Пакетно возвращает профили пользователей.
+
+    Профили из кэша отдаются сразу, остальные запрашиваются у user-service
+    конкурентно через общий пул соединений.
+
+    Args:
+        usernames (Iterable[str]): Имена пользователей.
+
+    Returns:
+        dict[str, dict | None]: Профиль (или None) для каждого имени.
+        Если запрос конкретного пользователя упал, вместо профиля лежит исключение.
+    """
+    result: Dict[str, Optional[dict]] = {}
+    missing = []
+    for username in dict.fromkeys(usernames):
+        profile = user_cache.get_by_name(username)
+        if profile is not None:
+            result[username] = profile
+        else:
+            missing.append(username)
+
+    if missing:
+        fetched = await asyncio.gather(
+            *(_fetch_user(username) for username in missing),
+            return_exceptions=True,
+        )
+        for username, profile in zip(missing, fetched):
+            if isinstance(profile, Exception):
+                logging.error("Ошибка при получении пользователя %s: %s", username, profile)
+            elif profile is not None:
+                user_cache.put(profile)
+            result[username] = profile
+
+    return result
@@ -89,4 +89,52 @@ async def test_create_chat_with_user_creates_when_not_exists():
         ) as ac:
             resp = await ac.post("/api/chat-service/wss/create_chat", params={"username": "kasada"})
             assert resp.status_code == 200
-            assert resp.json()["chat_id"] == "9af4e8dd-8954-4972-b9db-ebfb44f2371e"
\ No newline at end of file
+            assert resp.json()["chat_id"] == "9af4e8dd-8954-4972-b9db-ebfb44f2371e"
+
+@pytest.mark.asyncio
+async def test_ready_endpoint_reflects_warmup_state():
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        app.state.ready = False
+        resp = await ac.get("/ready")
+        assert resp.status_code == 503
+
+        app.state.ready = True
+        resp = await ac.get("/ready")
+        assert resp.status_code == 200
+
+        resp = await ac.get("/health")
+        assert resp.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_ready_with_memory_backend_does_not_wait_for_mongo():
+    import asyncio
+    from unittest.mock import MagicMock
+    import main
+    from db.memory_storage import MemoryStorage
+
+    mongo_client = MagicMock()
+    mongo_client.admin.command = AsyncMock(side_effect=ConnectionError("no mongo"))
+    app.state.mongo_client = mongo_client
+    app.state.storage = MemoryStorage()
+    app.state.ready = False
+
+    async def fake_whoami():
+        return MagicMock(user_id=1)
+
+    app.dependency_overrides[main.auth.whoami] = fake_whoami
+    try:
+        with patch("main.upstream.warm_up", new=AsyncMock()):
+            await asyncio.wait_for(main.warm_up(app), timeout=1)
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as ac:
+            assert (await ac.get("/ready")).status_code == 200
+            resp = await ac.get("/api/chat-service/wss/search", params={"q": "hi"})
+            assert resp.status_code == 501
+    finally:
+        app.dependency_overrides.clear()
+        app.state.ready = False
+    mongo_client.admin.command.assert_not_awaited()
@@ -0,0 +1,115 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from db import archive
+
+
+class _MemoryStore:
+    """Хранилище блоков в памяти вместо Mongo/файлов."""
+
+    def __init__(self):
+        self.blocks = {}
+        self.reads = 0
+
+    async def list_blocks(self, client, chat_id):
+        return [
+            {"block": b, "count": len(m), "last_ts": m[-1]["timestamp"]}
+            for (cid, b), m in sorted(self.blocks.items()) if cid == chat_id
+        ]
+
+    async def write_block(self, client, chat_id, block, messages):
+        #Проходим через реальное кодирование, как при записи в архив
+        self.blocks[(chat_id, block)] = archive._decode(archive._encode(messages))
+
+    async def read_block(self, client, chat_id, block):
+        self.reads += 1
+        return self.blocks[(chat_id, block)]
+
+
+def _messages(start, n):
+    t0 = datetime(2024, 1, 1)
+    return [{"msg_id": str(i), "timestamp": t0 + timedelta(minutes=i)} for i in range(start, start + n)]
+
+
+@pytest.mark.asyncio
+async def test_archived_page_is_newest_first_and_cached():
+    store = _MemoryStore()
+    await store.write_block(None, "chat", 0, _messages(0, 5))
+    await store.write_block(None, "chat", 1, _messages(5, 5))
+
+    with patch.object(archive, "store", store), \
+         patch.object(archive, "block_cache", archive._BlockCache(8)):
+        page = await archive.get_archived_page(None, "chat", limit=4, offset=3)
+        again = await archive.get_archived_page(None, "chat", limit=4, offset=3)
+
+    assert [m["msg_id"] for m in page] == ["6", "5", "4", "3"]
+    assert page == again
+    assert store.reads == 2
+
+
+@pytest.mark.asyncio
+async def test_complete_page_falls_through_to_archive():
+    store = _MemoryStore()
+    await store.write_block(None, "chat", 0, _messages(0, 5))
+    hot = [{"msg_id": "hot-1"}, {"msg_id": "hot-0"}]
+
+    with patch.object(archive, "store", store), \
+         patch.object(archive, "block_cache", archive._BlockCache(8)), \
+         patch.object(archive.c, "ARCHIVE_ENABLED", True):
+        page = await archive.complete_page(None, "chat", hot, limit=4, offset=0)
+
+    assert [m["msg_id"] for m in page] == ["hot-1", "hot-0", "4", "3"]
+
+
+@pytest.mark.asyncio
+async def test_complete_page_skips_archive_lookup_when_disabled():
+    store = _MemoryStore()
+    store.list_blocks = None  #любое обращение к хранилищу блоков упадёт
+    hot = [{"msg_id": "hot-0"}]
+
+    with patch.object(archive, "store", store), patch.object(archive.c, "ARCHIVE_ENABLED", False):
+        assert await archive.complete_page(None, "chat", hot, limit=4, offset=0) == hot
+
+
+def test_file_store_rejects_chat_id_outside_archive_dir(tmp_path):
+    file_store = archive.FileArchiveStore(str(tmp_path))
+    assert file_store._dir("5f0c9a3e-2b7d-4c41-9e0a-7b1f2c3d4e5f").startswith(str(tmp_path))
+    for bad in ("../x", "a/b", "", ".."):
+        with pytest.raises(ValueError):
+            file_store._dir(bad)
+
+
+@pytest.mark.asyncio
+async def test_flat_recovery_deletes_only_messages_of_last_block():
+    from unittest.mock import AsyncMock, MagicMock
+
+    store = _MemoryStore()
+    archived = _messages(0, 3)
+    await store.write_block(None, "chat", 0, archived)
+    #Сбой после записи блока: в горячих остались его сообщения и, возможно, новые с той же меткой времени
+
+    class _Cursor:
+        def sort(self, *args):
+            return self
+
+        def __aiter__(self):
+            async def gen():
+                for m in []:
+                    yield m
+            return gen()
+
+    client = MagicMock()
+    client.chats_msgs.find_one = AsyncMock(return_value={"_id": 1})
+    client.chats_msgs.find = MagicMock(return_value=_Cursor())
+    client.chats_msgs.delete_many = AsyncMock()
+
+    with patch.object(archive, "store", store), \
+         patch.object(archive, "block_cache", archive._BlockCache(8)), \
+         patch.object(archive.c, "MSG_STORAGE_LAYOUT", "flat"), \
+         patch.object(archive.c, "ARCHIVE_HOT_LIMIT", 0):
+        await archive.archive_chat(client, "chat", archived[0]["timestamp"])
+
+    query = client.chats_msgs.delete_many.await_args.args[0]
+    assert "timestamp" not in query
+    assert query == {"chat_id": "chat", "msg_id": {"$in": ["0", "1", "2"]}}
@@ -0,0 +1,117 @@
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import src.concts as c
+from db import attachments as Attachments
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=900-", (900, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=950-5000", (950, 999)),
+])
+def test_parse_range(header, expected):
+    assert Attachments.parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5-1", "bytes=0-1,5-6", "items=0-1", "bytes=-0"])
+def test_parse_range_rejects_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        Attachments.parse_range(header, 1000)
+
+
+async def _chunks(count, size):
+    for i in range(count):
+        yield bytes([i % 256]) * size
+
+
+@pytest.mark.asyncio
+async def test_file_store_streams_upload_and_range_download(tmp_path):
+    store = Attachments.FileAttachmentStore(str(tmp_path))
+    client = MagicMock()
+    client.attachments.insert_one = AsyncMock()
+
+    with patch.object(Attachments, "store", store), \
+         patch.dict(Attachments.STORES, {"file": store}), \
+         patch.object(c, "ATTACHMENT_CHUNK_SIZE", 64):
+        meta = await Attachments.save_attachment(client, _chunks(10, 100), "chat", 1, "a.bin", "application/octet-stream")
+        parts = [p async for p in Attachments.iter_content(client, meta, 150, 349)]
+
+    assert meta["length"] == 1000 and meta["backend"] == "file"
+    assert all(len(p) <= 64 for p in parts)
+    assert b"".join(parts) == bytes([1]) * 50 + bytes([2]) * 100 + bytes([3]) * 50
+    client.attachments.insert_one.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_oversized_upload_is_aborted_and_cleaned_up(tmp_path):
+    store = Attachments.FileAttachmentStore(str(tmp_path))
+    client = MagicMock()
+    client.attachments.insert_one = AsyncMock()
+
+    with patch.object(Attachments, "store", store), patch.object(c, "ATTACHMENT_MAX_BYTES", 250):
+        with pytest.raises(Attachments.AttachmentTooLarge):
+            await Attachments.save_attachment(client, _chunks(10, 100), "chat", 1, "a.bin", "x")
+
+    assert os.listdir(tmp_path) == []
+    client.attachments.insert_one.assert_not_awaited()
+
+
+@pytest.mark.parametrize("content_type,expected", [
+    ("image/png", ("image/png", "inline")),
+    ("Video/MP4; codecs=avc1", ("video/mp4", "inline")),
+    ("image/svg+xml", ("application/octet-stream", "attachment")),
+    ("text/html", ("application/octet-stream", "attachment")),
+    (None, ("application/octet-stream", "attachment")),
+])
+def test_served_type_inlines_only_safe_media(content_type, expected):
+    assert Attachments.served_type(content_type) == expected
+
+
+@pytest.mark.asyncio
+async def test_uploaded_html_is_served_as_download_with_nosniff(tmp_path):
+    import httpx
+    import main
+
+    saved = {}
+
+    async def insert_one(doc):
+        saved.update(doc)
+
+    async def whoami():
+        return MagicMock(user_id=1)
+
+    client = MagicMock()
+    client.attachments.insert_one = AsyncMock(side_effect=insert_one)
+    client.attachments.find_one = AsyncMock(side_effect=lambda *a, **k: dict(saved))
+    storage = MagicMock()
+    storage.name = "mongo"
+    storage.is_member = AsyncMock(return_value=True)
+    storage.get_member = AsyncMock(return_value={"user_id": 1})
+    store = Attachments.FileAttachmentStore(str(tmp_path))
+
+    main.app.dependency_overrides.update({
+        main.auth.whoami: whoami, main.get_mongo_db: lambda: client, main.get_storage: lambda: storage,
+    })
+    try:
+        with patch.object(Attachments, "store", store), patch.dict(Attachments.STORES, {"file": store}):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as ac:
+                up = await ac.post(
+                    c.PATH_PREFIX + "/wss/chats/chat/attachments", params={"filename": "x.html"},
+                    content=b"<script>alert(1)</script>", headers={"Content-Type": "text/html"},
+                )
+                url = c.PATH_PREFIX + f"/wss/attachments/{up.json()['attachment_id']}"
+                full = await ac.get(url)
+                part = await ac.get(url, headers={"Range": "bytes=0-7"})
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert up.status_code == 200
+    for resp in (full, part):
+        assert resp.headers["content-type"] == "application/octet-stream"
+        assert resp.headers["content-disposition"].startswith("attachment;")
+        assert resp.headers["x-content-type-options"] == "nosniff"
+    assert part.status_code == 206 and part.content == b"<script>"
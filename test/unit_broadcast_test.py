@@ -0,0 +1,47 @@
+import json
+import asyncio
+import pytest
+
+from src.broadcast import Outbox
+
+
+class _Socket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, frame):
+        self.sent.append(frame)
+
+
+@pytest.mark.asyncio
+async def test_outbox_direct_mode_sends_each_message():
+    ws = _Socket()
+    outbox = Outbox(ws, window=0, max_batch=10)
+    await outbox.send('{"content": "a"}')
+    await outbox.send('{"content": "b"}')
+    assert ws.sent == ['{"content": "a"}', '{"content": "b"}']
+
+
+@pytest.mark.asyncio
+async def test_outbox_coalesces_messages_within_window():
+    ws = _Socket()
+    outbox = Outbox(ws, window=0.01, max_batch=10)
+    for i in range(3):
+        await outbox.send(json.dumps({"content": str(i)}))
+    assert ws.sent == []
+
+    await asyncio.sleep(0.03)
+    assert len(ws.sent) == 1
+    frame = json.loads(ws.sent[0])
+    assert frame["type"] == "batch"
+    assert [m["content"] for m in frame["messages"]] == ["0", "1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_outbox_flushes_when_batch_is_full():
+    ws = _Socket()
+    outbox = Outbox(ws, window=10, max_batch=2)
+    await outbox.send('{"content": "a"}')
+    await outbox.send('{"content": "b"}')
+    assert len(ws.sent) == 1
+    outbox.close()
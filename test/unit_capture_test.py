@@ -0,0 +1,135 @@
+import json
+import pytest
+import httpx
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from src import capture
+from src.capture import Anonymizer, CaptureMiddleware
+from tools.replay_capture import Replayer, capture_chats, load_capture, percentile, route_label
+
+
+@pytest.fixture
+def capture_path(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    capture.start(str(path))
+    yield path
+    capture.stop()
+
+
+def _events(path):
+    capture.stop()
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(CaptureMiddleware)
+
+    @app.post("/wss/chats/{chat_id}/members")
+    async def add(chat_id: str, body: dict):
+        return {"ok": True}
+
+    @app.websocket("/wss/chat")
+    async def chat(websocket: WebSocket):
+        await websocket.accept()
+        frame = await websocket.receive_json()
+        await websocket.send_json({"type": "ack", "client_msg_id": frame["client_msg_id"]})
+        await websocket.close()
+
+    return app
+
+
+def test_anonymizer_is_stable_and_keeps_shape():
+    anon = Anonymizer(b"salt")
+    frame = {"type": "message", "chat_id": "c-1", "sender_id": 42, "content": "секрет", "resume_token": "t"}
+    out = anon.value(frame)
+    assert out == anon.value(dict(frame))
+    assert out["type"] == "message"
+    assert out["content"] == "xxxxxx"
+    assert isinstance(out["sender_id"], int) and out["sender_id"] != 42
+    assert out["chat_id"] != "c-1" and "resume_token" not in out
+    assert Anonymizer(b"other").value(frame)["chat_id"] != out["chat_id"]
+    assert anon.query(b"chat_id=c-1&after_seq=10&resume=abc") == f"chat_id={out['chat_id']}&after_seq=10"
+
+
+def test_http_request_is_recorded_with_route_template(capture_path):
+    client = TestClient(_app())
+    client.cookies.set("access_token", "tok")
+    response = client.post("/wss/chats/chat-1/members?limit=5", json={"username": "alice"})
+    assert response.status_code == 200
+
+    (event,) = _events(capture_path)
+    assert event["kind"] == "http" and event["status"] == 200
+    assert event["path"].startswith("/wss/chats/p") and event["path"].endswith("/members")
+    assert "chat-1" not in event["path"]
+    assert event["query"] == "limit=5"
+    assert event["body"]["username"] != "alice"
+    assert event["user"].startswith("u")
+    assert route_label(event) == "POST /wss/chats/{}/members"
+
+
+def test_websocket_frames_are_recorded(capture_path):
+    client = TestClient(_app())
+    with client.websocket_connect("/wss/chat?chat_id=c1") as ws:
+        ws.send_json({"type": "message", "content": "hello", "client_msg_id": "k1"})
+        ws.receive_json()
+
+    captured = _events(capture_path)
+    kinds = [e["kind"] for e in captured]
+    assert kinds[:3] == ["ws_open", "ws_in", "ws_out"]
+    assert "ws_close" in kinds
+    assert captured[1]["frame"]["content"] == "xxxxx"
+    assert captured[2]["type"] == "ack"
+    assert len({e["conn"] for e in captured}) == 1
+
+
+def test_load_capture_groups_connections(tmp_path):
+    path = tmp_path / "c.jsonl"
+    lines = [
+        {"t": 0.5, "kind": "ws_in", "conn": 1, "frame": {}},
+        {"t": 0.1, "kind": "ws_open", "conn": 1, "path": "/wss/chat"},
+        {"t": 0.2, "kind": "http", "conn": 2, "method": "GET", "path": "/health"},
+    ]
+    path.write_text("\n".join(json.dumps(l) for l in lines) + "\n")
+    connections = load_capture(str(path))
+    assert [e["kind"] for e in connections[1]] == ["ws_open", "ws_in"]
+    assert len(connections[2]) == 1
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([], 95) == 0.0
+
+
+def test_capture_chats_collects_users_per_chat():
+    connections = {
+        1: [{"kind": "ws_open", "user": "u1", "path": "/wss/chat", "query": "chat_id=p0123456789abcdef"}],
+        2: [{"kind": "http", "user": "u2", "method": "GET", "path": "/wss/chats/p0123456789abcdef/messages", "query": ""}],
+        3: [{"kind": "http", "user": "u3", "method": "GET", "path": "/wss/chats/pfedcba9876543210/members", "query": ""}],
+        4: [{"kind": "http", "user": None, "method": "GET", "path": "/health", "query": ""}],
+    }
+    chats = capture_chats(connections)
+    assert chats == {
+        "p0123456789abcdef": {"users": {"u1", "u2"}, "group": False},
+        "pfedcba9876543210": {"users": {"u3"}, "group": True},
+    }
+
+
+@pytest.mark.asyncio
+async def test_replay_http_keeps_rejections_out_of_latency_stats():
+    replayer = Replayer("http://test", 50, {}, None)
+    await replayer.http.aclose()
+    replayer.http = httpx.AsyncClient(
+        base_url="http://test",
+        transport=httpx.MockTransport(lambda r: httpx.Response(404 if "missing" in r.url.path else 200)),
+    )
+    for path in ("/wss/chats/ok/messages", "/wss/chats/missing/messages"):
+        await replayer.replay_http({"t": 0, "method": "GET", "path": path})
+    await replayer.http.aclose()
+
+    assert sum(len(v) for v in replayer.stats.latencies.values()) == 1
+    assert sum(replayer.stats.errors.values()) == 1
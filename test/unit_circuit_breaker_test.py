@@ -0,0 +1,78 @@
+import asyncio
+import pytest
+
+from src import circuit_breaker as cb
+
+
+async def _ok():
+    return "ok"
+
+
+async def _fail():
+    raise cb.UpstreamError("boom")
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = cb.CircuitBreaker("test-open", failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(cb.UpstreamError):
+            await breaker.call(_fail, timeout=1)
+
+    assert breaker.state == cb.OPEN
+    with pytest.raises(cb.CircuitOpenError):
+        await breaker.call(_ok, timeout=1)
+    assert cb.breaker_state.value(upstream="test-open") == 2
+
+
+@pytest.mark.asyncio
+async def test_breaker_half_open_probe_closes_on_success():
+    breaker = cb.CircuitBreaker("test-probe", failure_threshold=1, reset_timeout=0)
+    with pytest.raises(cb.UpstreamError):
+        await breaker.call(_fail, timeout=1)
+
+    assert breaker.state == cb.HALF_OPEN
+    assert await breaker.call(_ok, timeout=1) == "ok"
+    assert breaker.state == cb.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_breaker_respects_latency_budget():
+    breaker = cb.CircuitBreaker("test-budget", failure_threshold=5, reset_timeout=60)
+    token = cb.set_budget(0.05)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await breaker.call(asyncio.sleep, 1, timeout=10)
+        await asyncio.sleep(0.06)
+        with pytest.raises(cb.BudgetExhaustedError):
+            await breaker.call(_ok, timeout=10)
+    finally:
+        cb.reset_budget(token)
+
+
+@pytest.mark.asyncio
+async def test_budget_bound_timeout_does_not_count_as_failure():
+    breaker = cb.CircuitBreaker("test-budget-timeout", failure_threshold=1, reset_timeout=60)
+    token = cb.set_budget(0.02)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await breaker.call(asyncio.sleep, 1, timeout=10)
+    finally:
+        cb.reset_budget(token)
+
+    assert breaker.state == cb.CLOSED
+    assert cb.breaker_calls.value(upstream="test-budget-timeout", outcome="budget_timeout") == 1
+    with pytest.raises(asyncio.TimeoutError):
+        await breaker.call(asyncio.sleep, 1, timeout=0.01)
+    assert breaker.state == cb.OPEN
+
+
+@pytest.mark.asyncio
+async def test_blacklist_cache_miss_in_degraded_mode_is_unknown_not_blocked(monkeypatch):
+    from src import blacklist
+
+    monkeypatch.setattr(blacklist.c, "BLACKLIST_DEGRADED_MODE", "cache")
+    result = blacklist._degraded(("token", "nobody-cached"))
+    assert blacklist.is_unknown(result)
+    assert not result["blocked_by_user"] and not result["you_blocked_user"]
+    assert blacklist.is_unknown(False) and not blacklist.is_unknown({"blocked_by_user": True})
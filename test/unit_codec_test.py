@@ -0,0 +1,87 @@
+import json
+import asyncio
+import msgpack
+import pytest
+
+from schemas.frames import parse_frame
+from src.broadcast import Outbox
+from src.codec import JSON, MSGPACK
+
+
+class _Socket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_bytes(self, frame):
+        self.sent.append(frame)
+
+
+def test_msgpack_roundtrip():
+    obj = {"type": "ack", "client_msg_id": "k1", "msg_id": "m", "seq": 7, "duplicate": False}
+    assert MSGPACK.decode(MSGPACK.encode(obj)) == obj
+
+
+def test_msgpack_decode_rejects_text_and_garbage():
+    with pytest.raises(ValueError):
+        MSGPACK.decode('{"content": "a"}')
+    with pytest.raises(ValueError):
+        MSGPACK.decode(b"\xc1")
+    #Ключи словаря — только строки
+    with pytest.raises(ValueError):
+        MSGPACK.decode(msgpack.packb({1: "a"}))
+
+
+def test_strict_parse_rejects_coercion():
+    data = {"type": "message", "chat_id": "c1", "sender_id": "5", "content": "hi"}
+    assert parse_frame(dict(data)).sender_id == 5
+    with pytest.raises(ValueError):
+        parse_frame(dict(data), strict=True)
+    assert parse_frame({**data, "sender_id": 5}, strict=True).sender_id == 5
+
+
+def test_msgpack_batch_matches_packed_object():
+    messages = [{"content": str(i)} for i in range(20)]
+    frame = MSGPACK.batch([MSGPACK.encode(m) for m in messages])
+    assert msgpack.unpackb(frame) == {"type": "batch", "messages": messages}
+
+
+def test_json_batch_is_valid_json():
+    frame = JSON.batch([JSON.encode({"content": "a"}), JSON.encode({"content": "b"})])
+    assert json.loads(frame) == {"type": "batch", "messages": [{"content": "a"}, {"content": "b"}]}
+
+
+@pytest.mark.asyncio
+async def test_outbox_with_msgpack_codec_sends_binary_batches():
+    ws = _Socket()
+    outbox = Outbox(ws, window=0.01, max_batch=10, codec=MSGPACK)
+    for i in range(3):
+        await outbox.send(MSGPACK.encode({"content": str(i)}))
+    await asyncio.sleep(0.03)
+    assert len(ws.sent) == 1
+    assert [m["content"] for m in msgpack.unpackb(ws.sent[0])["messages"]] == ["0", "1", "2"]
+
+
+class _TextSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, frame):
+        self.sent.append(frame)
+
+
+@pytest.mark.asyncio
+async def test_broadcast_encodes_per_connection_codec():
+    from src import broadcast
+
+    text_ws, binary_ws = _TextSocket(), _Socket()
+    broadcast.register(text_ws)
+    broadcast.register(binary_ws, codec=MSGPACK)
+    try:
+        await broadcast.broadcast([text_ws, binary_ws], {"content": "hi", "seq": 1})
+        await broadcast.send_to(binary_ws, {"type": "ack", "seq": 1})
+    finally:
+        broadcast.unregister(text_ws)
+        broadcast.unregister(binary_ws)
+
+    assert json.loads(text_ws.sent[0]) == {"content": "hi", "seq": 1}
+    assert [msgpack.unpackb(f) for f in binary_ws.sent] == [{"content": "hi", "seq": 1}, {"type": "ack", "seq": 1}]
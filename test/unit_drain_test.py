@@ -0,0 +1,60 @@
+import json
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import src.concts as c
+from schemas.user import WhoAmI
+from src import drain, resume
+
+
+@pytest.fixture(autouse=True)
+def _secret():
+    with patch.object(c, "RESUME_TOKEN_SECRET", "test-secret"):
+        yield
+
+
+def test_resume_token_roundtrip_is_bound_to_chat_and_expires():
+    user = WhoAmI(user_id=7, username="bob", avatar="")
+    token = resume.issue_token(user, "chat-1", now=1000)
+
+    assert resume.verify_token(token, "chat-1", now=1001) == user
+    assert resume.verify_token(token, "chat-2", now=1001) is None
+    assert resume.verify_token(token, "chat-1", now=1000 + c.RESUME_TOKEN_TTL + 1) is None
+
+
+def test_resume_token_rejects_tampering():
+    token = resume.issue_token(WhoAmI(user_id=7, username="bob"), "chat-1", now=1000)
+    payload, signature = token.split(".")
+    forged = resume._b64encode(resume._b64decode(payload).replace(b'"u":7', b'"u":1')) + "." + signature
+
+    assert resume.verify_token(forged, "chat-1", now=1001) is None
+    assert resume.verify_token("garbage", "chat-1") is None
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_inflight_and_sends_jittered_reconnect(monkeypatch):
+    monkeypatch.setattr(drain, "_draining", False)
+    ws = MagicMock()
+    ws.send_text, ws.close = AsyncMock(), AsyncMock()
+    drain.track(ws, WhoAmI(user_id=7, username="bob"), "chat-1")
+    finished = []
+
+    async def handler():
+        async with drain.inflight():
+            await asyncio.sleep(0.05)
+            finished.append(True)
+
+    task = asyncio.create_task(handler())
+    await asyncio.sleep(0)
+    closed = await drain.drain()
+    await task
+
+    assert drain.is_draining()
+    assert closed == 1 and finished == [True]
+    frame = json.loads(ws.send_text.await_args[0][0])
+    assert frame["type"] == "reconnect"
+    assert c.DRAIN_RECONNECT_MIN_MS <= frame["after_ms"] <= c.DRAIN_RECONNECT_MAX_MS
+    assert resume.verify_token(frame["resume_token"], "chat-1").user_id == 7
+    ws.close.assert_awaited_with(code=1012, reason="Service restart")
+    drain.untrack(ws)
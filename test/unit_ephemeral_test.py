@@ -0,0 +1,75 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+import src.concts as c
+from src import ephemeral
+from schemas.frames import MessageFrame, ReadFrame, TypingFrame, parse_frame
+
+
+def test_parse_frame_defaults_to_message_and_rejects_unknown_types():
+    assert isinstance(parse_frame({"content": "hi"}), MessageFrame)
+    assert isinstance(parse_frame({"type": "typing"}), TypingFrame)
+    with pytest.raises(ValueError):
+        parse_frame({"type": "shout"})
+    with pytest.raises(ValueError):
+        parse_frame({"type": "read", "seq": -1})
+
+
+def test_throttle_drops_repeats_but_passes_state_changes():
+    throttle = ephemeral.EventThrottle()
+    assert throttle.allow("typing", (True,), now=100.0)
+    assert not throttle.allow("typing", (True,), now=100.5)
+    assert not throttle.allow("typing", (False,), now=100.0 + c.WS_EPHEMERAL_MIN_GAP / 2)
+    assert throttle.allow("typing", (False,), now=101.0)
+    assert throttle.allow("typing", (False,), now=101.0 + c.WS_TYPING_INTERVAL)
+
+
+@pytest.mark.asyncio
+async def test_handle_fans_out_to_others_without_touching_storage():
+    sender, other = MagicMock(), MagicMock()
+    sender.send_text, other.send_text = AsyncMock(), AsyncMock()
+    throttle = ephemeral.EventThrottle()
+
+    sent = await ephemeral.handle(throttle, [sender, other], sender, "c1", 7, ReadFrame(type="read", seq=42))
+    again = await ephemeral.handle(throttle, [sender, other], sender, "c1", 7, ReadFrame(type="read", seq=42))
+
+    assert sent is True and again is False
+    sender.send_text.assert_not_awaited()
+    other.send_text.assert_awaited_once()
+    event = json.loads(other.send_text.await_args[0][0])
+    assert event == {"type": "read", "seq": 42, "chat_id": "c1", "user_id": 7}
+
+
+@pytest.mark.asyncio
+async def test_state_change_within_gap_is_sent_when_gap_expires(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(c, "WS_EPHEMERAL_MIN_GAP", 0.05)
+    sender, other = MagicMock(), MagicMock()
+    sender.send_text, other.send_text = AsyncMock(), AsyncMock()
+    throttle = ephemeral.EventThrottle()
+
+    assert await ephemeral.handle(throttle, [sender, other], sender, "c1", 7, TypingFrame(type="typing", state=True))
+    assert not await ephemeral.handle(throttle, [sender, other], sender, "c1", 7, TypingFrame(type="typing", state=False))
+    assert other.send_text.await_count == 1
+
+    await asyncio.sleep(0.1)
+    assert other.send_text.await_count == 2
+    assert json.loads(other.send_text.await_args[0][0])["state"] is False
+
+
+@pytest.mark.asyncio
+async def test_change_reverted_within_gap_is_not_sent(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(c, "WS_EPHEMERAL_MIN_GAP", 0.05)
+    sender, other = MagicMock(), MagicMock()
+    sender.send_text, other.send_text = AsyncMock(), AsyncMock()
+    throttle = ephemeral.EventThrottle()
+
+    for state in (True, False, True):
+        await ephemeral.handle(throttle, [sender, other], sender, "c1", 7, TypingFrame(type="typing", state=state))
+    await asyncio.sleep(0.1)
+
+    other.send_text.assert_awaited_once()
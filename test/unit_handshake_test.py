@@ -0,0 +1,109 @@
+import time
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import src.handshake as handshake
+from schemas import message as MsgModel
+from schemas.user import WhoAmI
+
+ME = WhoAmI(user_id=1, username="alice", avatar="")
+DIRECT = MsgModel.Chats(chat_id="c1", chat_type="simple", chat_name=None, members=[
+    MsgModel.Members(user_id=1, user_name="alice", avatar=""),
+    MsgModel.Members(user_id=2, user_name="bob", avatar=""),
+])
+
+
+def _websocket(resumed: bool = False):
+    state = SimpleNamespace(resumed=True) if resumed else SimpleNamespace()
+    return SimpleNamespace(state=state, cookies={})
+
+
+def _delayed(value, delay: float):
+    async def call(*args, **kwargs):
+        await asyncio.sleep(delay)
+        return value
+    return call
+
+
+@pytest.mark.asyncio
+async def test_auth_and_chat_lookup_run_concurrently():
+    storage = SimpleNamespace(get_chat_info=_delayed(DIRECT, 0.1))
+    with patch("src.handshake.auth.whoami_socket", new=_delayed(ME, 0.1)), \
+         patch("src.handshake.check_user_blocked_by_username", new=_delayed({"blocked_by_user": False}, 0.05)):
+        started = time.perf_counter()
+        user = await handshake.authorize(_websocket(), storage, "c1")
+        elapsed = time.perf_counter() - started
+
+    assert user == ME
+    assert elapsed < 0.2
+    assert handshake.handshake_stage_seconds.count(stage="blacklist") >= 1
+
+
+@pytest.mark.asyncio
+async def test_missing_chat_cancels_pending_auth():
+    cancelled = asyncio.Event()
+
+    async def slow_whoami(websocket):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    storage = SimpleNamespace(get_chat_info=AsyncMock(return_value=None))
+    rejected = handshake.handshake_rejected.value(reason="chat_not_found")
+    with patch("src.handshake.auth.whoami_socket", new=slow_whoami):
+        with pytest.raises(handshake.HandshakeRejected) as exc:
+            await handshake.authorize(_websocket(), storage, "missing")
+        await asyncio.sleep(0)
+
+    assert (exc.value.code, exc.value.reason) == (1011, "Chat not found in DB")
+    assert cancelled.is_set()
+    assert handshake.handshake_rejected.value(reason="chat_not_found") == rejected + 1
+
+
+@pytest.mark.asyncio
+async def test_resumed_session_skips_chat_and_blacklist_checks():
+    storage = SimpleNamespace(get_chat_info=_delayed(None, 1))
+    check = AsyncMock()
+    with patch("src.handshake.auth.whoami_socket", new=AsyncMock(return_value=ME)), \
+         patch("src.handshake.check_user_blocked_by_username", new=check):
+        assert await handshake.authorize(_websocket(resumed=True), storage, "c1") == ME
+    check.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_rejections_for_unauthenticated_non_member_and_blocked():
+    storage = SimpleNamespace(get_chat_info=AsyncMock(return_value=DIRECT))
+    cases = [
+        (WhoAmI(), {}, 1008, "not_authenticated"),
+        (WhoAmI(user_id=3, username="eve"), {}, 1008, "not_member"),
+        (ME, {"you_blocked_user": True}, 1011, "blocked"),
+    ]
+    for user, blocked, code, label in cases:
+        with patch("src.handshake.auth.whoami_socket", new=AsyncMock(return_value=user)), \
+             patch("src.handshake.check_user_blocked_by_username", new=AsyncMock(return_value=blocked)):
+            with pytest.raises(handshake.HandshakeRejected) as exc:
+                await handshake.authorize(_websocket(), storage, "c1")
+        assert (exc.value.code, exc.value.label) == (code, label)
+
+
+@pytest.mark.asyncio
+async def test_dependency_errors_and_unknown_blacklist_reject_with_1011():
+    failing = SimpleNamespace(get_chat_info=AsyncMock(side_effect=RuntimeError("mongo down")))
+    with patch("src.handshake.auth.whoami_socket", new=_delayed(ME, 1)):
+        with pytest.raises(handshake.HandshakeRejected) as exc:
+            await handshake.authorize(_websocket(), failing, "c1")
+    assert (exc.value.code, exc.value.label) == (1011, "error")
+
+    storage = SimpleNamespace(get_chat_info=AsyncMock(return_value=DIRECT))
+    unknown = {"blocked_by_user": False, "you_blocked_user": False, "unknown": True}
+    for result in (False, unknown):
+        with patch("src.handshake.auth.whoami_socket", new=AsyncMock(return_value=ME)), \
+             patch("src.handshake.check_user_blocked_by_username", new=AsyncMock(return_value=result)):
+            with pytest.raises(handshake.HandshakeRejected) as exc:
+                await handshake.authorize(_websocket(), storage, "c1")
+        assert (exc.value.code, exc.value.label) == (1011, "blacklist_unavailable")
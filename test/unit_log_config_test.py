@@ -0,0 +1,50 @@
+import json
+import logging
+
+from src import log_config
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def _record(name, level=logging.INFO, msg="m %s", args=(1,)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_sampling_keeps_every_nth_info_and_all_warnings():
+    f = log_config.SamplingFilter(log_config.parse_sampling("db.mongo=0.25, other=0"))
+
+    kept = sum(f.filter(_record("db.mongo")) for _ in range(100))
+    assert kept == 25
+    assert all(f.filter(_record("db.mongo", logging.WARNING)) for _ in range(10))
+    assert not f.filter(_record("other"))
+    assert f.filter(_record("main"))
+
+
+def test_lazy_queue_handler_resolves_args_but_defers_formatting():
+    handler = log_config.LazyQueueHandler(None)
+    state = {"n": 1}
+    record = _record("db.mongo", msg="m %s", args=(state,))
+    assert handler.prepare(record) is record
+    state["n"] = 2
+    assert record.args is None and record.getMessage() == "m {'n': 1}"
+    assert not hasattr(record, "message")
+
+
+def test_pipeline_writes_json_in_background_and_flushes_on_shutdown():
+    target = _Collect()
+    log_config.setup_logging(level="INFO", fmt="json", sampling="", target=target)
+    try:
+        logging.getLogger("db.mongo").info("Сообщение добавлено: %s", "m-1", extra={"chat_id": "c1"})
+    finally:
+        log_config.shutdown_logging()
+
+    entry = json.loads(target.lines[-1])
+    assert entry["msg"] == "Сообщение добавлено: m-1"
+    assert entry["logger"] == "db.mongo" and entry["chat_id"] == "c1"
@@ -0,0 +1,42 @@
+import time
+import asyncio
+
+import pytest
+
+from src.loop_monitor import LoopMonitor, loop_lag, loop_stalls
+
+
+def _blocking_call():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_stall_captures_stack_of_blocking_call():
+    monitor = LoopMonitor(interval=0.02, threshold=0.1)
+    stalls_before = loop_stalls.value()
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        _blocking_call()
+        await asyncio.sleep(0.05)
+    finally:
+        monitor.stop()
+
+    assert loop_stalls.value() == stalls_before + 1
+    assert len(monitor.stalls) == 1
+    assert "_blocking_call" in monitor.stalls[0]["stack"]
+    assert "time.sleep" in monitor.stalls[0]["stack"]
+
+
+@pytest.mark.asyncio
+async def test_lag_is_observed_without_stalls_on_idle_loop():
+    monitor = LoopMonitor(interval=0.01, threshold=0.2)
+    observed = loop_lag.count()
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+    finally:
+        monitor.stop()
+
+    assert loop_lag.count() > observed
+    assert not monitor.stalls
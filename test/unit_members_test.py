@@ -0,0 +1,61 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from db import members as ChatMembers
+
+
+@pytest.mark.asyncio
+async def test_is_member_uses_point_lookup_for_group_chats():
+    client = MagicMock()
+    client.chats_info.find_one = AsyncMock(return_value={"chat_id": "g1", "chat_type": "group"})
+    client.chat_members.find_one = AsyncMock(return_value={"user_id": 7, "role": "member"})
+
+    assert await ChatMembers.is_member(client, "g1", 7) is True
+    filter_, projection = client.chats_info.find_one.call_args[0]
+    assert projection["members"] == {"$elemMatch": {"user_id": 7}}
+    assert client.chat_members.find_one.call_args[0][0] == {"chat_id": "g1", "user_id": 7}
+
+
+@pytest.mark.asyncio
+async def test_is_member_for_simple_chat_reads_embedded_match_only():
+    client = MagicMock()
+    client.chats_info.find_one = AsyncMock(return_value={"chat_type": "simple", "members": []})
+    client.chat_members.find_one = AsyncMock()
+
+    assert await ChatMembers.is_member(client, "s1", 3) is False
+    client.chat_members.find_one.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_add_and_remove_member_keep_counter_in_sync():
+    client = MagicMock()
+    client.chat_members.update_one = AsyncMock(side_effect=[
+        MagicMock(upserted_id="x"), MagicMock(upserted_id=None)
+    ])
+    client.chat_members.delete_one = AsyncMock(return_value=MagicMock(deleted_count=1))
+    client.chats_info.update_one = AsyncMock()
+    member = {"user_id": 5, "user_name": "bob", "avatar": ""}
+
+    assert await ChatMembers.add_member(client, "g1", member) is True
+    assert await ChatMembers.add_member(client, "g1", member) is False
+    assert await ChatMembers.remove_member(client, "g1", 5) is True
+
+    incs = [call.args[1]["$inc"]["member_count"] for call in client.chats_info.update_one.await_args_list]
+    assert incs == [1, -1]
+
+
+@pytest.mark.asyncio
+async def test_list_members_returns_keyset_cursor():
+    docs = [{"user_id": i, "user_name": f"u{i}", "avatar": "", "role": "member"} for i in (2, 4, 6)]
+    cursor = MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.limit.return_value = cursor
+    cursor.to_list = AsyncMock(return_value=docs)
+    client = MagicMock()
+    client.chat_members.find.return_value = cursor
+
+    page = await ChatMembers.list_members(client, "g1", limit=2, after_user_id=1)
+
+    assert client.chat_members.find.call_args[0][0] == {"chat_id": "g1", "user_id": {"$gt": 1}}
+    assert [m["user_id"] for m in page["members"]] == [2, 4]
+    assert page["next_after"] == 4
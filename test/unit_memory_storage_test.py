@@ -0,0 +1,98 @@
+import pytest
+from unittest.mock import MagicMock
+
+from db.memory_storage import MemoryStorage
+from db.storage import MongoStorage, create_storage
+
+ALICE = {"user_id": 1, "user_name": "alice", "avatar": ""}
+BOB = {"user_id": 2, "user_name": "bob", "avatar": "b.png"}
+CAROL = {"user_id": 3, "user_name": "carol", "avatar": ""}
+
+
+def test_create_storage_selects_backend():
+    assert isinstance(create_storage(MagicMock(), "memory"), MemoryStorage)
+    assert isinstance(create_storage(MagicMock(), "mongo"), MongoStorage)
+
+
+@pytest.mark.asyncio
+async def test_direct_chats_are_found_by_member_pair():
+    storage = MemoryStorage()
+    await storage.add_members_to_chat("c1", **ALICE)
+    chat = await storage.add_members_to_chat("c1", **BOB)
+
+    assert [m.user_id for m in chat.members] == [1, 2]
+    assert await storage.get_chat_id(2, 1) == "c1"
+    assert await storage.get_chat_id(1, 3) is None
+    assert await storage.is_member("c1", 2) is True
+    assert await storage.is_member("c1", 3) is False
+
+    created = await storage.create_chats_bulk(ALICE, [CAROL])
+    assert await storage.get_chat_ids_bulk(1, [2, 3, 4]) == {2: "c1", 3: created[3]}
+    assert set(await storage.get_chats_info_bulk(["c1", created[3], "missing"])) == {"c1", created[3]}
+    assert {c.chat_id for c in await storage.get_user_chats(1)} == {"c1", created[3]}
+
+
+@pytest.mark.asyncio
+async def test_group_members_are_paged_by_user_id():
+    storage = MemoryStorage()
+    chat_id = await storage.create_group_chat("team", CAROL, [BOB, ALICE])
+
+    page = await storage.list_members(chat_id, 2)
+    assert [m["user_id"] for m in page["members"]] == [1, 2]
+    assert page["next_after"] == 2
+    page = await storage.list_members(chat_id, 2, page["next_after"])
+    assert [m["role"] for m in page["members"]] == ["owner"]
+    assert page["next_after"] is None
+
+    assert await storage.add_member(chat_id, ALICE) is False
+    assert await storage.remove_member(chat_id, 2) is True
+    assert await storage.is_member(chat_id, 2) is False
+    info = await storage.get_chat_info(chat_id)
+    assert (info.chat_type, info.member_count) == ("group", 2)
+    assert chat_id not in await storage.user_chat_ids(2)
+
+
+@pytest.mark.asyncio
+async def test_add_message_is_idempotent_by_client_key():
+    storage = MemoryStorage()
+    first = await storage.add_message("c1", 1, "hi", client_msg_id="k1")
+    again = await storage.add_message("c1", 1, "hi", client_msg_id="k1")
+    other = await storage.add_message("c1", 2, "hi", client_msg_id="k1")
+
+    assert again["duplicate"] is True and again["msg_id"] == first["msg_id"]
+    assert (first["seq"], other["seq"]) == (1, 2)
+    assert len(await storage.get_messages("c1", 10, 0)) == 2
+
+
+@pytest.mark.asyncio
+async def test_history_pages_are_newest_first():
+    storage = MemoryStorage()
+    for i in range(5):
+        await storage.add_message("c1", 1, f"m{i}")
+
+    assert [m["seq"] for m in await storage.get_messages("c1", 2, 0)] == [5, 4]
+    assert [m["seq"] for m in await storage.get_messages("c1", 2, 4)] == [1]
+    assert await storage.get_messages("c1", 2, 10) == []
+    assert await storage.get_messages("missing", 2, 0) == []
+
+
+@pytest.mark.asyncio
+async def test_delta_sync_reports_trimmed_history():
+    storage = MemoryStorage(max_messages=4)
+    for i in range(6):
+        await storage.add_message("c1", 1, f"m{i}", client_msg_id=f"k{i}")
+
+    delta = await storage.get_messages_after("c1", 2, 3)
+    assert [m["seq"] for m in delta["messages"]] == [3, 4, 5]
+    assert (delta["last_seq"], delta["has_more"], delta["truncated"]) == (5, True, False)
+
+    #Шестое сообщение превысило лимит с запасом: в памяти остались seq 3..6
+    delta = await storage.get_messages_after("c1", 0, 10)
+    assert [m["seq"] for m in delta["messages"]] == [3, 4, 5, 6]
+    assert delta["truncated"] is True
+    #Ключи вытесненных сообщений забыты, ключи оставшихся — нет
+    assert "duplicate" not in await storage.add_message("c1", 1, "m0", client_msg_id="k0")
+    assert (await storage.add_message("c1", 1, "m5", client_msg_id="k5"))["duplicate"] is True
+
+    empty = await storage.get_messages_after("missing", 7, 10)
+    assert (empty["messages"], empty["last_seq"], empty["truncated"]) == ([], 7, False)
@@ -0,0 +1,147 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from db import mongo_buckets
+
+
+def _bucket_collection(chat_id: str, total: int, size: int):
+    """Фейковая коллекция корзин с сообщениями 0..total-1."""
+    docs = []
+    for b in range((total + size - 1) // size):
+        msgs = [{"msg_id": str(i)} for i in range(b * size, min((b + 1) * size, total))]
+        docs.append({"chat_id": chat_id, "bucket": b, "count": len(msgs), "messages": msgs})
+
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value=docs[-1])
+
+    def find(query, *args, **kwargs):
+        wanted = set(query["bucket"]["$in"])
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(return_value=[d for d in docs if d["bucket"] in wanted])
+        collection.requested = sorted(wanted)
+        return cursor
+
+    collection.find = find
+    return collection
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("offset,limit,expected", [
+    (0, 3, ["9", "8", "7"]),
+    (2, 4, ["7", "6", "5", "4"]),
+    (8, 5, ["1", "0"]),
+    (10, 5, []),
+])
+async def test_get_messages_page_reads_newest_first(offset, limit, expected):
+    client = MagicMock()
+    client.chats_msgs_buckets = _bucket_collection("chat", total=10, size=4)
+
+    with patch.object(mongo_buckets.c, "MSG_BUCKET_SIZE", 4):
+        page = await mongo_buckets.get_messages_page(client, "chat", limit, offset)
+
+    assert [m["msg_id"] for m in page] == expected
+    assert all(m["chat_id"] == "chat" for m in page)
+
+
+@pytest.mark.asyncio
+async def test_get_messages_page_touches_at_most_two_buckets():
+    client = MagicMock()
+    client.chats_msgs_buckets = _bucket_collection("chat", total=1000, size=200)
+
+    with patch.object(mongo_buckets.c, "MSG_BUCKET_SIZE", 200):
+        page = await mongo_buckets.get_messages_page(client, "chat", 50, 180)
+
+    assert len(page) == 50
+    assert client.chats_msgs_buckets.requested == [3, 4]
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for d in self.docs:
+            yield dict(d)
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if isinstance(cond, dict):
+            if not doc.get(key, 0) > cond["$gt"]:
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class _Collection:
+    """Коллекция в памяти с операциями, нужными переносу в корзины."""
+
+    def __init__(self, docs=()):
+        self.docs = [dict(d) for d in docs]
+
+    def find(self, query, projection=None):
+        return _Cursor([d for d in self.docs if _matches(d, query)])
+
+    async def insert_many(self, docs, ordered=True):
+        self.docs.extend(dict(d) for d in docs)
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+
+    async def update_many(self, query, update):
+        for d in self.docs:
+            if _matches(d, query):
+                d.update(update["$set"])
+
+
+@pytest.mark.asyncio
+async def test_migrate_chat_keeps_bucket_only_messages_and_unlocks():
+    source = [{"chat_id": "chat", "msg_id": str(i), "seq": i, "timestamp": i} for i in range(1, 6)]
+    live = {
+        "chat_id": "chat", "bucket": 1, "count": 2, "last_seq": 7,
+        "messages": [{"msg_id": "5", "seq": 5, "timestamp": 5}, {"msg_id": "7", "seq": 7, "timestamp": 7}],
+    }
+    client = MagicMock()
+    client.chats_msgs = _Collection(source)
+    client.chats_msgs_buckets = _Collection([live, {"chat_id": "chat:migrating", "bucket": 0, "messages": []}])
+    client.chats_seq.update_one = AsyncMock()
+
+    with patch.object(mongo_buckets.c, "MSG_BUCKET_SIZE", 2):
+        migrated = await mongo_buckets.migrate_chat(client, "chat", batch_size=1)
+
+    buckets = sorted(client.chats_msgs_buckets.docs, key=lambda d: d["bucket"])
+    assert migrated == 6
+    assert {d["chat_id"] for d in buckets} == {"chat"}
+    assert [m["msg_id"] for d in buckets for m in d["messages"]] == ["1", "2", "3", "4", "5", "7"]
+    assert [d["count"] for d in buckets] == [2, 2, 2]
+    assert "$unset" in client.chats_seq.update_one.await_args_list[-1].args[1]
+
+
+@pytest.mark.asyncio
+async def test_wait_unlocked_times_out_while_chat_is_migrating():
+    client = MagicMock()
+    client.chats_seq.find_one = AsyncMock(return_value={"migrating_until": 1e12})
+
+    with patch.object(mongo_buckets.c, "MSG_MIGRATION_WAIT", 0.1):
+        with pytest.raises(TimeoutError):
+            await mongo_buckets.wait_unlocked(client, "chat", 1e12)
+
+
+@pytest.mark.asyncio
+async def test_find_by_client_msg_id_filters_by_sender():
+    client = MagicMock()
+    client.chats_msgs_buckets.find_one = AsyncMock(return_value={"messages": [{"msg_id": "m", "seq": 3}]})
+
+    found = await mongo_buckets.find_by_client_msg_id(client, "chat", 2, "k-1")
+
+    query = client.chats_msgs_buckets.find_one.await_args.args[0]
+    assert query == {"chat_id": "chat", "messages": {"$elemMatch": {"client_msg_id": "k-1", "sender_id": 2}}}
+    assert found == {"msg_id": "m", "seq": 3, "chat_id": "chat"}
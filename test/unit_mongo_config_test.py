@@ -0,0 +1,35 @@
+from unittest.mock import MagicMock
+
+from pymongo.read_preferences import SecondaryPreferred
+from pymongo.write_concern import WriteConcern
+
+from db import mongo_config
+from db.mongo_config import MongoClientSettings, OperationProfile
+
+
+def test_default_profile_returns_collection_untouched():
+    db = MagicMock()
+    mongo_config.configure_profile("chat_list", OperationProfile())
+    assert mongo_config.profiled(db, "chats_info", "chat_list") is db.chats_info
+    db.chats_info.with_options.assert_not_called()
+
+
+def test_configured_profile_applies_read_and_write_options(monkeypatch):
+    monkeypatch.setenv("MONGO_PROFILE_HISTORY_READ_READ_PREFERENCE", "secondaryPreferred")
+    monkeypatch.setenv("MONGO_PROFILE_HISTORY_READ_MAX_STALENESS", "120")
+    monkeypatch.setenv("MONGO_PROFILE_HISTORY_READ_W", "majority")
+    profile = OperationProfile.from_env("history_read")
+
+    options = profile.collection_options()
+    assert isinstance(options["read_preference"], SecondaryPreferred)
+    assert options["read_preference"].max_staleness == 120
+    assert options["write_concern"] == WriteConcern(w="majority")
+
+
+def test_client_settings_only_pass_configured_options(monkeypatch):
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "50")
+    monkeypatch.setenv("MONGO_COMPRESSORS", "zlib")
+    kwargs = MongoClientSettings.from_env().client_kwargs()
+    assert kwargs["maxPoolSize"] == 50
+    assert kwargs["compressors"] == "zlib"
+    assert "socketTimeoutMS" not in kwargs
@@ -1,6 +1,6 @@
 # tests/unit/test_mongo.py
 import pytest
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 from datetime import datetime, timezone, timedelta
 
@@ -73,3 +73,124 @@ async def test_get_chat_id_filters_by_members_and_type():
     mock_collection.find_one.assert_awaited_with(
         {"members.user_id": {"$all": [2, 1]}, "chat_type": "simple"}
     )
+
+
+@pytest.mark.asyncio
+async def test_get_chat_ids_bulk_maps_partner_to_chat():
+    docs = [
+        {"chat_id": "chat-2", "members": [{"user_id": 1}, {"user_id": 2}]},
+        {"chat_id": "chat-3", "members": [{"user_id": 3}, {"user_id": 1}]},
+    ]
+    cursor = AsyncMock()
+    cursor.to_list = AsyncMock(return_value=docs)
+    mock_collection = AsyncMock()
+    mock_collection.find = lambda *args, **kwargs: cursor
+    mock_client = AsyncMock()
+    mock_client.chats_info = mock_collection
+
+    found = await MongoDB.get_chat_ids_bulk(mock_client, current_id=1, user_ids=[2, 3, 4])
+    assert found == {2: "chat-2", 3: "chat-3"}
+
+
+@pytest.mark.asyncio
+async def test_get_messages_after_returns_delta_in_seq_order():
+    chat_id = "9af4e8dd-8954-4972-b9db-ebfb44f2371e"
+    ts = datetime.now(timezone.utc)
+    docs = [
+        {"msg_id": str(i), "seq": i, "chat_id": chat_id, "content": str(i),
+         "sender_id": 1, "timestamp": ts, "readers": []}
+        for i in (6, 7, 8)
+    ]
+    cursor = MagicMock()
+    cursor.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=docs)
+    mock_collection = MagicMock()
+    mock_collection.find.return_value = cursor
+    mock_client = MagicMock()
+    mock_client.chats_msgs = mock_collection
+
+    delta = await MongoDB.get_messages_after(mock_client, chat_id, after_seq=5, limit=2)
+
+    mock_collection.find.assert_called_with({"chat_id": chat_id, "seq": {"$gt": 5}})
+    assert [m["seq"] for m in delta["messages"]] == [6, 7]
+    assert delta["last_seq"] == 7
+    assert delta["has_more"] is True
+    assert delta["truncated"] is False
+
+
+@pytest.mark.asyncio
+async def test_get_messages_after_seq_gap_is_truncated_only_by_archive(monkeypatch):
+    ts = datetime.now(timezone.utc)
+    docs = [{"msg_id": "9", "seq": 9, "chat_id": "c1", "content": "", "sender_id": 1, "timestamp": ts, "readers": []}]
+    cursor = MagicMock()
+    cursor.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=docs)
+    mock_client = MagicMock()
+    mock_client.chats_msgs.find.return_value = cursor
+
+    #seq 6..8 сгорели на неудачных записях — в архиве их нет
+    monkeypatch.setattr(MongoDB.archive, "archived_seq", AsyncMock(return_value=0))
+    assert (await MongoDB.get_messages_after(mock_client, "c1", after_seq=5, limit=10))["truncated"] is False
+
+    monkeypatch.setattr(MongoDB.archive, "archived_seq", AsyncMock(return_value=7))
+    assert (await MongoDB.get_messages_after(mock_client, "c1", after_seq=5, limit=10))["truncated"] is True
+
+
+@pytest.mark.asyncio
+async def test_add_message_mongo_deduplicates_by_client_msg_id():
+    stored = {}
+
+    async def insert_one(doc):
+        stored.update(doc)
+
+    async def find_one(query, projection=None):
+        if "msg_id" in query:
+            return dict(stored)
+        return None
+
+    collection = MagicMock()
+    collection.insert_one = AsyncMock(side_effect=insert_one)
+    collection.find_one = AsyncMock(side_effect=find_one)
+    client = MagicMock()
+    client.chats_msgs = collection
+    client.chats_seq.find_one_and_update = AsyncMock(return_value={"seq": 1})
+    MongoDB.recent_keys._data.clear()
+
+    first = await MongoDB.add_message_mongo(client, "chat", 1, "hi", client_msg_id="k-1")
+    retry = await MongoDB.add_message_mongo(client, "chat", 1, "hi", client_msg_id="k-1")
+
+    assert collection.insert_one.await_count == 1
+    assert client.chats_seq.find_one_and_update.await_count == 1
+    assert retry["duplicate"] is True
+    assert retry["msg_id"] == first["msg_id"] and retry["seq"] == 1
+
+
+@pytest.mark.asyncio
+async def test_add_message_mongo_finds_duplicate_outside_memory_window():
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value={
+        "msg_id": "m-1", "seq": 5, "chat_id": "chat", "client_msg_id": "k-2",
+    })
+    collection.insert_one = AsyncMock()
+    client = MagicMock()
+    client.chats_msgs = collection
+    MongoDB.recent_keys._data.clear()
+
+    result = await MongoDB.add_message_mongo(client, "chat", 1, "hi", client_msg_id="k-2")
+
+    collection.insert_one.assert_not_awaited()
+    assert result == {"msg_id": "m-1", "seq": 5, "chat_id": "chat", "client_msg_id": "k-2", "duplicate": True}
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_continues_after_failed_index():
+    from pymongo.errors import DuplicateKeyError
+
+    client = MagicMock()
+    client.chats_info.create_index = AsyncMock(side_effect=[DuplicateKeyError("dup chat_id"), None])
+    for name in ("chats_msgs", "chats_msgs_buckets", "chats_archive", "chat_members", "attachments", "chat_stats"):
+        getattr(client, name).create_index = AsyncMock()
+
+    failed = await MongoDB.ensure_indexes(client)
+
+    assert failed == ["chats_info.chat_id"]
+    assert client.chats_info.create_index.await_count == 2
+    client.chat_stats.create_index.assert_awaited()
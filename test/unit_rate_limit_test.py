@@ -0,0 +1,32 @@
+from src.rate_limit import TokenBucket, UserBuckets, check_frame
+
+
+def test_bucket_allows_burst_then_limits():
+    bucket = TokenBucket(rate=1, burst=3)
+    now = bucket.updated_at
+    for _ in range(3):
+        assert bucket.wait_time(now) == 0
+        bucket.consume()
+    assert bucket.wait_time(now) > 0
+    assert bucket.wait_time(now + 1) == 0
+
+
+def test_check_frame_uses_tightest_bucket():
+    conn = TokenBucket(rate=100, burst=100)
+    user = TokenBucket(rate=1, burst=1)
+    assert check_frame(conn, user) == 0
+    assert check_frame(conn, user) > 0
+    #отклонённый фрейм не списывает токены соединения
+    assert conn.tokens >= 98
+
+
+def test_user_buckets_are_shared_and_released():
+    buckets = UserBuckets(rate=1, burst=1)
+    first = buckets.acquire(1)
+    second = buckets.acquire(1)
+    assert first is second
+
+    buckets.release(1)
+    assert len(buckets) == 1
+    buckets.release(1)
+    assert len(buckets) == 0
@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from datetime import datetime, timezone
+
+from db import search
+
+
+def test_query_terms_skip_negated_words():
+    assert search.query_terms('"новый отчёт" -черновик отчёты') == ["новый", "отчёт", "отчёты"]
+
+
+def test_snippet_centres_on_match_and_reports_offsets():
+    content = "а" * 300 + " встречаемся завтра " + "б" * 300
+    pattern = search.highlight_pattern(["встреча"])
+    snippet, highlights = search.make_snippet(content, pattern, 60)
+
+    assert snippet.startswith("…") and snippet.endswith("…")
+    (start, end), = highlights
+    assert snippet[start:end] == "встречаемся"
+
+
+@pytest.mark.asyncio
+async def test_search_messages_is_scoped_and_paginated():
+    docs = [
+        {
+            "msg_id": f"m{i}",
+            "chat_id": "c1",
+            "content": f"Привет, это сообщение {i}",
+            "sender_id": 1,
+            "timestamp": datetime.now(timezone.utc),
+            "readers": [],
+            "score": 1.0,
+        }
+        for i in range(3)
+    ]
+    cursor = MagicMock()
+    cursor.sort.return_value = cursor
+    cursor.skip.return_value = cursor
+    cursor.limit.return_value = cursor
+    cursor.max_time_ms.return_value = cursor
+    cursor.to_list = AsyncMock(return_value=docs)
+    client = MagicMock()
+    client.chats_msgs.find.return_value = cursor
+
+    result = await search.search_messages(client, ["c1", "c2"], "сообщения", limit=2, offset=4)
+
+    query = client.chats_msgs.find.call_args[0][0]
+    assert query["chat_id"] == {"$in": ["c1", "c2"]}
+    assert query["$text"] == {"$search": "сообщения"}
+    cursor.skip.assert_called_with(4)
+    cursor.limit.assert_called_with(3)
+    assert result["has_more"] is True
+    assert [r["message"]["msg_id"] for r in result["results"]] == ["m0", "m1"]
+    hit = result["results"][0]
+    start, end = hit["highlights"][0]
+    assert hit["snippet"][start:end] == "сообщение"
@@ -0,0 +1,71 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+from pymongo import DeleteOne, UpdateOne
+
+from db import stats as ChatStats
+
+TS = datetime(2026, 10, 19, 12, 0)
+
+
+def _hot(total, days, senders, first_at=datetime(2026, 10, 18, 9, 0)):
+    return {
+        "total": [{"messages": total, "last_at": TS, "last_seq": total, "first_at": first_at}] if total else [],
+        "days": [{"_id": d, "messages": n} for d, n in days.items()],
+        "senders": [{"_id": s, "messages": n, "last_at": TS} for s, n in senders.items()],
+    }
+
+
+def _current(total, days, senders):
+    docs = [{"_id": "c1:total", "chat_id": "c1", "kind": "total", "messages": total}]
+    docs += [{"_id": f"c1:day:{d}", "chat_id": "c1", "kind": "day", "day": d, "messages": n} for d, n in days.items()]
+    docs += [{"_id": f"c1:sender:{s}", "chat_id": "c1", "kind": "sender", "sender_id": s, "messages": n}
+             for s, n in senders.items()]
+    return docs
+
+
+@pytest.mark.asyncio
+async def test_record_message_increments_three_counters_in_one_round_trip():
+    client = MagicMock()
+    client.chat_stats.bulk_write = AsyncMock()
+    await ChatStats.record_message(client, {"chat_id": "c1", "sender_id": 7, "timestamp": TS, "seq": 3})
+
+    ops = client.chat_stats.bulk_write.call_args[0][0]
+    assert [op._filter["_id"] for op in ops] == ["c1:total", "c1:day:2026-10-19", "c1:sender:7"]
+    assert all(op._doc["$inc"] == {"messages": 1} for op in ops)
+    assert client.chat_stats.bulk_write.call_args.kwargs["ordered"] is False
+
+
+@pytest.mark.asyncio
+async def test_record_message_failure_does_not_raise():
+    client = MagicMock()
+    client.chat_stats.bulk_write = AsyncMock(side_effect=RuntimeError("down"))
+    before = ChatStats.stats_write_errors.value()
+    await ChatStats.record_message(client, {"chat_id": "c1", "sender_id": 7, "timestamp": TS})
+    assert ChatStats.stats_write_errors.value() == before + 1
+
+
+def test_plan_repairs_no_drift_is_noop():
+    days, senders = {"2026-10-18": 2, "2026-10-19": 3}, {7: 4, 8: 1}
+    assert ChatStats.plan_repairs("c1", _hot(5, days, senders), 0, _current(5, days, senders)) == []
+
+
+def test_plan_repairs_fixes_drift_and_removes_stale_counters():
+    hot = _hot(5, {"2026-10-18": 2, "2026-10-19": 3}, {7: 5})
+    current = _current(4, {"2026-10-18": 2, "2026-10-19": 2, "2026-10-17": 1}, {7: 4, 9: 1})
+    ops = ChatStats.plan_repairs("c1", hot, 0, current)
+
+    updates = {op._filter["_id"]: op._doc["$inc"]["messages"] for op in ops if isinstance(op, UpdateOne)}
+    deletes = {op._filter["_id"]: op._filter["messages"] for op in ops if isinstance(op, DeleteOne)}
+    assert updates == {"c1:total": 1, "c1:day:2026-10-19": 1, "c1:sender:7": 1}
+    assert deletes == {"c1:day:2026-10-17": 1, "c1:sender:9": 1}
+    assert all("$set" not in op._doc for op in ops if isinstance(op, UpdateOne))
+
+
+def test_plan_repairs_with_archive_checks_total_and_later_days_only():
+    #Самый ранний горячий день (18-е) частично в архиве, отправители не сверяются
+    hot = _hot(5, {"2026-10-18": 2, "2026-10-19": 3}, {7: 5})
+    current = _current(100, {"2026-10-10": 40, "2026-10-18": 30, "2026-10-19": 1}, {7: 90, 8: 10})
+    ops = ChatStats.plan_repairs("c1", hot, 95, current)
+
+    assert {op._filter["_id"]: op._doc["$inc"]["messages"] for op in ops} == {"c1:day:2026-10-19": 2}
@@ -0,0 +1,48 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from src import user_cache
+from src.user_cache import UserProfileCache
+
+
+def test_cache_lookup_by_name_and_id():
+    cache = UserProfileCache(ttl=60, maxsize=10)
+    profile = {"user_id": 2, "user_name": "kasada", "avatar": ""}
+    cache.put(profile)
+
+    assert cache.get_by_name("kasada") == profile
+    assert cache.get_by_id(2) == profile
+
+    cache.invalidate("kasada")
+    assert cache.get_by_name("kasada") is None
+    assert cache.get_by_id(2) is None
+
+
+def test_cache_expires_entries():
+    cache = UserProfileCache(ttl=-1, maxsize=10)
+    cache.put({"user_id": 2, "user_name": "kasada", "avatar": ""})
+    assert cache.get_by_name("kasada") is None
+
+
+def test_cache_respects_maxsize():
+    cache = UserProfileCache(ttl=60, maxsize=2)
+    for i in range(3):
+        cache.put({"user_id": i, "user_name": f"user{i}", "avatar": ""})
+    assert cache.get_by_name("user0") is None
+    assert cache.get_by_name("user2") is not None
+
+
+@pytest.mark.asyncio
+async def test_get_users_by_usernames_fetches_only_missing():
+    user_cache.user_cache.clear()
+    user_cache.user_cache.put({"user_id": 1, "user_name": "Vtgoodgame", "avatar": ""})
+
+    fetch = AsyncMock(return_value={"user_id": 2, "user_name": "kasada", "avatar": ""})
+    with patch("src.user_cache._fetch_user", new=fetch):
+        result = await user_cache.get_users_by_usernames(["Vtgoodgame", "kasada", "kasada"])
+
+    assert fetch.await_count == 1
+    assert result["Vtgoodgame"]["user_id"] == 1
+    assert result["kasada"]["user_id"] == 2
+    assert user_cache.user_cache.get_by_id(2)["user_name"] == "kasada"
+    user_cache.user_cache.clear()
@@ -0,0 +1,58 @@
+"""Миграция истории сообщений из `chats_msgs` в бакетную схему.
+
+Запуск из корня проекта:
+
+    python -m tools.migrate_to_buckets                 # все чаты
+    python -m tools.migrate_to_buckets --chat <id>     # один чат
+    python -m tools.migrate_to_buckets --drop-source   # удалить перенесённое из chats_msgs
+
+После миграции включите `MSG_STORAGE_LAYOUT=bucket`. Сообщения, пришедшие
+между миграцией и переключением, переносятся повторным запуском по чату;
+сообщения, уже записанные в корзины, при этом сохраняются. Пока чат
+переносится, запись в его корзины ждёт окончания переноса (`MSG_MIGRATION_WAIT`).
+"""
+
+import asyncio
+import argparse
+import logging
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import src.concts as c
+from db import mongo as MongoDB
+from db import mongo_buckets
+
+
+async def migrate(chat_ids, drop_source: bool) -> None:
+    client = AsyncIOMotorClient(c.MONGO_URL)
+    db = client.baza
+    try:
+        await MongoDB.ensure_indexes(db)
+        if not chat_ids:
+            chat_ids = await db.chats_msgs.distinct("chat_id")
+
+        total = 0
+        for i, chat_id in enumerate(chat_ids, 1):
+            count = await mongo_buckets.migrate_chat(db, chat_id)
+            total += count
+            if drop_source and count:
+                await db.chats_msgs.delete_many({"chat_id": chat_id})
+            logging.info("[%d/%d] %s: %d сообщений", i, len(chat_ids), chat_id, count)
+
+        logging.info("Готово: чатов %d, сообщений %d", len(chat_ids), total)
+    finally:
+        client.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chat", action="append", default=[], help="ID чата (можно несколько раз)")
+    parser.add_argument("--drop-source", action="store_true", help="удалить перенесённые документы из chats_msgs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(migrate(args.chat, args.drop_source))
+
+
+if __name__ == "__main__":
+    main()
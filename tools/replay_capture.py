@@ -0,0 +1,360 @@
+"""Воспроизведение записанного трафика (`src/capture.py`) против локального сервиса.
+
+Запуск из корня проекта:
+
+    python -m tools.replay_capture captures/prod.jsonl --seed --cookies users.json
+    python -m tools.replay_capture captures/prod.jsonl --speed 10
+    python -m tools.replay_capture captures/prod.jsonl --base-url http://localhost:8000 \\
+        --cookies users.json --duration 300
+
+Каждое соединение записи (HTTP-запрос или websocket-сессия) воспроизводится
+со своими временными отметками, сжатыми в `--speed` раз (1–50): всплески в
+комнатах, шторм переподключений и длинные прокрутки истории повторяются в
+том же порядке и с той же плотностью.
+
+Идентификаторы в записи — псевдонимы, поэтому перед воспроизведением
+локальную базу готовит `--seed`: создаёт чаты записи с теми же `chat_id`
+и добавляет в них пользователей, которые к ним обращались. Пользователь
+записи — это его токен из `--cookies`; его `user_id` и имя берутся у
+auth-service (`/auth/me`). Чат с двумя разными пользователями создаётся
+личным, остальные (и чаты, к участникам которых обращались) — групповыми.
+Авторизация: `--cookies` — JSON `{"<псевдоним пользователя>": "<access_token>"}`,
+`--cookie` — токен для всех остальных.
+
+`chat_id` и `sender_id` из фреймов сообщений не отправляются: сервер берёт
+их из соединения, а псевдоним отправителя не совпадает с локальным id.
+
+Отчёт: пропускная способность и перцентили задержки успешных HTTP-ответов
+по шаблонам путей и подтверждений websocket-сообщений (время до `ack`;
+сообщениям без `client_msg_id` он назначается при воспроизведении). Ответы
+4xx/5xx в перцентили не попадают и считаются отдельно как ошибки.
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+import argparse
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+import httpx
+import msgpack
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import db.mongo as MongoDB
+import src.concts as c
+from db import members as ChatMembers
+from db.mongo_config import MongoClientSettings
+
+MAX_SPEED = 50
+
+
+def load_capture(path: str) -> Dict[int, List[Dict[str, Any]]]:
+    """События записи, сгруппированные по соединениям и упорядоченные по времени."""
+    connections: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                connections[event["conn"]].append(event)
+    for events in connections.values():
+        events.sort(key=lambda e: e["t"])
+    return dict(connections)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга (0 для пустого списка)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def route_label(event: Dict[str, Any]) -> str:
+    """Метка для отчёта: метод и путь без псевдонимов (`/chats/{}/members`)."""
+    parts = ["{}" if (p.startswith("p") and len(p) == 17) or p.isdigit() else p for p in event["path"].split("/")]
+    return f"{event['method']} {'/'.join(parts)}"
+
+
+def _chat_id(event: Dict[str, Any]) -> Optional[str]:
+    """Псевдоним чата из параметров запроса или пути (`/chats/{chat_id}/...`)."""
+    chat_ids = parse_qs(event.get("query") or "").get("chat_id")
+    if chat_ids:
+        return chat_ids[0]
+    parts = event.get("path", "").split("/")
+    for i, part in enumerate(parts[:-1]):
+        if part == "chats" and parts[i + 1].startswith("p"):
+            return parts[i + 1]
+    return None
+
+
+def capture_chats(connections: Dict[int, List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """Чаты записи: псевдоним `chat_id` → `users` (псевдонимы) и `group`."""
+    chats: Dict[str, Dict[str, Any]] = {}
+    for events in connections.values():
+        first = events[0]
+        if first["kind"] not in ("http", "ws_open"):
+            continue
+        chat_id = _chat_id(first)
+        if not chat_id:
+            continue
+        chat = chats.setdefault(chat_id, {"users": set(), "group": False})
+        if first.get("user"):
+            chat["users"].add(first["user"])
+        if "/members" in first.get("path", ""):
+            chat["group"] = True
+    return chats
+
+
+async def _identities(users: Set[str], cookies: Dict[str, str], cookie: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Локальные пользователи по псевдонимам записи (через `/auth/me` с их токенами)."""
+    identities: Dict[str, Dict[str, Any]] = {}
+    async with httpx.AsyncClient(timeout=30) as http:
+        for user in users:
+            token = cookies.get(user) or cookie
+            if not token:
+                continue
+            response = await http.get(
+                c.BACKEND_URL + c.AUTH_PREFIX + "/auth/me",
+                headers={**c.HEADERS, "Cookie": f"{c.COOKIE_NAME}={token}"},
+            )
+            if response.status_code != 200:
+                logging.warning("Пользователь %s не определён: %s", user, response.status_code)
+                continue
+            me = response.json()
+            identities[user] = {"user_id": me["user_id"], "user_name": me["username"], "avatar": me.get("avatar") or ""}
+    return identities
+
+
+async def seed(connections: Dict[int, List[Dict[str, Any]]], cookies: Dict[str, str],
+               cookie: Optional[str]) -> Tuple[int, int]:
+    """Создаёт в локальной MongoDB чаты записи с их участниками (идемпотентно).
+
+    Returns:
+        tuple[int, int]: Создано/дополнено чатов и пропущено (нет ни одного
+        известного пользователя).
+    """
+    chats = capture_chats(connections)
+    identities = await _identities({u for chat in chats.values() for u in chat["users"]}, cookies, cookie)
+    settings = MongoClientSettings.from_env()
+    mongo_client = AsyncIOMotorClient(settings.url, **settings.client_kwargs())
+    db = mongo_client.baza
+    seeded = skipped = 0
+    try:
+        for chat_id, chat in chats.items():
+            members = list({m["user_id"]: m for m in (identities.get(u) for u in chat["users"]) if m}.values())
+            if not members:
+                skipped += 1
+                continue
+            if chat["group"] or len(members) != 2:
+                await db.chats_info.update_one(
+                    {"chat_id": chat_id},
+                    {"$setOnInsert": {
+                        "chat_type": "group", "chat_name": chat_id, "owner_id": members[0]["user_id"],
+                        "member_count": 0, "members": [], "messages": [],
+                    }},
+                    upsert=True,
+                )
+                for i, member in enumerate(members):
+                    role = ChatMembers.ROLE_OWNER if i == 0 else ChatMembers.ROLE_MEMBER
+                    await ChatMembers.add_member(db, chat_id, member, role)
+            else:
+                for member in members:
+                    await MongoDB.add_members_to_chat(db, chat_id, **member)
+            seeded += 1
+    finally:
+        mongo_client.close()
+    return seeded, skipped
+
+
+class Stats:
+    """Задержки и счётчики воспроизведения."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.sent = 0
+        self.started = time.perf_counter()
+
+    def observe(self, label: str, seconds: float) -> None:
+        self.latencies[label].append(seconds * 1000)
+
+    def report(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        lines = [
+            f"длительность {elapsed:.1f} с, отправлено {self.sent} запросов/фреймов ({self.sent / elapsed:.1f}/с)",
+            "",
+            f"{'операция':44} {'count':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}",
+        ]
+        for label, values in sorted(self.latencies.items()):
+            lines.append(
+                f"{label[:44]:44} {len(values):>7} {len(values) / elapsed:>8.1f} {percentile(values, 50):>8.1f} "
+                f"{percentile(values, 95):>8.1f} {percentile(values, 99):>8.1f}"
+            )
+        if self.errors:
+            lines.append("")
+            lines.extend(f"ошибки {label}: {n}" for label, n in sorted(self.errors.items()))
+        return "\n".join(lines)
+
+
+class Replayer:
+    def __init__(self, base_url: str, speed: float, cookies: Dict[str, str], cookie: Optional[str]):
+        self.base_url = base_url.rstrip("/")
+        self.speed = speed
+        self.cookies = cookies
+        self.cookie = cookie
+        self.stats = Stats()
+        self.offset = 0.0
+        self.http = httpx.AsyncClient(base_url=self.base_url, timeout=30)
+
+    def _cookie_header(self, user: Optional[str]) -> Dict[str, str]:
+        token = self.cookies.get(user) if user else None
+        token = token or self.cookie
+        return {"Cookie": f"{c.COOKIE_NAME}={token}"} if token else {}
+
+    async def _wait_until(self, t: float) -> None:
+        delay = self.stats.started + (t - self.offset) / self.speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def replay_http(self, event: Dict[str, Any]) -> None:
+        await self._wait_until(event["t"])
+        label = route_label(event)
+        url = event["path"] + (f"?{event['query']}" if event.get("query") else "")
+        kwargs: Dict[str, Any] = {"headers": self._cookie_header(event.get("user"))}
+        if "body" in event:
+            kwargs["json"] = event["body"]
+        elif event.get("body_bytes"):
+            kwargs["content"] = os.urandom(event["body_bytes"])
+        self.stats.sent += 1
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(event["method"], url, **kwargs)
+            #Отказы (403/404 и т.п.) идут другим путём — в перцентили не смешиваем
+            if response.status_code >= 400:
+                self.stats.errors[f"{label} {response.status_code}"] += 1
+            else:
+                self.stats.observe(label, time.perf_counter() - started)
+        except httpx.HTTPError as e:
+            self.stats.errors[f"{label} {type(e).__name__}"] += 1
+
+    async def replay_websocket(self, events: List[Dict[str, Any]]) -> None:
+        #websockets нужен только для записей с websocket-сессиями
+        import websockets
+
+        opened = events[0]
+        await self._wait_until(opened["t"])
+        binary = opened.get("fmt") == "msgpack"
+        url = self.base_url.replace("http", "ws", 1) + opened["path"]
+        if opened.get("query"):
+            url += "?" + opened["query"]
+        pending: Dict[str, float] = {}
+        #Ключи идемпотентности записи → новые ключи прогона: повторы остаются повторами
+        msg_ids: Dict[Any, str] = {}
+
+        try:
+            ws = await websockets.connect(
+                url,
+                additional_headers=self._cookie_header(opened.get("user")),
+                subprotocols=["chat.msgpack.v1"] if binary else None,
+            )
+        except Exception as e:
+            self.stats.errors[f"ws connect {type(e).__name__}"] += 1
+            return
+
+        async def read_acks():
+            async for raw in ws:
+                frame = msgpack.unpackb(raw, raw=False) if isinstance(raw, bytes) else json.loads(raw)
+                if isinstance(frame, dict) and frame.get("type") in ("ack", "error"):
+                    started = pending.pop(frame.get("client_msg_id"), None)
+                    if frame["type"] == "error":
+                        self.stats.errors[f"ws {frame.get('code')}"] += 1
+                    elif started is not None:
+                        self.stats.observe("WS message ack", time.perf_counter() - started)
+
+        reader = asyncio.create_task(read_acks())
+        try:
+            for event in events[1:]:
+                if event["kind"] == "ws_close":
+                    await self._wait_until(event["t"])
+                    break
+                if event["kind"] != "ws_in" or "frame" not in event:
+                    continue
+                await self._wait_until(event["t"])
+                frame = event["frame"]
+                if isinstance(frame, dict) and frame.get("type", "message") == "message":
+                    original = frame.get("client_msg_id") or uuid4().hex
+                    frame = {k: v for k, v in frame.items() if k not in ("chat_id", "sender_id")}
+                    frame["client_msg_id"] = msg_ids.setdefault(original, uuid4().hex)
+                    pending.setdefault(frame["client_msg_id"], time.perf_counter())
+                await ws.send(msgpack.packb(frame) if binary else json.dumps(frame))
+                self.stats.sent += 1
+            #Дожидаемся подтверждений последних сообщений
+            deadline = time.perf_counter() + 5
+            while pending and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+        except Exception as e:
+            self.stats.errors[f"ws {type(e).__name__}"] += 1
+        finally:
+            reader.cancel()
+            await ws.close()
+
+    async def replay_connection(self, events: List[Dict[str, Any]]) -> None:
+        first = events[0]
+        if first["kind"] == "http":
+            await self.replay_http(first)
+        elif first["kind"] == "ws_open":
+            await self.replay_websocket(events)
+
+    async def run(self, connections: Iterable[List[Dict[str, Any]]]) -> None:
+        connections = list(connections)
+        #Запись может начинаться не с нуля — отсчитываем от первого события
+        self.offset = min((events[0]["t"] for events in connections), default=0.0)
+        self.stats = Stats()
+        try:
+            await asyncio.gather(*(self.replay_connection(events) for events in connections))
+        finally:
+            await self.http.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="JSONL-файл записи (CAPTURE_FILE)")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1, help=f"ускорение воспроизведения, 1–{MAX_SPEED}")
+    parser.add_argument("--duration", type=float, help="воспроизвести только первые N секунд записи")
+    parser.add_argument("--cookies", help="JSON {псевдоним пользователя: access_token}")
+    parser.add_argument("--cookie", help="access_token для пользователей без записи в --cookies")
+    parser.add_argument("--seed", action="store_true", help="создать чаты записи в локальной MongoDB и выйти")
+    args = parser.parse_args()
+    if not 1 <= args.speed <= MAX_SPEED:
+        parser.error(f"--speed должен быть от 1 до {MAX_SPEED}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    connections = load_capture(args.capture)
+    if args.duration is not None:
+        connections = {k: v for k, v in connections.items() if v[0]["t"] <= args.duration}
+    cookies = {}
+    if args.cookies:
+        with open(args.cookies, encoding="utf-8") as f:
+            cookies = json.load(f)
+
+    if args.seed:
+        seeded, skipped = asyncio.run(seed(connections, cookies, args.cookie))
+        print(f"чатов создано/дополнено: {seeded}, пропущено без известных пользователей: {skipped}")
+        return
+
+    logging.info("Соединений в записи: %d, ускорение x%g", len(connections), args.speed)
+    replayer = Replayer(args.base_url, args.speed, cookies, args.cookie)
+    asyncio.run(replayer.run(connections.values()))
+    print(replayer.stats.report())
+
+
+if __name__ == "__main__":
+    main()